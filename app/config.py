@@ -13,5 +13,122 @@ class Settings:
     DATABASE_PASSWORD: str = os.getenv("DATABASE_PASSWORD", "Sylvian")
     DATABASE_DB: str = os.getenv("DATABASE_DB", "recommendation_service_db")
     DATABASE_PORT: int = int(os.getenv("DATABASE_PORT", "5433"))
+    # Connection pool, shared by the sync and async engines (ignored for SQLite)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+    # Strategies warmed up in the background at startup and served; the others' routes return 404
+    ENABLED_STRATEGIES: str = os.getenv("ENABLED_STRATEGIES", "popularity,user_based,item_based,content,tfrs,vendors")
+    DEFAULT_RECOMMENDATION_LIMIT: int = int(os.getenv("DEFAULT_RECOMMENDATION_LIMIT", "20"))
+    USER_KNN_NEIGHBOURS: int = int(os.getenv("USER_KNN_NEIGHBOURS", "50"))
+    ITEM_SIMILARITY_TOP_K: int = int(os.getenv("ITEM_SIMILARITY_TOP_K", "50"))
+    ITEM_SIMILARITY_REFRESH_SECONDS: int = int(os.getenv("ITEM_SIMILARITY_REFRESH_SECONDS", "300"))
+    # Vendor affinity: own interactions, similar users' vendors and rating, each scaled to [0, 1]
+    VENDOR_AFFINITY_NEIGHBOURS: int = int(os.getenv("VENDOR_AFFINITY_NEIGHBOURS", "50"))
+    VENDOR_AFFINITY_OWN_WEIGHT: float = float(os.getenv("VENDOR_AFFINITY_OWN_WEIGHT", "1.0"))
+    VENDOR_AFFINITY_NEIGHBOUR_WEIGHT: float = float(os.getenv("VENDOR_AFFINITY_NEIGHBOUR_WEIGHT", "0.5"))
+    VENDOR_AFFINITY_RATING_WEIGHT: float = float(os.getenv("VENDOR_AFFINITY_RATING_WEIGHT", "0.2"))
+    VENDOR_AFFINITY_REFRESH_SECONDS: int = int(os.getenv("VENDOR_AFFINITY_REFRESH_SECONDS", "300"))
+    # Content-based features: hashed word uni/bigrams plus price and vendor blocks
+    CONTENT_HASH_FEATURES: int = int(os.getenv("CONTENT_HASH_FEATURES", str(2 ** 18)))
+    CONTENT_PRICE_WEIGHT: float = float(os.getenv("CONTENT_PRICE_WEIGHT", "0.3"))
+    CONTENT_VENDOR_WEIGHT: float = float(os.getenv("CONTENT_VENDOR_WEIGHT", "0.2"))
+    # Products created, edited or deleted in the database reach the index within this many seconds
+    CONTENT_REFRESH_SECONDS: int = int(os.getenv("CONTENT_REFRESH_SECONDS", "60"))
+    # Time-decayed popularity rankings, also the cold-start fallback
+    POPULARITY_HALF_LIFE_HOURS: float = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "72"))
+    POPULARITY_TOP_K: int = int(os.getenv("POPULARITY_TOP_K", "1000"))
+    POPULARITY_REFRESH_SECONDS: int = int(os.getenv("POPULARITY_REFRESH_SECONDS", "60"))
+    # Hybrid engine: "strategy:weight" pairs from user_based, item_based, content, tfrs, popularity
+    HYBRID_STRATEGIES: str = os.getenv("HYBRID_STRATEGIES", "user_based:1,item_based:1,content:0.5,tfrs:1,popularity:0.2")
+    HYBRID_FUSION: str = os.getenv("HYBRID_FUSION", "rrf")  # "rrf" or "weighted"
+    HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", "60"))
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "100"))
+    HYBRID_STRATEGY_TIMEOUT_MS: float = float(os.getenv("HYBRID_STRATEGY_TIMEOUT_MS", "150"))
+    # Per-strategy overrides of the timeout, e.g. "tfrs:50,content:300"
+    HYBRID_STRATEGY_TIMEOUTS_MS: str = os.getenv("HYBRID_STRATEGY_TIMEOUTS_MS", "")
+    HYBRID_WORKERS: int = int(os.getenv("HYBRID_WORKERS", "8"))
+    # Re-ranking stage, used when a request filters by price, vendor or history or asks for diversity:
+    # strategies generate max(RERANK_CANDIDATES, page end * RERANK_OVERFETCH) candidates within the
+    # candidate budget, then filters, weighted scorers and vendor MMR run within the re-ranking budget
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "200"))
+    RERANK_OVERFETCH: int = int(os.getenv("RERANK_OVERFETCH", "4"))
+    RERANK_SCORERS: str = os.getenv("RERANK_SCORERS", "relevance:1")
+    RERANK_CANDIDATE_BUDGET_MS: float = float(os.getenv("RERANK_CANDIDATE_BUDGET_MS", "150"))
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "20"))
+    # Buffered interaction ingestion
+    INGEST_BUFFER_MAX_SIZE: int = int(os.getenv("INGEST_BUFFER_MAX_SIZE", "100000"))
+    INGEST_FLUSH_SIZE: int = int(os.getenv("INGEST_FLUSH_SIZE", "5000"))
+    INGEST_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("INGEST_FLUSH_INTERVAL_SECONDS", "1.0"))
+    # Consecutive failed flushes (e.g. the database is down) before the events being retried are dropped
+    INGEST_MAX_RETRIES: int = int(os.getenv("INGEST_MAX_RETRIES", "30"))
+    # Interaction ids are assigned on insert but become visible on commit, so a lower id can show up after a
+    # higher one; incremental readers re-read this many ids below the highest they have seen
+    INTERACTION_ID_OVERLAP: int = int(os.getenv("INTERACTION_ID_OVERLAP", "10000"))
+    # Recorded interactions reach the in-memory matrix in merges, once this many are pending or every
+    # INTERACTION_MERGE_SECONDS; reads serve the last merged snapshot in between
+    INTERACTION_MERGE_THRESHOLD: int = int(os.getenv("INTERACTION_MERGE_THRESHOLD", "10000"))
+    INTERACTION_MERGE_SECONDS: float = float(os.getenv("INTERACTION_MERGE_SECONDS", "5"))
+    # Precomputed per-user recommendations written by `python -m app.jobs.materialize`
+    MATERIALIZED_DIR: str = os.getenv("MATERIALIZED_DIR", "artifacts/materialized")
+    MATERIALIZED_TOP_K: int = int(os.getenv("MATERIALIZED_TOP_K", "100"))
+    MATERIALIZED_MAX_AGE_SECONDS: float = float(os.getenv("MATERIALIZED_MAX_AGE_SECONDS", "86400"))
+    MATERIALIZED_REFRESH_SECONDS: int = int(os.getenv("MATERIALIZED_REFRESH_SECONDS", "60"))
+    MATERIALIZED_CHUNK_SIZE: int = int(os.getenv("MATERIALIZED_CHUNK_SIZE", "2000"))
+    # Shared serving mode: `python -m app.jobs.publish_state` builds the matrix, neighbour, content and
+    # popularity structures and workers memory-map them from here; empty builds them in every worker.
+    # Interactions recorded by a worker reach its matrix with the next published snapshot.
+    SHARED_STATE_DIR: str = os.getenv("SHARED_STATE_DIR", "")
+    SHARED_STATE_PUBLISH_SECONDS: int = int(os.getenv("SHARED_STATE_PUBLISH_SECONDS", "60"))
+    SHARED_STATE_REFRESH_SECONDS: int = int(os.getenv("SHARED_STATE_REFRESH_SECONDS", "5"))
+    # Sampling profiler for slow requests (needs the optional pyinstrument package); 0 disables it
+    PROFILE_SLOW_REQUEST_MS: float = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+    # Concurrent uncached computations per strategy and worker on the expensive routes (0 disables the
+    # limit); STRATEGY_CONCURRENCY_LIMITS overrides it per strategy, e.g. "hybrid:4". Requests beyond
+    # STRATEGY_QUEUE_LIMIT waiting, or waiting longer than STRATEGY_QUEUE_TIMEOUT_MS, get popular products.
+    STRATEGY_MAX_CONCURRENCY: int = int(os.getenv("STRATEGY_MAX_CONCURRENCY", "8"))
+    STRATEGY_CONCURRENCY_LIMITS: str = os.getenv("STRATEGY_CONCURRENCY_LIMITS", "")
+    STRATEGY_QUEUE_LIMIT: int = int(os.getenv("STRATEGY_QUEUE_LIMIT", "32"))
+    STRATEGY_QUEUE_TIMEOUT_MS: float = float(os.getenv("STRATEGY_QUEUE_TIMEOUT_MS", "250"))
+    # Recommendation response cache; set CACHE_REDIS_URL to add a shared tier
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "")
+    # Users whose invalidation generation this worker remembers; older ones fall back to a shared floor
+    CACHE_MAX_GENERATIONS: int = int(os.getenv("CACHE_MAX_GENERATIONS", "100000"))
+    # Versioned TFRS embedding artifacts written by `python -m app.jobs.train_tfrs`
+    MODEL_ARTIFACT_DIR: str = os.getenv("MODEL_ARTIFACT_DIR", "artifacts/tfrs")
+    # TFRS training pipeline
+    TFRS_EMBEDDING_DIMENSION: int = int(os.getenv("TFRS_EMBEDDING_DIMENSION", "32"))
+    TFRS_BATCH_SIZE: int = int(os.getenv("TFRS_BATCH_SIZE", "4096"))
+    TFRS_SHUFFLE_BUFFER: int = int(os.getenv("TFRS_SHUFFLE_BUFFER", "100000"))
+    TFRS_LEARNING_RATE: float = float(os.getenv("TFRS_LEARNING_RATE", "0.1"))
+    # Empty caches the encoded training set in memory; a path prefix caches it on disk, one file set per run
+    TFRS_CACHE_PATH: str = os.getenv("TFRS_CACHE_PATH", "")
+    TRAINING_CHUNK_SIZE: int = int(os.getenv("TRAINING_CHUNK_SIZE", "50000"))
+    # Implicit ALS matrix factorization (`python -m app.jobs.train_als`), exported in the TFRS artifact layout;
+    # ALS_THREADS=0 solves on every core
+    ALS_FACTORS: int = int(os.getenv("ALS_FACTORS", "64"))
+    ALS_REGULARIZATION: float = float(os.getenv("ALS_REGULARIZATION", "0.1"))
+    ALS_ALPHA: float = float(os.getenv("ALS_ALPHA", "2.0"))
+    ALS_ITERATIONS: int = int(os.getenv("ALS_ITERATIONS", "15"))
+    ALS_CG_STEPS: int = int(os.getenv("ALS_CG_STEPS", "3"))
+    ALS_THREADS: int = int(os.getenv("ALS_THREADS", "0"))
+    # Online fold-in of user vectors against the active embedding model as interactions arrive:
+    # "least_squares" (the ALS user step), "average" (weighted mean of item vectors) or "auto"
+    # (least squares for ALS artifacts). FOLD_IN_MAX_USERS=0 disables it.
+    FOLD_IN_METHOD: str = os.getenv("FOLD_IN_METHOD", "auto")
+    FOLD_IN_MAX_USERS: int = int(os.getenv("FOLD_IN_MAX_USERS", "100000"))
+    # Retrieval index over TFRS item embeddings: "brute_force" or "ivf"
+    TFRS_INDEX: str = os.getenv("TFRS_INDEX", "brute_force")
+    TFRS_IVF_LISTS: int = int(os.getenv("TFRS_IVF_LISTS", "0"))
+    TFRS_IVF_PROBES: int = int(os.getenv("TFRS_IVF_PROBES", "8"))
+    # Size of the (users x items) float32 score block batch scoring builds per chunk of users
+    TFRS_BATCH_SCORE_MEMORY_MB: int = int(os.getenv("TFRS_BATCH_SCORE_MEMORY_MB", "256"))
 
 settings = Settings()
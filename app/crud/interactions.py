@@ -1,14 +1,84 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models import UserInteractionModel, ProductModel
 
 def get_user_ids(db: Session):
     """Fetch all unique user IDs from interactions."""
-    return [interaction.user_id for interaction in db.query(UserInteractionModel.user_id).distinct()]
+    return db.execute(select(UserInteractionModel.user_id).distinct()).scalars().all()
+
+def get_user_ids_since(db: Session, after_id: int):
+    """Unique user IDs with an interaction whose id is greater than ``after_id``."""
+    return db.execute(
+        select(UserInteractionModel.user_id).where(UserInteractionModel.id > after_id).distinct()
+    ).scalars().all()
+
+def get_last_interaction_id(db: Session) -> int:
+    return db.execute(select(func.max(UserInteractionModel.id))).scalar() or 0
 
 def get_item_ids(db: Session):
     """Fetch all product IDs."""
-    return [product.id for product in db.query(ProductModel).all()]
+    return [product_id for (product_id,) in db.query(ProductModel.id)]
 
 def get_interactions(db: Session):
     """Fetch all user interactions as (user_id, product_id) tuples."""
-    return [(interaction.user_id, interaction.product_id) for interaction in db.query(UserInteractionModel).all()]
+    return [tuple(row) for row in db.query(UserInteractionModel.user_id, UserInteractionModel.product_id)]
+
+def _interaction_columns():
+    return select(
+        UserInteractionModel.user_id,
+        UserInteractionModel.product_id,
+        UserInteractionModel.interaction_type,
+        UserInteractionModel.interaction_value,
+    )
+
+def get_interactions_for_users(db: Session, user_ids):
+    """Fetch (user_id, product_id, interaction_type, interaction_value) rows for many users in one query."""
+    return db.execute(_interaction_columns().where(UserInteractionModel.user_id.in_(list(user_ids)))).all()
+
+async def get_interactions_for_users_async(db: AsyncSession, user_ids):
+    result = await db.execute(_interaction_columns().where(UserInteractionModel.user_id.in_(list(user_ids))))
+    return result.all()
+
+def stream_interactions(db: Session, chunk_size: int = 50000):
+    """Yield lists of (user_id, product_id, interaction_type, interaction_value) rows.
+
+    Uses a server-side cursor so at most ``chunk_size`` rows are held in memory at once.
+    """
+    result = db.execute(
+        _interaction_columns()
+        .where(UserInteractionModel.product_id.isnot(None))
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    for partition in result.partitions(chunk_size):
+        yield partition
+
+async def stream_interactions_async(db: AsyncSession, chunk_size: int = 50000):
+    result = await db.stream(
+        _interaction_columns()
+        .where(UserInteractionModel.product_id.isnot(None))
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions(chunk_size):
+        yield partition
+
+def stream_interaction_events(db: Session, after_id: int = 0, chunk_size: int = 50000):
+    """Yield lists of (id, product_id, interaction_type, interaction_value, created_at) rows with id > ``after_id``.
+
+    Ids are not committed in order, so callers resuming from the highest id
+    they have seen must re-read a window below it (see INTERACTION_ID_OVERLAP).
+    """
+    result = db.execute(
+        select(
+            UserInteractionModel.id,
+            UserInteractionModel.product_id,
+            UserInteractionModel.interaction_type,
+            UserInteractionModel.interaction_value,
+            UserInteractionModel.created_at,
+        )
+        .where(UserInteractionModel.id > after_id, UserInteractionModel.product_id.isnot(None))
+        .order_by(UserInteractionModel.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    for partition in result.partitions(chunk_size):
+        yield partition
@@ -1,6 +1,37 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from app.models.product import ProductModel
 
+def product_columns():
+    """Select only the columns the API serialises, returning light rows instead of ORM entities."""
+    return select(ProductModel.id, ProductModel.name, ProductModel.description, ProductModel.price, ProductModel.vendor_id)
+
 def get_products_by_ids(db: Session, product_ids: List[int]):
-    return db.query(ProductModel).filter(ProductModel.id.in_(product_ids)).all()
+    return db.execute(product_columns().where(ProductModel.id.in_(product_ids))).all()
+
+async def get_products_by_ids_async(db: AsyncSession, product_ids: List[int]):
+    result = await db.execute(product_columns().where(ProductModel.id.in_(product_ids)))
+    return result.all()
+
+async def get_existing_product_ids_async(db: AsyncSession, product_ids: List[int]) -> set:
+    """The subset of ``product_ids`` that exist."""
+    result = await db.execute(select(ProductModel.id).where(ProductModel.id.in_(product_ids)))
+    return set(result.scalars().all())
+
+def get_products(db: Session):
+    """Fetch every product as a column row (used to build in-memory feature indexes)."""
+    return db.execute(product_columns()).all()
+
+async def get_products_async(db: AsyncSession):
+    result = await db.execute(product_columns())
+    return result.all()
+
+def get_product_vendors(db: Session, product_ids: List[int]):
+    """Fetch (product id, vendor id) pairs for the given products."""
+    return db.execute(select(ProductModel.id, ProductModel.vendor_id).where(ProductModel.id.in_(product_ids))).all()
+
+def get_product_vendor_pairs(db: Session):
+    """Fetch (product id, vendor id) pairs for every product."""
+    return db.execute(select(ProductModel.id, ProductModel.vendor_id)).all()
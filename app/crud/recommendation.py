@@ -1,6 +1,33 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.recommendation import UserInteractionModel
 
+def _user_interaction_columns(user_id: int):
+    # Served from ix_user_interactions_user_product_value alone
+    return select(
+        UserInteractionModel.user_id,
+        UserInteractionModel.product_id,
+        UserInteractionModel.interaction_value,
+    ).where(UserInteractionModel.user_id == user_id)
+
 def get_user_interactions(db: Session, user_id: int):
-    return db.query(UserInteractionModel).filter(UserInteractionModel.user_id == user_id).all()
+    return db.execute(_user_interaction_columns(user_id)).all()
+
+async def get_user_interactions_async(db: AsyncSession, user_id: int):
+    result = await db.execute(_user_interaction_columns(user_id))
+    return result.all()
+
+def _user_history_columns(user_id: int):
+    return select(
+        UserInteractionModel.product_id,
+        UserInteractionModel.interaction_type,
+        UserInteractionModel.interaction_value,
+    ).where(UserInteractionModel.user_id == user_id)
+
+def get_user_history(db: Session, user_id: int):
+    return db.execute(_user_history_columns(user_id)).all()
 
+async def get_user_history_async(db: AsyncSession, user_id: int):
+    result = await db.execute(_user_history_columns(user_id))
+    return result.all()
@@ -1,6 +1,19 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.vendor import VendorModel
 from typing import List
 
+def vendor_columns():
+    return select(VendorModel.id, VendorModel.name, VendorModel.description, VendorModel.rating)
+
 def get_vendors_by_ids(db: Session, vendor_ids: List[int]):
-    return db.query(VendorModel).filter(VendorModel.id.in_(vendor_ids)).all()
+    return db.execute(vendor_columns().where(VendorModel.id.in_(vendor_ids))).all()
+
+async def get_vendors_by_ids_async(db: AsyncSession, vendor_ids: List[int]):
+    result = await db.execute(vendor_columns().where(VendorModel.id.in_(vendor_ids)))
+    return result.all()
+
+def get_vendor_ratings(db: Session):
+    """Fetch (vendor id, rating) pairs for every vendor."""
+    return db.execute(select(VendorModel.id, VendorModel.rating)).all()
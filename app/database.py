@@ -5,7 +5,49 @@ from app.config import settings
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Async drivers for the sync URLs we are configured with
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if not _is_sqlite(url):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def _connect_args(url: str, asynchronous: bool) -> dict:
+    if _is_sqlite(url) or not settings.DB_STATEMENT_TIMEOUT_MS:
+        return {}
+    # Abort runaway queries server-side instead of holding a pooled connection
+    if asynchronous:
+        return {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+
+def async_database_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=_connect_args(SQLALCHEMY_DATABASE_URL, asynchronous=False),
+    **_engine_options(SQLALCHEMY_DATABASE_URL),
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -17,3 +59,32 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# The async engine is created on first use so that importing the models
+# (e.g. from Alembic) does not require the async driver to be installed.
+_async_engine = None
+_async_session_factory = None
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url = async_database_url(SQLALCHEMY_DATABASE_URL)
+        _async_engine = create_async_engine(
+            url, connect_args=_connect_args(url, asynchronous=True), **_engine_options(url)
+        )
+    return _async_engine
+
+def AsyncSessionLocal():
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_session_factory = async_sessionmaker(get_async_engine(), expire_on_commit=False, autoflush=False)
+    return _async_session_factory()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,254 @@
+"""Precompute top-K recommendations for every user and write them to the materialized store.
+
+Usage:
+    python -m app.jobs.materialize [--strategies user_based,item_based,content,tfrs] [--incremental]
+
+Users are scored in chunks across a process pool. Each finished chunk is
+saved under ``<output>/<strategy>/.run/``, so an interrupted run picks up
+where it stopped when started again with the same arguments. ``--incremental``
+only rescores users with interactions newer than the latest stored version
+(re-reading ``INTERACTION_ID_OVERLAP`` ids below its high-water mark, since
+ids commit out of order) and merges them into it. Serving processes pick new versions up within
+``MATERIALIZED_REFRESH_SECONDS``.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from app.config import settings
+from app.crud.interactions import get_last_interaction_id, get_user_ids_since
+from app.database import SessionLocal, engine
+from app.services.content import ContentIndex
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.item_similarity import get_item_neighbour_index
+from app.services.materialized import (
+    MATERIALIZED_STRATEGIES,
+    load_materialized,
+    merge_lists,
+    pack_lists,
+    prune_versions,
+    save_materialized,
+)
+from app.services.model_store import load_embedding_artifact
+from app.services.recommendation import (
+    score_products_content_based,
+    score_products_item_based,
+    score_products_user_based,
+)
+
+RUN_DIR = ".run"
+RUN_FILE = "run.json"
+
+# Scoring structures shared by the pool; forked workers inherit them copy-on-write
+_context = {}
+
+
+def build_context(strategies):
+    db = SessionLocal()
+    try:
+        # Read the high-water mark first, so events arriving during the build are rescored next time
+        context = {"computed_at": time.time(), "last_event_id": get_last_interaction_id(db)}
+        context["matrix"] = InteractionMatrix.from_db(db)
+        if "item_based" in strategies:
+            get_item_neighbour_index(context["matrix"])
+        if "content" in strategies:
+            context["content_index"] = ContentIndex.from_db(db)
+            context["content_index"].snapshot()
+        if "tfrs" in strategies:
+            context["retriever"] = load_embedding_artifact(settings.MODEL_ARTIFACT_DIR)
+        return context
+    finally:
+        db.close()
+
+
+def _init_worker(strategies):
+    # Only reached with spawn-based pools, where nothing is inherited
+    if not _context:
+        _context.update(build_context(strategies))
+
+
+def score_users(strategy: str, user_ids: np.ndarray, top_k: int):
+    """Score one chunk; returns (user ids, list lengths, flat product ids, flat scores)."""
+    matrix = _context["matrix"]
+    if strategy == "tfrs":
+        retriever = _context["retriever"]
+        # Users the model has never seen would only get the OOV embedding's neighbours
+        user_ids = user_ids[retriever.user_positions(user_ids) > 0]
+        scored = [(product_ids.astype(np.int64), scores) for product_ids, scores in retriever.recommend_batch(user_ids, top_k)]
+    elif strategy == "content":
+        index = _context["content_index"]
+        scored = [score_products_content_based(user_id, matrix, index, top_k) for user_id in user_ids.tolist()]
+    else:
+        score = score_products_user_based if strategy == "user_based" else score_products_item_based
+        scored = [score(user_id, matrix, top_k) for user_id in user_ids.tolist()]
+    counts = np.fromiter((len(product_ids) for product_ids, _ in scored), dtype=np.int64, count=len(scored))
+    if not len(scored):
+        return user_ids, counts, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return (
+        user_ids,
+        counts,
+        np.concatenate([np.asarray(product_ids, dtype=np.int64) for product_ids, _ in scored]),
+        np.concatenate([np.asarray(scores, dtype=np.float32) for _, scores in scored]),
+    )
+
+
+def run_chunk(strategy: str, chunk_path: str, user_ids: np.ndarray, top_k: int) -> int:
+    """Score a chunk and save it atomically, so a crash never leaves a partial chunk behind."""
+    users, counts, product_ids, scores = score_users(strategy, user_ids, top_k)
+    staging = f"{chunk_path}.tmp.npz"
+    np.savez(staging, user_ids=users, counts=counts, product_ids=product_ids, scores=scores)
+    os.replace(staging, chunk_path)
+    return len(user_ids)
+
+
+def _chunk_path(run_dir: str, chunk: int) -> str:
+    return os.path.join(run_dir, f"chunk-{chunk:06d}.npz")
+
+
+def prepare_run(root: str, strategy: str, top_k: int, chunk_size: int, incremental: bool):
+    """Resume the unfinished run with the same parameters, or plan a new one; returns (run dir, plan, users)."""
+    strategy_root = os.path.join(root, strategy)
+    run_dir = os.path.join(strategy_root, RUN_DIR)
+    try:
+        with open(os.path.join(run_dir, RUN_FILE)) as run_file:
+            plan = json.load(run_file)
+        if (plan["top_k"], plan["chunk_size"], plan["incremental"]) == (top_k, chunk_size, incremental):
+            logging.info(f"Resuming {strategy} run started at {time.ctime(plan['computed_at'])}.")
+            return run_dir, plan, np.load(os.path.join(run_dir, "users.npy"))
+        logging.info(f"Discarding unfinished {strategy} run with different parameters.")
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+    matrix = _context["matrix"]
+    model_version = _context["retriever"].version if strategy == "tfrs" else None
+    base = None
+    if incremental:
+        try:
+            base = load_materialized(root, strategy)
+        except FileNotFoundError:
+            logging.info(f"No previous {strategy} store; running a full materialization.")
+        if base is not None and base.manifest.get("model_version") != model_version:
+            logging.info(f"Model changed since {base.version}; running a full {strategy} materialization.")
+            base = None
+
+    if base is None:
+        users = np.asarray(matrix.user_ids, dtype=np.int64)
+    else:
+        db = SessionLocal()
+        try:
+            # Also the window below the mark, where transactions that committed late can add events
+            since = max(0, base.manifest["last_event_id"] - settings.INTERACTION_ID_OVERLAP)
+            users = np.asarray(sorted(get_user_ids_since(db, since)), dtype=np.int64)
+        finally:
+            db.close()
+        # Stop at the snapshot the scoring structures were built from
+        users = users[np.isin(users, matrix.user_ids)]
+
+    plan = {
+        "top_k": top_k,
+        "chunk_size": chunk_size,
+        "incremental": incremental,
+        "base_version": base.version if base is not None else None,
+        "last_event_id": _context["last_event_id"],
+        "computed_at": _context["computed_at"],
+        "model_version": model_version,
+    }
+    os.makedirs(run_dir)
+    np.save(os.path.join(run_dir, "users.npy"), users)
+    with open(os.path.join(run_dir, RUN_FILE), "w") as run_file:
+        json.dump(plan, run_file, indent=2)
+    return run_dir, plan, users
+
+
+def materialize_strategy(root: str, strategy: str, top_k: int, chunk_size: int, incremental: bool, pool) -> str:
+    run_dir, plan, users = prepare_run(root, strategy, top_k, chunk_size, incremental)
+    chunks = [users[start:start + chunk_size] for start in range(0, len(users), chunk_size)]
+    pending = [chunk for chunk in range(len(chunks)) if not os.path.exists(_chunk_path(run_dir, chunk))]
+    done = len(users) - sum(len(chunks[chunk]) for chunk in pending)
+
+    started = time.perf_counter()
+    scored = 0
+    if pool is None:
+        results = (run_chunk(strategy, _chunk_path(run_dir, chunk), chunks[chunk], top_k) for chunk in pending)
+    else:
+        results = (future.result() for future in as_completed([
+            pool.submit(run_chunk, strategy, _chunk_path(run_dir, chunk), chunks[chunk], top_k) for chunk in pending
+        ]))
+    for n_users in results:
+        scored += n_users
+        elapsed = time.perf_counter() - started
+        logging.info(
+            f"{strategy}: {done + scored}/{len(users)} users, {scored / max(elapsed, 1e-9):.0f} users/s."
+        )
+    elapsed = time.perf_counter() - started
+    users_per_second = scored / elapsed if elapsed > 0 else 0.0
+
+    parts = [np.load(_chunk_path(run_dir, chunk)) for chunk in range(len(chunks))]
+    arrays = [
+        np.concatenate([part[name] for part in parts]) if parts else np.empty(0, dtype=dtype)
+        for name, dtype in (("user_ids", np.int64), ("counts", np.int64), ("product_ids", np.int64), ("scores", np.float32))
+    ]
+    if plan["base_version"] is not None:
+        packed = merge_lists(load_materialized(root, strategy, plan["base_version"]), *arrays)
+    else:
+        packed = pack_lists(*arrays)
+    version = save_materialized(
+        root, strategy, *packed,
+        metadata={**plan, "rescored_users": len(users), "users_per_second": round(users_per_second, 1)},
+    )
+    shutil.rmtree(run_dir, ignore_errors=True)
+    logging.info(f"Materialized {strategy} for {len(users)} users ({users_per_second:.0f} users/s) as {version}.")
+    return version
+
+
+def _create_pool(workers: int, strategies):
+    if workers <= 0:
+        return None
+    if "fork" in multiprocessing.get_all_start_methods():
+        # Forked workers share the parent's matrices instead of rebuilding them; drop pooled connections first
+        engine.dispose()
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(strategies,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=settings.MATERIALIZED_DIR)
+    parser.add_argument("--strategies", default="user_based,item_based,content",
+                        help=f"comma-separated subset of {', '.join(MATERIALIZED_STRATEGIES)}")
+    parser.add_argument("--top-k", type=int, default=settings.MATERIALIZED_TOP_K)
+    parser.add_argument("--chunk-size", type=int, default=settings.MATERIALIZED_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="0 scores in-process")
+    parser.add_argument("--incremental", action="store_true", help="only rescore users active since the last version")
+    parser.add_argument("--keep", type=int, default=3, help="versions to keep per strategy")
+    args = parser.parse_args()
+
+    strategies = [strategy for strategy in args.strategies.split(",") if strategy]
+    unknown = set(strategies) - set(MATERIALIZED_STRATEGIES)
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    _context.update(build_context(strategies))
+    pool = _create_pool(args.workers, strategies)
+    try:
+        for strategy in strategies:
+            materialize_strategy(args.output, strategy, args.top_k, args.chunk_size, args.incremental, pool)
+            prune_versions(args.output, strategy, keep=args.keep)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    logging.info(f"Materialization finished in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Coordinator for the shared serving mode: build the serving structures once and publish them for every worker.
+
+Usage:
+    python -m app.jobs.publish_state [--output artifacts/shared] [--interval 60] [--once]
+
+Each cycle rebuilds the interaction matrix, the item neighbour index and the
+content index from the database, applies new events to the popularity
+counters and writes everything as one versioned snapshot of ``.npy`` files.
+Uvicorn workers started with ``SHARED_STATE_DIR`` pointing at the same
+directory memory-map the snapshot read-only instead of building their own
+copies, so the page cache holds the data once however many workers run, and
+they switch to each new version within ``SHARED_STATE_REFRESH_SECONDS``.
+A cycle is skipped when no interaction arrived and no embedding model was
+trained since the last snapshot.
+"""
+import argparse
+import logging
+import time
+
+from app.config import settings
+from app.crud.interactions import get_last_interaction_id
+from app.database import SessionLocal
+from app.services.content import ContentIndex
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.item_similarity import build_item_neighbour_index
+from app.services.model_store import latest_version
+from app.services.popularity import PopularityIndex, refresh_popularity_index
+from app.services.shared_state import prune_shared_states, save_shared_state
+
+
+def publish(root: str, popularity: PopularityIndex, previous: dict = None):
+    """Build and save one snapshot; returns its (version, metadata), or None when nothing changed."""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        # Read the high-water mark first, so events arriving during the build go into the next snapshot
+        metadata = {
+            "last_event_id": get_last_interaction_id(db),
+            "tfrs_version": latest_version(settings.MODEL_ARTIFACT_DIR),
+        }
+        if previous is not None and all(previous.get(key) == value for key, value in metadata.items()):
+            return None
+        matrix = InteractionMatrix.from_db(db)
+        item_index = build_item_neighbour_index(matrix, k=settings.ITEM_SIMILARITY_TOP_K)
+        content_index = ContentIndex.from_db(db)
+        refresh_popularity_index(popularity, db)
+    finally:
+        db.close()
+    metadata["build_seconds"] = round(time.perf_counter() - started, 2)
+    return save_shared_state(root, matrix, item_index, content_index, popularity, metadata=metadata), metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=settings.SHARED_STATE_DIR or "artifacts/shared")
+    parser.add_argument("--interval", type=float, default=settings.SHARED_STATE_PUBLISH_SECONDS)
+    parser.add_argument("--once", action="store_true", help="publish one snapshot and exit")
+    parser.add_argument("--keep", type=int, default=3, help="snapshots to keep")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # The popularity counters are incremental, so they live for the whole run
+    popularity = PopularityIndex()
+    previous = None
+    while True:
+        try:
+            published = publish(args.output, popularity, previous)
+            if published is not None:
+                previous = published[1]
+                prune_shared_states(args.output, keep=args.keep)
+        except Exception:
+            if args.once:
+                raise
+            logging.exception("Failed to publish shared state.")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Train the implicit ALS matrix-factorization model offline and save a versioned embedding artifact.
+
+Usage:
+    python -m app.jobs.train_als [--output artifacts/tfrs] [--iterations 15] [--threads 0]
+
+The interaction matrix is built from the database (interaction type weight
+times ``interaction_value`` per user and product) and factorised on every
+core. The factors are written in the same artifact layout as
+``app.jobs.train_tfrs``, with ``"model": "als"`` in the manifest, so the
+embedding routes serve whichever model was trained last; pass ``--output`` to
+keep the two apart. Running services pick the new version up on restart or
+through ``POST /api/v1/admin/models/reload``.
+"""
+import argparse
+import logging
+import time
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.matrix_factorization import ALSRecommender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=settings.MODEL_ARTIFACT_DIR)
+    parser.add_argument("--factors", type=int, default=settings.ALS_FACTORS)
+    parser.add_argument("--iterations", type=int, default=settings.ALS_ITERATIONS)
+    parser.add_argument("--regularization", type=float, default=settings.ALS_REGULARIZATION)
+    parser.add_argument("--alpha", type=float, default=settings.ALS_ALPHA)
+    parser.add_argument("--threads", type=int, default=settings.ALS_THREADS, help="0 uses every core")
+    parser.add_argument("--index", default=settings.TFRS_INDEX, choices=["brute_force", "ivf"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        matrix = InteractionMatrix.from_db(db)
+    finally:
+        db.close()
+
+    recommender = ALSRecommender(
+        factors=args.factors, regularization=args.regularization, alpha=args.alpha, threads=args.threads
+    )
+    recommender.train(matrix, iterations=args.iterations)
+    if args.index != settings.TFRS_INDEX:
+        recommender.build_index(kind=args.index)
+    version = recommender.save_artifact(
+        args.output,
+        metadata={
+            "iterations": args.iterations,
+            "threads": recommender.threads,
+            "training_seconds": round(time.perf_counter() - started, 1),
+        },
+    )
+    logging.info(f"Trained ALS model version {version}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Train the TFRS retrieval model offline and save a versioned embedding artifact.
+
+Usage:
+    python -m app.jobs.train_tfrs [--output artifacts/tfrs] [--epochs 5] [--warm-start]
+
+Interactions are streamed from the database in chunks and weighted by
+interaction type and value. ``--warm-start`` initialises the embeddings from
+the latest artifact so only a few epochs are needed to absorb new data.
+Running services pick the new version up on restart or through
+``POST /api/v1/admin/models/reload``.
+"""
+import argparse
+import logging
+import time
+
+from app.config import settings
+from app.crud.interactions import get_item_ids, get_user_ids, stream_interactions
+from app.database import SessionLocal
+from app.services.interaction_matrix import interaction_rows_to_arrays
+from app.services.model_store import latest_version, load_embedding_artifact
+from app.services.tf_recommender import TFRecommender
+
+
+def interaction_chunks(chunk_size):
+    """Callable for TFRecommender.train: streams (user_ids, item_ids, weights) from a fresh session."""
+    def chunks():
+        db = SessionLocal()
+        try:
+            for rows in stream_interactions(db, chunk_size):
+                yield interaction_rows_to_arrays(rows)
+        finally:
+            db.close()
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=settings.MODEL_ARTIFACT_DIR)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=settings.TFRS_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=settings.TRAINING_CHUNK_SIZE)
+    parser.add_argument("--index", default=settings.TFRS_INDEX, choices=["brute_force", "ivf"])
+    parser.add_argument("--warm-start", action="store_true", help="continue from the latest artifact's embeddings")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        user_ids = get_user_ids(db)
+        item_ids = get_item_ids(db)
+    finally:
+        db.close()
+
+    recommender = TFRecommender(user_ids=user_ids, item_ids=item_ids)
+    warm_started_from = None
+    if args.warm_start and latest_version(args.output):
+        previous = load_embedding_artifact(args.output)
+        recommender.warm_start(previous)
+        warm_started_from = previous.version
+
+    recommender.train(chunks=interaction_chunks(args.chunk_size), epochs=args.epochs, batch_size=args.batch_size)
+    if args.index != settings.TFRS_INDEX:
+        recommender.build_index(kind=args.index)
+    version = recommender.save_artifact(
+        args.output,
+        metadata={
+            "model": "tfrs",
+            "epochs": args.epochs,
+            "batch_size": args.batch_size,
+            "warm_started_from": warm_started_from,
+            "training_seconds": round(time.perf_counter() - started, 1),
+        },
+    )
+    logging.info(f"Trained TFRS model version {version}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.routes.health import router as health_router
+from app.routes.interactions import router as interactions_router
+from app.routes.metrics import router as metrics_router
 from app.routes.recommendation import router as recommendation_router
 from app.database import SessionLocal
 from app.models.recommendation import UserInteractionModel
+from app.services.metrics import MetricsMiddleware, instrument_engines
+from app.services.strategies import StrategyNotReady
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -15,18 +21,26 @@ app = FastAPI(
     version="1.0.0",
     openapi_tags=[
         {"name": "recommendations", "description": "Operations related to product recommendations"},
+        {"name": "interactions", "description": "Recording user interaction events"},
     ],
 )
 
-# Global variables to store the trained LightFM model and dataset
-lightfm_model = None
-lightfm_dataset = None
+# Per-route latency, SQL time and query counts, exposed on /metrics
+instrument_engines()
+app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Application startup")
     # Placeholder for model training logic, if needed in the future
 
+@app.exception_handler(StrategyNotReady)
+async def strategy_not_ready(request: Request, error: StrategyNotReady):
+    # Strategies load in the background after startup; /health/ready turns 200 once they have
+    return JSONResponse(
+        {"detail": f"The {error} strategy is still loading"}, status_code=503, headers={"Retry-After": "5"}
+    )
+
 @app.get("/")
 def read_root():
     logger.info("Root endpoint accessed.")
@@ -34,3 +48,6 @@ def read_root():
 
 # Include the router
 app.include_router(recommendation_router, prefix="/api/v1", tags=["recommendations"])
+app.include_router(interactions_router, prefix="/api/v1", tags=["interactions"])
+app.include_router(metrics_router)
+app.include_router(health_router)
@@ -0,0 +1,43 @@
+"""Composite indexes for interaction lookups
+
+Revision ID: b41e7c2d9a53
+Revises: 6f792de19074
+Create Date: 2026-10-18 09:12:44.310275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e7c2d9a53'
+down_revision: Union[str, None] = '6f792de19074'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build without locking writes on Postgres; CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_interactions_user_product_value', 'user_interactions',
+            ['user_id', 'product_id', 'interaction_value'], unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_user_interactions_product_user', 'user_interactions',
+            ['product_id', 'user_id'], unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            op.f('ix_products_vendor_id'), 'products', ['vendor_id'], unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_products_vendor_id'), table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_user_interactions_product_user', table_name='user_interactions', postgresql_concurrently=True)
+        op.drop_index(
+            'ix_user_interactions_user_product_value', table_name='user_interactions', postgresql_concurrently=True,
+        )
@@ -0,0 +1,33 @@
+"""Add created_at to user_interactions
+
+Revision ID: d7a3f0e5c812
+Revises: b41e7c2d9a53
+Create Date: 2026-10-18 11:03:27.518093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3f0e5c812'
+down_revision: Union[str, None] = 'b41e7c2d9a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # now() is evaluated once, so Postgres adds the column without rewriting the table;
+    # existing rows are stamped with the migration time. Batch mode only matters for
+    # SQLite, which cannot ADD COLUMN with a non-constant default.
+    with op.batch_alter_table('user_interactions') as batch_op:
+        batch_op.add_column(
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False)
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('user_interactions') as batch_op:
+        batch_op.drop_column('created_at')
@@ -11,7 +11,7 @@ class ProductModel(BaseModel):
     name = Column(String, index=True)
     description = Column(String)
     price = Column(Float)
-    vendor_id = Column(Integer, ForeignKey("vendors.id"))
+    vendor_id = Column(Integer, ForeignKey("vendors.id"), index=True)
 
     interactions = relationship("UserInteractionModel", back_populates="product")
     vendor = relationship("VendorModel", back_populates="products")
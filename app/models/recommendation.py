@@ -1,15 +1,22 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, Float
+from sqlalchemy import Column, DateTime, Integer, ForeignKey, String, Float, Index, func
 from sqlalchemy.orm import relationship
 from app.database import BaseModel
 
 class UserInteractionModel(BaseModel):
     __tablename__ = "user_interactions"
-    
+    __table_args__ = (
+        # Covers per-user history lookups and the DISTINCT user_id scan without touching the heap
+        Index("ix_user_interactions_user_product_value", "user_id", "product_id", "interaction_value"),
+        # Per-product lookups (who interacted with this item)
+        Index("ix_user_interactions_product_user", "product_id", "user_id"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"))
     interaction_type = Column(String, nullable=False)
     interaction_value = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     product = relationship("ProductModel", back_populates="interactions")
 
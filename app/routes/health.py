@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.strategies import is_ready, strategy_status
+
+router = APIRouter()
+
+
+@router.get("/health/live", include_in_schema=False)
+def liveness():
+    # The process is up and serving; SQL-backed routes work before the strategies finish loading
+    return {"status": "alive"}
+
+
+@router.get("/health/ready", include_in_schema=False)
+def readiness():
+    # 503 until every enabled strategy has loaded, so load balancers hold traffic back until then
+    ready = is_ready()
+    return JSONResponse(
+        {"status": "ready" if ready else "starting", "strategies": strategy_status()},
+        status_code=200 if ready else 503,
+    )
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Body, HTTPException
+from typing import List
+import logging
+from app.config import settings
+from app.schemas.recommendation import UserInteractionSchema
+from app.services.ingestion import BufferFullError, interaction_buffer
+
+router = APIRouter()
+
+
+def _accept(events: List[UserInteractionSchema]):
+    # Product ids are checked once per flush; events for unknown products are dropped and counted there
+    try:
+        interaction_buffer.submit([event.model_dump() for event in events])
+    except BufferFullError as error:
+        logging.warning(str(error))
+        # Tell producers to back off until the flusher catches up
+        raise HTTPException(
+            status_code=503,
+            detail="Interaction buffer is full, retry later",
+            headers={"Retry-After": str(max(1, int(settings.INGEST_FLUSH_INTERVAL_SECONDS)))},
+        )
+    return {"accepted": len(events), "pending": len(interaction_buffer)}
+
+@router.post("/interactions", status_code=202)
+async def record_interaction(interaction: UserInteractionSchema):
+    return _accept([interaction])
+
+@router.post("/interactions/bulk", status_code=202)
+async def record_interactions_bulk(interactions: List[UserInteractionSchema] = Body(..., max_length=10000)):
+    return _accept(interactions)
+
+@router.get("/interactions/buffer")
+async def get_buffer_stats():
+    return interaction_buffer.stats()
+
+@router.on_event("startup")
+async def start_interaction_buffer():
+    interaction_buffer.start()
+
+@router.on_event("shutdown")
+async def flush_interaction_buffer():
+    await interaction_buffer.stop()
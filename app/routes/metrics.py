@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+from app.services.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Scraped by Prometheus, so it lives outside the versioned API prefix
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
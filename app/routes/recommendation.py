@@ -1,139 +1,476 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db, SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal, get_async_db, SessionLocal
 from app.services.recommendation import (
-    recommend_products,
-    recommend_products_content_based,
-    recommend_products_hybrid,
-    recommend_products_item_based,
-    recommend_products_user_based,
-    recommend_vendors,
+    recommend_products_async,
+    recommend_products_content_based_async,
+    recommend_products_hybrid_async,
+    recommend_products_item_based_async,
+    recommend_products_popular_async,
+    recommend_products_user_based_async,
+    recommend_vendors_async,
+    score_products_popular,
 )
+from app.routes.responses import page_offset, paginated_response, rows_to_dicts, schema_fields
 from app.schemas.product import ProductSchema
 from app.schemas.vendor import VendorSchema
-from app.schemas.recommendation import RecommendationResponseSchema
-from typing import List
+from app.schemas.recommendation import (
+    BatchRecommendationRequestSchema,
+    BatchRecommendationResponseSchema,
+    RecommendationResponseSchema,
+)
+from typing import List, Literal, Optional
 import logging
 from app.models.vendor import VendorModel
 from app.models.product import ProductModel
 from app.models.recommendation import UserInteractionModel
-from app.crud.product import get_products_by_ids
-from app.crud.interactions import get_interactions, get_item_ids, get_user_ids
-from app.services.tf_recommender import TFRecommender
+from app.services.batch import (
+    recommend_batch_collaborative,
+    recommend_batch_embeddings,
+    recommend_batch_history_async,
+)
+from app.services.cache import recommendation_cache
+from app.services.concurrency import StrategyOverloaded, strategy_limiter
+from app.services.content import current_content_index, record_products
+from app.services.embeddings import get_active_retriever, set_active_retriever
+from app.services.fold_in import folded_user_vector
+from app.services.interaction_matrix import current_interaction_matrix, record_interactions
+from app.services.item_similarity import current_item_neighbour_index
+from app.services.materialized import load_materialized_stores, lookup_materialized, start_materialized_refresher
+from app.services.metrics import observe_strategy, record_cache_lookup, record_load_shed, timed_stage
+from app.services.model_store import list_versions, load_embedding_artifact
+from app.services.popularity import get_popularity_index
+from app.services.reranking import RerankRequest, record_product_attributes
+from app.services.strategies import StrategyNotReady, is_enabled, is_strategy_ready, start_warm_up
+from app.services.vendor_affinity import current_vendor_affinity_index
 router = APIRouter()
 
-# Initialize the TFRS model globally
-tf_recommender = None
-
 
 logging.info("Defining routes for the recommendation service...")
 
+DEGRADED_HEADER = "X-Degraded-Strategies"
+FALLBACK_HEADER = "X-Fallback"
+
+async def _cached(strategy: str, user_id, compute, params: dict = None, model_version=None, fallback=None):
+    """Serve from the response cache, computing misses once however many requests ask concurrently.
+
+    With a ``fallback``, computations run under the strategy's concurrency
+    limiter and requests it sheds get ``await fallback()`` instead.
+    """
+    computed = False
+
+    async def observed_compute():
+        nonlocal computed
+        computed = True
+        if fallback is None:
+            with observe_strategy(strategy):
+                return await compute()
+        async with strategy_limiter(strategy).slot():
+            with observe_strategy(strategy):
+                return await compute()
+
+    # Responses are cached as plain dicts so they can live in the shared tier too
+    try:
+        value = await recommendation_cache.get_or_compute_async(
+            strategy, user_id, observed_compute, params=params, model_version=model_version
+        )
+    except StrategyOverloaded:
+        if fallback is None:
+            raise
+        record_load_shed(strategy)
+        return await fallback()
+    record_cache_lookup(strategy, hit=not computed)
+    return value
+
+def _popular_fallback(strategy: str, limit: int, offset: int, rerank: RerankRequest, headers: dict):
+    """Popular products for requests shed by ``strategy``'s limiter, flagged as degraded in ``headers``."""
+    async def fallback():
+        index = get_popularity_index()
+        if index is None:
+            raise HTTPException(status_code=503, detail=f"The {strategy} strategy is overloaded", headers={"Retry-After": "1"})
+        headers[DEGRADED_HEADER] = strategy
+        headers[FALLBACK_HEADER] = "popular"
+        # Same cache entries as the popular route, so a burst of shed requests is served from memory
+        return await _cached(
+            "popular",
+            None,
+            _serializer(ProductSchema, lambda db: recommend_products_popular_async(db, limit=limit + 1, offset=offset, rerank=rerank)),
+            params={"limit": limit, "offset": offset, **rerank.cache_params()},
+            model_version=index.version,
+        )
+    return fallback
+
+def _check_strategy(name: str, ready: bool = True):
+    if not is_enabled(name):
+        raise HTTPException(status_code=404, detail=f"The {name} strategy is not enabled")
+    # Until warm-up loaded it; building it here would block the event loop for every route
+    if ready and not is_strategy_ready(name):
+        raise StrategyNotReady(name)
+
+def _require_strategy(name: str, ready: bool = True):
+    return Depends(lambda: _check_strategy(name, ready))
+
+def _rerank_params(
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    vendor_ids: Optional[List[int]] = Query(None, description="Only products of these vendors"),
+    exclude_seen: bool = Query(False, description="Drop products the user already interacted with"),
+    diversity: float = Query(0.0, ge=0.0, le=1.0, description="Vendor diversity (MMR trade-off); 0 ranks by score only"),
+) -> RerankRequest:
+    # Any constraint routes the request through candidate generation plus re-ranking
+    return RerankRequest(min_price, max_price, vendor_ids, exclude_seen, diversity)
+
+def _serializer(schema, recommend):
+    """``recommend(db)``'s rows as dicts, read in a session of the computation's own.
+
+    The computation is shared by every request coalesced on its key and can
+    outlive the one that started it, so it must not use that request's session.
+    """
+    fields = schema_fields(schema)
+
+    async def compute():
+        async with AsyncSessionLocal() as db:
+            rows = await recommend(db)
+        with timed_stage("serialization"):
+            return rows_to_dicts(rows, fields)
+    return compute
+
+# Registered before /recommendations/{user_id} so "popular" is not parsed as a user id
+@router.get("/recommendations/popular", response_model=List[ProductSchema], dependencies=[_require_strategy("popularity")])
+async def get_popular_recommendations(
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    vendor_id: Optional[int] = None,
+    rerank: RerankRequest = Depends(_rerank_params),
+):
+    index = get_popularity_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Popularity rankings are not available yet")
+    offset = page_offset(offset, cursor)
+    recommendations = await _cached(
+        "popular",
+        None,
+        _serializer(ProductSchema, lambda db: recommend_products_popular_async(db, limit=limit + 1, offset=offset, vendor_id=vendor_id, rerank=rerank)),
+        # Not keyed as a user: vendor ids would share the generations interactions bump for user ids
+        params={"limit": limit, "offset": offset, "vendor_id": vendor_id, **rerank.cache_params()},
+        model_version=index.version,
+    )
+    if not recommendations:
+        raise HTTPException(status_code=404, detail="No popular products found")
+    return paginated_response(request, recommendations, limit, offset)
+
 @router.get("/recommendations/{user_id}", response_model=RecommendationResponseSchema)
-def get_recommendations(user_id: int, db: Session = Depends(get_db)):
-    recommendations = recommend_products(user_id, db)
+async def get_recommendations(
+    user_id: int,
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+):
+    offset = page_offset(offset, cursor)
+    recommendations = await _cached(
+        "history",
+        user_id,
+        _serializer(ProductSchema, lambda db: recommend_products_async(user_id, db, limit=limit + 1, offset=offset)),
+        params={"limit": limit, "offset": offset},
+    )
     if not recommendations:
         raise HTTPException(status_code=404, detail="No recommendations found")
-    return {"recommendations": [ProductSchema.from_orm(product) for product in recommendations]}
+    return paginated_response(request, recommendations, limit, offset, envelope=lambda page: {"recommendations": page})
 
-@router.get("/recommendations/collaborative/{user_id}", response_model=List[ProductSchema])
-def get_recommendations_collaborative(user_id: int, db: Session = Depends(get_db)):
-    recommendations = recommend_products_user_based(user_id, db)
+@router.get("/recommendations/collaborative/{user_id}", response_model=List[ProductSchema], dependencies=[_require_strategy("user_based")])
+async def get_recommendations_collaborative(
+    user_id: int,
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    rerank: RerankRequest = Depends(_rerank_params),
+):
+    offset = page_offset(offset, cursor)
+    headers = {}
+    recommendations = await _cached(
+        "user_based",
+        user_id,
+        _serializer(ProductSchema, lambda db: recommend_products_user_based_async(user_id, db, limit=limit + 1, offset=offset, rerank=rerank)),
+        params={"limit": limit, "offset": offset, **rerank.cache_params()},
+        fallback=_popular_fallback("user_based", limit, offset, rerank, headers),
+    )
     if not recommendations:
         logging.info(f"No collaborative recommendations found for user {user_id}.")
         raise HTTPException(status_code=404, detail="No recommendations found")
     
     logging.info(f"Found {len(recommendations)} collaborative recommendations for user {user_id}.")
-    return [ProductSchema.from_orm(product) for product in recommendations]
+    return paginated_response(request, recommendations, limit, offset, headers=headers)
 
-@router.get("/recommendations/content/{user_id}", response_model=List[ProductSchema])
-def get_recommendations_content(user_id: int, db: Session = Depends(get_db)):
-    recommendations = recommend_products_content_based(user_id, db)
+@router.get("/recommendations/item-based/{user_id}", response_model=List[ProductSchema], dependencies=[_require_strategy("item_based")])
+async def get_recommendations_item_based(
+    user_id: int,
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    rerank: RerankRequest = Depends(_rerank_params),
+):
+    offset = page_offset(offset, cursor)
+    matrix = current_interaction_matrix()
+    headers = {}
+    recommendations = await _cached(
+        "item_based",
+        user_id,
+        _serializer(ProductSchema, lambda db: recommend_products_item_based_async(user_id, db, limit=limit + 1, offset=offset, rerank=rerank)),
+        params={"limit": limit, "offset": offset, **rerank.cache_params()},
+        model_version=current_item_neighbour_index(matrix).matrix_version,
+        fallback=_popular_fallback("item_based", limit, offset, rerank, headers),
+    )
+    if not recommendations:
+        logging.info(f"No item-based recommendations found for user {user_id}.")
+        raise HTTPException(status_code=404, detail="No item-based recommendations found")
+    return paginated_response(request, recommendations, limit, offset, headers=headers)
+
+@router.get("/recommendations/content/{user_id}", response_model=List[ProductSchema], dependencies=[_require_strategy("content")])
+async def get_recommendations_content(
+    user_id: int,
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    rerank: RerankRequest = Depends(_rerank_params),
+):
+    offset = page_offset(offset, cursor)
+    index = current_content_index()
+    headers = {}
+    recommendations = await _cached(
+        "content",
+        user_id,
+        _serializer(ProductSchema, lambda db: recommend_products_content_based_async(user_id, db, limit=limit + 1, offset=offset, rerank=rerank)),
+        params={"limit": limit, "offset": offset, **rerank.cache_params()},
+        model_version=index.version,
+        fallback=_popular_fallback("content", limit, offset, rerank, headers),
+    )
     if not recommendations:
         raise HTTPException(status_code=404, detail="No content-based recommendations found")
-    return [ProductSchema.from_orm(product) for product in recommendations]
+    return paginated_response(request, recommendations, limit, offset, headers=headers)
+
+def _hybrid_model_version():
+    """The versions of the structures hybrid fuses; user-based results are invalidated per user instead."""
+    matrix, content, retriever = current_interaction_matrix(), current_content_index(), get_active_retriever()
+    neighbours = current_item_neighbour_index(matrix) if matrix is not None else None
+    return (
+        f"item:{getattr(neighbours, 'matrix_version', None)}"
+        f"|content:{getattr(content, 'version', None)}"
+        f"|tfrs:{getattr(retriever, 'version', None)}"
+    )
 
 @router.get("/recommendations/hybrid/{user_id}", response_model=List[ProductSchema])
-def get_recommendations_hybrid(user_id: int, db: Session = Depends(get_db)):
-    recommendations = recommend_products_hybrid(user_id, db)
+async def get_recommendations_hybrid(
+    user_id: int,
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fusion: Optional[Literal["rrf", "weighted"]] = None,
+    rerank: RerankRequest = Depends(_rerank_params),
+):
+    offset = page_offset(offset, cursor)
+    params = {"limit": limit, "offset": offset, "fusion": fusion, **rerank.cache_params()}
+    headers = {}
+    key, recommendations = await recommendation_cache.lookup_async("hybrid", user_id, params, _hybrid_model_version())
+    record_cache_lookup("hybrid", hit=recommendations is not None)
+    if recommendations is None:
+        async def compute():
+            async with strategy_limiter("hybrid").slot():
+                with observe_strategy("hybrid"):
+                    # Shared by coalesced requests, so not in the session of the one that started it
+                    with timed_stage("scoring"):
+                        async with AsyncSessionLocal() as db:
+                            products, degraded = await recommend_products_hybrid_async(
+                                user_id, db, limit=limit + 1, offset=offset, method=fusion, rerank=rerank
+                            )
+                    with timed_stage("serialization"):
+                        computed = rows_to_dicts(products, schema_fields(ProductSchema))
+            # Partial results are served but never cached
+            if not degraded:
+                await recommendation_cache.store_async(key, computed)
+            return computed, degraded
+
+        # Not get_or_compute_async: concurrent misses share the computation, degraded list included
+        try:
+            recommendations, degraded = await recommendation_cache.flights.run(key, compute)
+        except StrategyOverloaded:
+            record_load_shed("hybrid")
+            recommendations = await _popular_fallback("hybrid", limit, offset, rerank, headers)()
+        else:
+            if degraded:
+                headers[DEGRADED_HEADER] = ",".join(degraded)
     if not recommendations:
         raise HTTPException(status_code=404, detail="No hybrid recommendations found")
-    return [ProductSchema.from_orm(product) for product in recommendations]
+    return paginated_response(request, recommendations, limit, offset, headers=headers)
 
-@router.get("/vendor-recommendations/{user_id}", response_model=List[VendorSchema])
-def get_vendor_recommendations(user_id: int, db: Session = Depends(get_db)):
-    recommendations = recommend_vendors(user_id, db)
-    
+# Served from an aggregate query until the affinity index is built, so not held back by warm-up
+@router.get("/vendor-recommendations/{user_id}", response_model=List[VendorSchema], dependencies=[_require_strategy("vendors", ready=False)])
+async def get_vendor_recommendations(
+    user_id: int,
+    request: Request,
+    limit: int = Query(settings.DEFAULT_RECOMMENDATION_LIMIT, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    new_only: bool = Query(False, description="Only vendors the user has not interacted with yet"),
+):
+    offset = page_offset(offset, cursor)
+    index = current_vendor_affinity_index()
+    recommendations = await _cached(
+        "vendors",
+        user_id,
+        _serializer(VendorSchema, lambda db: recommend_vendors_async(user_id, db, limit=limit + 1, offset=offset, new_only=new_only)),
+        params={"limit": limit, "offset": offset, "new_only": new_only},
+        model_version=index.matrix_version if index is not None else None,
+    )
     if not recommendations:
         logging.info(f"No vendor recommendations found for user {user_id}.")
         raise HTTPException(status_code=404, detail="No recommendations found")
     
     logging.info(f"Found {len(recommendations)} vendor recommendations for user {user_id}.")
-    return [VendorSchema.from_orm(vendor) for vendor in recommendations]
-
-
-
+    return paginated_response(request, recommendations, limit, offset)
 
 @router.post("/create_dummy_data/")
-def create_dummy_data(db: Session = Depends(get_db)):
+async def create_dummy_data(db: AsyncSession = Depends(get_async_db)):
     logging.info("Creating dummy data...")
     # Create dummy vendors
     vendor1 = VendorModel(name="Tech Store", description="Your one-stop shop for tech gadgets", rating=4.5)
     vendor2 = VendorModel(name="Gadget Hub", description="Latest and greatest in tech", rating=4.7)
     db.add_all([vendor1, vendor2])
-    db.commit()
-    db.refresh(vendor1)
-    db.refresh(vendor2)
+    await db.commit()
+    await db.refresh(vendor1)
+    await db.refresh(vendor2)
 
     # Create dummy products
     product1 = ProductModel(name="Smartphone X", description="Latest smartphone with amazing features", price=999.99, vendor_id=vendor1.id)
     product2 = ProductModel(name="Laptop Pro", description="High-performance laptop for professionals", price=1299.99, vendor_id=vendor2.id)
     product3 = ProductModel(name="Smartwatch Z", description="Smartwatch with health tracking features", price=199.99, vendor_id=vendor1.id)
     db.add_all([product1, product2, product3])
-    db.commit()
-    db.refresh(product1)
-    db.refresh(product2)
-    db.refresh(product3)
+    await db.commit()
+    await db.refresh(product1)
+    await db.refresh(product2)
+    await db.refresh(product3)
+    record_products([product1, product2, product3])
+    record_product_attributes([product1, product2, product3])
 
     # Create dummy user interactions
     interaction1 = UserInteractionModel(user_id=1, product_id=product1.id, interaction_type="view", interaction_value=1.0)
     interaction2 = UserInteractionModel(user_id=1, product_id=product2.id, interaction_type="purchase", interaction_value=1.0)
     interaction3 = UserInteractionModel(user_id=2, product_id=product3.id, interaction_type="view", interaction_value=1.0)
     db.add_all([interaction1, interaction2, interaction3])
-    db.commit()
+    await db.commit()
+    record_interactions([
+        (interaction.user_id, interaction.product_id, interaction.interaction_type, interaction.interaction_value)
+        for interaction in (interaction1, interaction2, interaction3)
+    ])
 
     logging.info("Dummy data created successfully.")
     return {"status": "success", "vendors": [vendor1, vendor2], "products": [product1, product2, product3], "interactions": [interaction1, interaction2, interaction3]}
 
 @router.on_event("startup")
-def initialize_tf_recommender():
-    global tf_recommender
+def warm_up_strategies():
+    # Enabled strategies load in the background; /health/ready reports when they are done
+    start_warm_up(SessionLocal)
 
-    # Create a new database session
-    db: Session = SessionLocal()
+@router.on_event("startup")
+def load_materialized_recommendations():
+    # Lists precomputed by app.jobs.materialize; routes fall back to online scoring without them
+    load_materialized_stores()
+    start_materialized_refresher()
 
-    try:
-        # Fetch user_ids, item_ids, and interactions from the database
-        user_ids = get_user_ids(db)
-        item_ids = get_item_ids(db)
-        interactions = get_interactions(db)
-
-        # Initialize and train the recommender
-        tf_recommender = TFRecommender(user_ids=user_ids, item_ids=item_ids)
-        tf_recommender.train(interactions=interactions)
-    finally:
-        # Close the database session
-        db.close()
-
-@router.get("/recommendations/tfrs/{user_id}")
-def get_tf_recommendations(user_id: str, db: Session = Depends(get_db)):
-    global tf_recommender
-
-    if tf_recommender is None:
+@router.get("/recommendations/tfrs/{user_id}", dependencies=[_require_strategy("tfrs")])
+async def get_tf_recommendations(
+    user_id: str,
+    request: Request,
+    limit: int = Query(5, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+):
+    retriever = get_active_retriever()
+
+    if retriever is None:
         raise HTTPException(status_code=500, detail="Model not initialized")
 
-    recommendations = tf_recommender.recommend(user_id)
+    offset = page_offset(offset, cursor)
+
+    async def compute():
+        folded = folded_user_vector(retriever, user_id)
+        if folded is not None:
+            # Interacted since the model was trained: served from the vector refitted on arrival
+            with timed_stage("scoring"):
+                item_ids, _ = retriever.recommend_vector(folded, offset + limit + 1)
+            return [str(product_id) for product_id in item_ids[offset:]]
+        if not retriever.user_positions([user_id])[0]:
+            # Users the model has never seen would all get the OOV embedding's neighbours
+            product_ids, _ = score_products_popular(limit + 1, offset)
+            return [str(product_id) for product_id in product_ids]
+        scored = lookup_materialized("tfrs", user_id, limit + 1, offset, model_version=retriever.version) if user_id.isdigit() else None
+        if scored is not None:
+            return [str(product_id) for product_id in scored[0]]
+        with timed_stage("scoring"):
+            return retriever.recommend(user_id, offset + limit + 1)[offset:]
+
+    recommendations = await _cached(
+        "tfrs", user_id, compute, params={"limit": limit, "offset": offset}, model_version=retriever.version
+    )
     
     if not recommendations:
         raise HTTPException(status_code=404, detail="No recommendations found")
     
-    return {"user_id": user_id, "recommendations": recommendations}
\ No newline at end of file
+    return paginated_response(
+        request, recommendations, limit, offset, envelope=lambda page: {"user_id": user_id, "recommendations": page}
+    )
+
+@router.get("/admin/models")
+async def get_model_versions():
+    retriever = get_active_retriever()
+    return {
+        "active_version": getattr(retriever, "version", None),
+        "available_versions": list_versions(settings.MODEL_ARTIFACT_DIR),
+    }
+
+@router.get("/admin/cache/stats")
+async def get_cache_stats():
+    return recommendation_cache.stats()
+
+@router.post("/admin/models/reload")
+async def reload_embedding_model(version: Optional[str] = None):
+    # Only names of complete versions, so the parameter can never point outside the artifact directory
+    if version is not None and version not in list_versions(settings.MODEL_ARTIFACT_DIR):
+        raise HTTPException(status_code=404, detail="Model version not found")
+    # Load fully before swapping so requests never see a partially loaded model
+    try:
+        retriever = await run_in_threadpool(load_embedding_artifact, settings.MODEL_ARTIFACT_DIR, version=version)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Model version not found")
+    # Swapping clears the shared cache tier too, which is a blocking round trip
+    await run_in_threadpool(set_active_retriever, retriever)
+    return {"active_version": retriever.version}
+
+@router.post("/recommendations/batch", response_model=BatchRecommendationResponseSchema)
+async def get_batch_recommendations(request: BatchRecommendationRequestSchema, db: AsyncSession = Depends(get_async_db)):
+    if request.strategy != "history":
+        _check_strategy(request.strategy)
+    if request.strategy == "tfrs":
+        retriever = get_active_retriever()
+        if retriever is None:
+            raise HTTPException(status_code=500, detail="Model not initialized")
+        # Scoring up to 10k users would stall every other request if it ran on the event loop
+        results = await run_in_threadpool(recommend_batch_embeddings, retriever, request.user_ids, request.top_k)
+    elif request.strategy == "history":
+        results = await recommend_batch_history_async(request.user_ids, request.top_k, db)
+    else:
+        matrix = current_interaction_matrix()
+        results = await run_in_threadpool(
+            recommend_batch_collaborative, request.strategy, request.user_ids, request.top_k, matrix
+        )
+
+    logging.info(f"Served batch {request.strategy} recommendations for {len(request.user_ids)} users.")
+    return {"strategy": request.strategy, "results": results}
@@ -0,0 +1,94 @@
+import base64
+import json
+from operator import itemgetter
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is slower but equivalent
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Items encoded per chunk of a streamed response
+NDJSON_BATCH_SIZE = 256
+
+
+def schema_fields(schema) -> tuple:
+    return tuple(schema.model_fields)
+
+
+def rows_to_dicts(rows, fields) -> list:
+    """Build response dicts straight from trusted column rows, skipping Pydantic validation.
+
+    Columns are matched to fields by name once per call, so extra selected
+    columns are left out and the column order does not matter.
+    """
+    if not rows:
+        return []
+    columns = rows[0]._fields
+    pick = itemgetter(*(columns.index(field) for field in fields))
+    return [dict(zip(fields, pick(row))) for row in rows]
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["offset"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+
+def page_offset(offset: int, cursor: str = None) -> int:
+    """The page start: the cursor from a previous page wins over ``offset``."""
+    return decode_cursor(cursor) if cursor else offset
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when it is installed."""
+
+    def render(self, content) -> bytes:
+        return _dumps(content)
+
+
+def ndjson_response(items, headers: dict = None) -> StreamingResponse:
+    """Stream one JSON document per line, encoding a batch of items at a time."""
+    def lines():
+        for start in range(0, len(items), NDJSON_BATCH_SIZE):
+            yield b"".join(_dumps(item) + b"\n" for item in items[start:start + NDJSON_BATCH_SIZE])
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def paginated_response(request: Request, items: list, limit: int, offset: int, envelope=None, headers: dict = None):
+    """Respond with one page of ``items``, fetched with one extra item to tell whether another page exists.
+
+    The next page's cursor goes in the ``X-Next-Cursor`` header so the body
+    keeps its shape. ``envelope`` wraps the page for JSON responses; NDJSON
+    always streams the bare items.
+    """
+    headers = dict(headers or {})
+    if len(items) > limit:
+        items = items[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit)
+    if wants_ndjson(request):
+        return ndjson_response(items, headers)
+    # Returning a Response skips FastAPI's response_model validation and re-encoding
+    return FastJSONResponse(envelope(items) if envelope else items, headers=headers)
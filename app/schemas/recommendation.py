@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from app.schemas.product import ProductSchema
 
 
@@ -14,4 +14,24 @@ class RecommendationResponseSchema(BaseModel):
     recommendations: List[ProductSchema]
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BatchRecommendationRequestSchema(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=10000)
+    strategy: Literal["tfrs", "user_based", "item_based", "history"] = "tfrs"
+    top_k: int = Field(10, ge=1, le=500)
+
+
+class ScoredProductSchema(BaseModel):
+    product_id: int
+    score: float
+
+
+class UserRecommendationsSchema(BaseModel):
+    user_id: int
+    recommendations: List[ScoredProductSchema]
+
+
+class BatchRecommendationResponseSchema(BaseModel):
+    strategy: str
+    results: List[UserRecommendationsSchema]
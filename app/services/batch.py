@@ -0,0 +1,72 @@
+import asyncio
+from collections import defaultdict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.crud.interactions import get_interactions_for_users, get_interactions_for_users_async
+from app.services.fold_in import folded_user_vector
+from app.services.interaction_matrix import InteractionMatrix, interaction_weight
+from app.services.recommendation import score_products_item_based, score_products_popular, score_products_user_based
+
+
+def _as_results(user_ids, scored):
+    return [
+        {
+            "user_id": user_id,
+            "recommendations": [
+                {"product_id": int(product_id), "score": float(score)} for product_id, score in zip(product_ids, scores)
+            ],
+        }
+        for user_id, (product_ids, scores) in zip(user_ids, scored)
+    ]
+
+
+def recommend_batch_embeddings(retriever, user_ids, top_k: int):
+    """Embedding strategies: one matrix multiply per chunk of users.
+
+    Folded-in users are scored from their fresh vectors; users the model has
+    never seen get popular products rather than the OOV embedding's neighbours.
+    """
+    scored = retriever.recommend_batch(user_ids, top_k)
+    known = retriever.user_positions(user_ids) > 0
+    popular = None
+    for position, user_id in enumerate(user_ids):
+        folded = folded_user_vector(retriever, user_id)
+        if folded is not None:
+            scored[position] = retriever.recommend_vector(folded, top_k)
+        elif not known[position]:
+            if popular is None:
+                popular = score_products_popular(top_k)
+            scored[position] = popular
+    return _as_results(user_ids, scored)
+
+
+def recommend_batch_collaborative(strategy: str, user_ids, top_k: int, matrix: InteractionMatrix):
+    """In-memory collaborative strategies; no database round trip per user."""
+    score = score_products_user_based if strategy == "user_based" else score_products_item_based
+    return _as_results(user_ids, [score(user_id, matrix, top_k) for user_id in user_ids])
+
+
+def recommend_batch_history(user_ids, top_k: int, db: Session):
+    """Most-interacted products per user, fetched with a single ``IN`` query for all users."""
+    return _rank_history(user_ids, top_k, get_interactions_for_users(db, user_ids))
+
+
+async def recommend_batch_history_async(user_ids, top_k: int, db: AsyncSession):
+    rows = await get_interactions_for_users_async(db, user_ids)
+    # Ranking is pure Python over every row; keep it off the event loop
+    return await asyncio.to_thread(_rank_history, user_ids, top_k, rows)
+
+
+def _rank_history(user_ids, top_k: int, rows):
+    totals = defaultdict(lambda: defaultdict(float))
+    for user_id, product_id, interaction_type, interaction_value in rows:
+        if product_id is not None:
+            totals[user_id][product_id] += interaction_weight(interaction_type, interaction_value)
+
+    scored = []
+    for user_id in user_ids:
+        ranked = sorted(totals.get(user_id, {}).items(), key=lambda item: -item[1])[:top_k]
+        scored.append(([product_id for product_id, _ in ranked], [score for _, score in ranked]))
+    return _as_results(user_ids, scored)
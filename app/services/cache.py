@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.services.concurrency import SingleFlight
+
+
+class CacheBackend:
+    """Interface for the optional shared cache tier (e.g. Redis).
+
+    Values are JSON-serialisable; ``ttl`` is in seconds. Counters live apart
+    from the entries and survive ``clear()``. Calls block, so async code runs
+    them in a worker thread.
+    """
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float):
+        raise NotImplementedError
+
+    def counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local stand-in for a shared backend, used in tests and single-process setups."""
+
+    def __init__(self):
+        self._entries = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return json.loads(payload)
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl if ttl else None, json.dumps(value))
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared tier backed by Redis; requires the optional ``redis`` package."""
+
+    def __init__(self, url: str, prefix: str = "recommendations:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.entry_prefix = f"{prefix}entry:"
+        self.counter_prefix = f"{prefix}counter:"
+
+    def get(self, key: str):
+        payload = self.client.get(self.entry_prefix + key)
+        return json.loads(payload) if payload is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        self.client.set(self.entry_prefix + key, json.dumps(value), ex=max(1, int(ttl)) if ttl else None)
+
+    def counter(self, key: str) -> int:
+        return int(self.client.get(self.counter_prefix + key) or 0)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.counter_prefix + key))
+
+    def clear(self):
+        pipeline = self.client.pipeline(transaction=False)
+        for key in self.client.scan_iter(match=f"{self.entry_prefix}*", count=1000):
+            pipeline.unlink(key)
+        pipeline.execute()
+
+
+class RecommendationCache:
+    """Two-tier cache for recommendation responses.
+
+    Entries are keyed by (strategy, user_id, params, model_version) and live in
+    an in-process LRU with a TTL, backed by an optional shared ``CacheBackend``.
+    Each user has a generation counter that is part of the key; recording an
+    interaction bumps it, which invalidates every cached entry for that user
+    in O(1) on both tiers. Loading a new model changes ``model_version``.
+    Concurrent async misses on one key share a single computation.
+
+    With a shared tier, a lookup reads the generation once and the async
+    methods do their backend round trips in a worker thread. The local
+    generations are an LRU of ``max_generations`` users; forgetting a user
+    raises the generation every unknown user starts from to theirs, so their
+    stale entries stay unreachable.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300, backend: CacheBackend = None,
+                 max_generations: int = 100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.max_generations = max_generations
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+        self.flights = SingleFlight()
+
+    def _generation(self, user_id) -> int:
+        if user_id is None:
+            # Entries shared by every user are only invalidated by their model_version
+            return 0
+        # Routes take user ids as int or str; normalise so both share one generation
+        user_id = str(user_id)
+        if self.backend is not None:
+            try:
+                return self.backend.counter(f"generation:{user_id}")
+            except Exception:
+                logging.exception("Shared cache unavailable; using local generation.")
+        return self._generations.get(user_id, self._generation_floor)
+
+    def key(self, strategy: str, user_id, params: dict, model_version) -> str:
+        encoded_params = json.dumps(params or {}, sort_keys=True, default=str)
+        return f"{strategy}:{user_id}:{self._generation(user_id)}:{model_version}:{encoded_params}"
+
+    def get(self, strategy: str, user_id, params: dict = None, model_version=None):
+        """Return the cached value, or None on a miss."""
+        return self.lookup(strategy, user_id, params, model_version)[1]
+
+    def lookup(self, strategy: str, user_id, params: dict = None, model_version=None):
+        """Return ``(key, value)``; ``value`` is None on a miss and ``key`` is where to ``store`` it."""
+        key = self.key(strategy, user_id, params, model_version)
+        return key, self._get(key)
+
+    async def lookup_async(self, strategy: str, user_id, params: dict = None, model_version=None):
+        """``lookup`` without blocking the event loop on the shared tier."""
+        if self.backend is None:
+            return self.lookup(strategy, user_id, params, model_version)
+        return await asyncio.to_thread(self.lookup, strategy, user_id, params, model_version)
+
+    def _get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception:
+                logging.exception("Shared cache read failed.")
+                value = None
+            if value is not None:
+                self._store_local(key, value)
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, strategy: str, user_id, value, params: dict = None, model_version=None):
+        self.store(self.key(strategy, user_id, params, model_version), value)
+
+    def store(self, key: str, value):
+        """Cache ``value`` under a key returned by ``lookup``."""
+        self._store_local(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, self.ttl)
+            except Exception:
+                logging.exception("Shared cache write failed.")
+
+    async def store_async(self, key: str, value):
+        """``store`` without blocking the event loop on the shared tier."""
+        if self.backend is None:
+            self.store(key, value)
+        else:
+            await asyncio.to_thread(self.store, key, value)
+
+    def _store_local(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, strategy: str, user_id, compute, params: dict = None, model_version=None):
+        """Return the cached value or call ``compute()`` and cache its result."""
+        value = self.get(strategy, user_id, params, model_version)
+        if value is None:
+            value = compute()
+            self.set(strategy, user_id, value, params, model_version)
+        return value
+
+    async def get_or_compute_async(self, strategy: str, user_id, compute, params: dict = None, model_version=None):
+        """Like ``get_or_compute`` for a coroutine function ``compute``.
+
+        Misses on a key that is already being computed wait for that
+        computation instead of starting their own.
+        """
+        key, value = await self.lookup_async(strategy, user_id, params, model_version)
+        if value is None:
+            async def compute_and_store():
+                computed = await compute()
+                await self.store_async(key, computed)
+                return computed
+
+            value = await self.flights.run(key, compute_and_store)
+        return value
+
+    def invalidate_user(self, user_id):
+        """Drop every cached entry for ``user_id`` by bumping its generation."""
+        user_id = str(user_id)
+        if self.backend is not None:
+            try:
+                self.backend.incr(f"generation:{user_id}")
+            except Exception:
+                logging.exception("Shared cache invalidation failed.")
+        # Old-generation entries become unreachable and age out of the LRU
+        with self._lock:
+            self._generations[user_id] = self._generations.pop(user_id, self._generation_floor) + 1
+            while len(self._generations) > self.max_generations:
+                _, generation = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, generation)
+
+    def clear(self):
+        """Drop all entries on both tiers, e.g. after a new model version is loaded.
+
+        Blocks on the shared tier; generations survive so stale entries never
+        become reachable again.
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except Exception:
+                logging.exception("Shared cache clear failed.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "coalesced": self.flights.coalesced,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _create_cache() -> RecommendationCache:
+    backend = RedisCacheBackend(settings.CACHE_REDIS_URL) if settings.CACHE_REDIS_URL else None
+    return RecommendationCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS, backend, settings.CACHE_MAX_GENERATIONS)
+
+
+recommendation_cache = _create_cache()
@@ -0,0 +1,124 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.config import settings
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight computation.
+
+    The first caller for a key starts ``compute()`` as a task; callers that
+    arrive while it runs await the same task, so a burst of identical
+    requests costs one computation and they all get its result or its
+    exception. Waiters are shielded from each other: a caller that is
+    cancelled (e.g. its client disconnected) leaves the task running for the
+    rest. Keys are only held while their task runs; caching the result is the
+    caller's job.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    async def run(self, key, compute):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Retrieved so a failure whose waiters all went away is not logged as never retrieved
+            task.exception()
+
+
+class StrategyOverloaded(Exception):
+    """A strategy has every slot busy and its queue is full or too slow; the request should be shed."""
+
+
+class ConcurrencyLimiter:
+    """Bounds the computations of one strategy running at once in this worker.
+
+    Up to ``max_concurrency`` computations hold a slot; up to ``queue_limit``
+    more wait for one for at most ``queue_timeout`` seconds. Anything beyond
+    raises ``StrategyOverloaded`` right away instead of queueing on the
+    database pool, so callers can serve a cheaper fallback while latency of
+    the admitted requests stays bounded. ``max_concurrency`` 0 disables the
+    limit.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, queue_limit: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.active = 0
+        self.waiting = 0
+
+    async def _acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+        if self.waiting >= self.queue_limit:
+            raise StrategyOverloaded(f"{self.name}: {self.active} running and {self.waiting} queued")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise StrategyOverloaded(f"{self.name}: no free slot within {self.queue_timeout * 1000:.0f}ms") from None
+        finally:
+            self.waiting -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            yield
+            return
+        await self._acquire()
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+def parse_concurrency_limits(spec: str) -> dict:
+    """Parse ``"hybrid:4,content:8"`` into {strategy: max concurrency}."""
+    limits = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = part.partition(":")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+_limiters = {}
+
+
+def strategy_limiter(strategy: str) -> ConcurrencyLimiter:
+    """The process-wide limiter of ``strategy``, configured from the STRATEGY_* settings on first use."""
+    limiter = _limiters.get(strategy)
+    if limiter is None:
+        limits = parse_concurrency_limits(settings.STRATEGY_CONCURRENCY_LIMITS)
+        limiter = _limiters.setdefault(strategy, ConcurrencyLimiter(
+            strategy,
+            limits.get(strategy, settings.STRATEGY_MAX_CONCURRENCY),
+            settings.STRATEGY_QUEUE_LIMIT,
+            settings.STRATEGY_QUEUE_TIMEOUT_MS / 1000,
+        ))
+    return limiter
+
+
+def limiter_stats() -> dict:
+    """{strategy: (running, queued)} of the limiters used so far."""
+    return {name: (limiter.active, limiter.waiting) for name, limiter in _limiters.items()}
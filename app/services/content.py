@@ -0,0 +1,355 @@
+import logging
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud.product import get_products, get_products_async
+from app.services.interaction_matrix import SortedIdIndex
+from app.services.ranking import top_k_indices
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+BIGRAM_MULTIPLIER = 1000003
+# Prices fall into log-spaced buckets, each 25% wider than the previous one
+PRICE_BUCKET_RATIO = 1.25
+PRICE_BUCKETS = 64
+VENDOR_BUCKETS = 4096
+
+
+@lru_cache(maxsize=1 << 20)
+def _token_hash(token: str) -> int:
+    return zlib.crc32(token.encode())
+
+
+def text_feature_matrix(texts, n_features: int) -> sp.csr_matrix:
+    """Hash word unigrams and bigrams of each text into a (len(texts), n_features) sublinear TF matrix.
+
+    Unigram hashes are crc32, so columns are stable across processes and
+    restarts; bigram hashes are combined from neighbouring unigram hashes with
+    array arithmetic, and the whole batch is counted in one sparse build.
+    """
+    token_lists = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    hashes = np.fromiter(
+        (_token_hash(token) for tokens in token_lists for token in tokens), dtype=np.uint64, count=int(lengths.sum())
+    )
+    rows = np.repeat(np.arange(len(token_lists)), lengths)
+    same_text = rows[:-1] == rows[1:]
+    bigrams = ((hashes[:-1] * np.uint64(BIGRAM_MULTIPLIER)) ^ hashes[1:])[same_text]
+
+    buckets = (np.concatenate([hashes, bigrams]) % np.uint64(n_features)).astype(np.int32)
+    matrix = sp.csr_matrix(
+        (np.ones(len(buckets), dtype=np.float32), (np.concatenate([rows, rows[:-1][same_text]]), buckets)),
+        shape=(len(token_lists), n_features),
+    )
+    matrix.sum_duplicates()
+    matrix.data = 1.0 + np.log(matrix.data)
+    return matrix
+
+
+def price_bucket(price) -> int:
+    if price is None or price <= 0:
+        return -1
+    return int(min(PRICE_BUCKETS - 1, np.log1p(price) // np.log(PRICE_BUCKET_RATIO)))
+
+
+def _fingerprint(row) -> int:
+    """Hash of the columns a product's features are built from, to tell which rows changed."""
+    return hash((row.name, row.description, row.price, row.vendor_id))
+
+
+def _normalise_rows(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sp.diags(inverse.astype(np.float32)) @ matrix).tocsr()
+
+
+class ContentIndex:
+    """Sparse product feature matrix for content-based recommendations.
+
+    Each product row is the concatenation of three L2-normalised blocks:
+    TF-IDF weights of hashed word uni/bigrams from ``name``/``description``,
+    a smoothed one-hot log-price bucket and a hashed vendor one-hot, scaled by
+    ``CONTENT_PRICE_WEIGHT`` and ``CONTENT_VENDOR_WEIGHT``. Term frequencies
+    and document frequencies are kept per product, so ``upsert_products``
+    only tokenises the changed rows; the weighted matrix is reassembled
+    lazily in O(nnz) on the next query.
+    """
+
+    def __init__(self, n_features: int = None, price_weight: float = None, vendor_weight: float = None):
+        self.n_features = n_features or settings.CONTENT_HASH_FEATURES
+        self.price_weight = settings.CONTENT_PRICE_WEIGHT if price_weight is None else price_weight
+        self.vendor_weight = settings.CONTENT_VENDOR_WEIGHT if vendor_weight is None else vendor_weight
+        self._positions = {}
+        self._product_ids = []
+        self._term_indices = []
+        self._term_values = []
+        self._price_buckets = []
+        self._vendor_ids = []
+        # Per product: _fingerprint of the row as last indexed, or None once removed
+        self._fingerprints = []
+        self._document_frequency = np.zeros(self.n_features, dtype=np.int64)
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.version = 0
+        # Set for indexes attached from a shared snapshot, which only serve queries
+        self.read_only = False
+
+    @classmethod
+    def from_rows(cls, rows, **params) -> "ContentIndex":
+        """Build from rows exposing ``id``, ``name``, ``description``, ``price`` and ``vendor_id``."""
+        started = time.perf_counter()
+        index = cls(**params)
+        index.upsert_products(rows)
+        logging.info(f"Built content index for {len(index._product_ids)} products in {time.perf_counter() - started:.2f}s.")
+        return index
+
+    @classmethod
+    def from_db(cls, db: Session, **params) -> "ContentIndex":
+        return cls.from_rows(get_products(db), **params)
+
+    @classmethod
+    async def from_db_async(cls, db, **params) -> "ContentIndex":
+        return cls.from_rows(await get_products_async(db), **params)
+
+    @classmethod
+    def from_shared(cls, features: sp.csr_matrix, product_ids: np.ndarray, product_lookup, version: int) -> "ContentIndex":
+        """Serve a feature matrix published by ``app.jobs.publish_state`` without copying it.
+
+        ``product_lookup`` is a (sorted product ids, positions) pair.
+        """
+        index = cls(n_features=features.shape[1])
+        index._positions = SortedIdIndex(*product_lookup)
+        index._product_ids = product_ids
+        index._snapshot = (features, product_ids)
+        index.version = version
+        index.read_only = True
+        return index
+
+    def __len__(self):
+        return len(self._product_ids)
+
+    def upsert_products(self, rows) -> None:
+        """Add new products or replace the features of existing ones."""
+        rows = list(rows)
+        term_frequencies = text_feature_matrix(
+            [f"{row.name or ''} {row.description or ''}" for row in rows], self.n_features
+        )
+        indptr, indices, values = term_frequencies.indptr, term_frequencies.indices, term_frequencies.data
+        with self._lock:
+            replaced = []
+            for offset, row in enumerate(rows):
+                start, end = indptr[offset], indptr[offset + 1]
+                position = self._positions.get(row.id)
+                if position is None:
+                    self._positions[row.id] = len(self._product_ids)
+                    self._product_ids.append(row.id)
+                    self._term_indices.append(indices[start:end])
+                    self._term_values.append(values[start:end])
+                    self._price_buckets.append(price_bucket(row.price))
+                    self._vendor_ids.append(row.vendor_id if row.vendor_id is not None else -1)
+                    self._fingerprints.append(_fingerprint(row))
+                else:
+                    replaced.append(self._term_indices[position])
+                    self._term_indices[position] = indices[start:end]
+                    self._term_values[position] = values[start:end]
+                    self._price_buckets[position] = price_bucket(row.price)
+                    self._vendor_ids[position] = row.vendor_id if row.vendor_id is not None else -1
+                    self._fingerprints[position] = _fingerprint(row)
+            self._document_frequency += np.bincount(indices, minlength=self.n_features)
+            if replaced:
+                self._document_frequency -= np.bincount(np.concatenate(replaced), minlength=self.n_features)
+            self._snapshot = None
+            self.version += 1
+
+    def remove_products(self, product_ids) -> None:
+        """Blank the features of deleted products so they are never recommended."""
+        with self._lock:
+            for product_id in product_ids:
+                position = self._positions.get(product_id)
+                if position is None:
+                    continue
+                self._document_frequency -= np.bincount(self._term_indices[position], minlength=self.n_features)
+                self._term_indices[position] = np.empty(0, dtype=np.int32)
+                self._term_values[position] = np.empty(0, dtype=np.float32)
+                self._price_buckets[position] = -1
+                self._vendor_ids[position] = -1
+                self._fingerprints[position] = None
+            self._snapshot = None
+            self.version += 1
+
+    def sync_products(self, rows):
+        """Bring the index in line with ``rows``, the full product table; returns (upserted rows, removed ids).
+
+        Only products that are new or whose indexed columns changed are
+        featurised again, and products missing from ``rows`` are removed.
+        """
+        rows = list(rows)
+        with self._sync_lock:
+            changed = []
+            for row in rows:
+                position = self._positions.get(row.id)
+                if position is None or self._fingerprints[position] != _fingerprint(row):
+                    changed.append(row)
+            present = {row.id for row in rows}
+            removed = [
+                product_id for product_id, fingerprint in zip(self._product_ids, self._fingerprints)
+                if fingerprint is not None and product_id not in present
+            ]
+            if changed:
+                self.upsert_products(changed)
+            if removed:
+                self.remove_products(removed)
+        return changed, removed
+
+    def _assemble(self):
+        n_products = len(self._product_ids)
+        lengths = np.fromiter((len(indices) for indices in self._term_indices), dtype=np.int64, count=n_products)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        term_frequencies = sp.csr_matrix(
+            (
+                np.concatenate(self._term_values) if n_products else np.empty(0, dtype=np.float32),
+                np.concatenate(self._term_indices) if n_products else np.empty(0, dtype=np.int32),
+                indptr,
+            ),
+            shape=(n_products, self.n_features),
+        )
+        idf = (np.log((1.0 + n_products) / (1.0 + self._document_frequency)) + 1.0).astype(np.float32)
+        text = _normalise_rows(term_frequencies @ sp.diags(idf))
+
+        # Neighbouring price buckets get half weight so near-identical prices still overlap
+        buckets = np.asarray(self._price_buckets, dtype=np.int64)
+        priced = np.flatnonzero(buckets >= 0)
+        price_rows, price_columns, price_values = [], [], []
+        for shift, weight in ((0, 1.0), (-1, 0.5), (1, 0.5)):
+            columns = buckets[priced] + shift
+            valid = (columns >= 0) & (columns < PRICE_BUCKETS)
+            price_rows.append(priced[valid])
+            price_columns.append(columns[valid])
+            price_values.append(np.full(int(valid.sum()), weight, dtype=np.float32))
+        price = _normalise_rows(sp.csr_matrix(
+            (np.concatenate(price_values), (np.concatenate(price_rows), np.concatenate(price_columns))),
+            shape=(n_products, PRICE_BUCKETS),
+        ))
+
+        vendor_ids = np.asarray(self._vendor_ids, dtype=np.int64)
+        with_vendor = np.flatnonzero(vendor_ids >= 0)
+        vendor = sp.csr_matrix(
+            (np.ones(len(with_vendor), dtype=np.float32), (with_vendor, vendor_ids[with_vendor] % VENDOR_BUCKETS)),
+            shape=(n_products, VENDOR_BUCKETS),
+        )
+
+        features = _normalise_rows(sp.hstack(
+            [text, price * self.price_weight, vendor * self.vendor_weight], format="csr", dtype=np.float32
+        ))
+        return features, np.asarray(self._product_ids, dtype=np.int64)
+
+    def snapshot(self):
+        """Return the current (feature matrix, product ids) pair, reassembling it if products changed."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._assemble()
+                snapshot = self._snapshot
+        return snapshot
+
+    def positions(self, product_ids) -> np.ndarray:
+        return np.fromiter(
+            (self._positions.get(int(product_id), -1) for product_id in product_ids), dtype=np.int64, count=len(product_ids)
+        )
+
+    def recommend(self, product_ids, weights, limit: int, offset: int = 0):
+        """Rank unseen products against the weighted mean of the given products' features.
+
+        Returns (product ids, scores); the scores are cosine similarities
+        between each product and the user profile.
+        """
+        features, all_product_ids = self.snapshot()
+        rows = self.positions(product_ids)
+        known = (rows >= 0) & (rows < features.shape[0])
+        rows, weights = rows[known], np.asarray(weights, dtype=np.float32)[known]
+        if not len(rows) or weights.sum() <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # A dense profile turns scoring into one O(nnz) sparse matrix-vector product
+        profile = (sp.csr_matrix(weights[None, :] / weights.sum()) @ features[rows]).toarray().ravel()
+        scores = features @ profile
+        scores[rows] = 0.0
+        top = top_k_indices(scores, limit + offset)[offset:]
+        top = top[scores[top] > 0]
+        return all_product_ids[top], scores[top]
+
+
+_content_index = None
+_content_index_lock = threading.Lock()
+
+
+def current_content_index():
+    """The process-wide content index, or None until it has been built."""
+    return _content_index
+
+
+def get_content_index(db: Session) -> ContentIndex:
+    """Return the process-wide content index, building it on first use."""
+    global _content_index
+    if _content_index is None:
+        with _content_index_lock:
+            if _content_index is None:
+                _content_index = ContentIndex.from_db(db)
+    return _content_index
+
+
+def set_content_index(index: ContentIndex) -> None:
+    global _content_index
+    with _content_index_lock:
+        _content_index = index
+
+
+def refresh_content_index(db: Session):
+    """Apply products created, changed or deleted since the last refresh to the content index, if it has been built."""
+    index = _content_index
+    if index is None or index.read_only:
+        return index
+    started = time.perf_counter()
+    changed, removed = index.sync_products(get_products(db))
+    if changed or removed:
+        logging.info(
+            f"Refreshed content index with {len(changed)} changed and {len(removed)} removed products "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
+    return index
+
+
+def start_content_refresher(session_factory, interval: float = None) -> threading.Thread:
+    """Periodically diff the product table against the content index in a daemon thread."""
+    interval = interval if interval is not None else settings.CONTENT_REFRESH_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            db = session_factory()
+            try:
+                refresh_content_index(db)
+            except Exception:
+                logging.exception("Failed to refresh content index.")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run, name="content-refresher", daemon=True)
+    thread.start()
+    return thread
+
+
+def record_products(rows) -> None:
+    """Apply created or updated products to the content index, if it has been built."""
+    index = _content_index
+    if index is not None and not index.read_only:
+        index.upsert_products(list(rows))
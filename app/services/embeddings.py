@@ -0,0 +1,147 @@
+import logging
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.services.cache import recommendation_cache
+from app.services.retrieval_index import IVFIndex, build_retrieval_index
+
+# Vocabulary entry of the out-of-vocabulary row 0 in every embedding table
+OOV_TOKEN = "[UNK]"
+
+
+class EmbeddingRetriever:
+    """Top-K retrieval over exported user and item embedding tables.
+
+    Row 0 of both tables is the out-of-vocabulary bucket, matching the
+    ``StringLookup`` layers the embeddings were trained behind. Item rows are
+    indexed by position and mapped back to vocabulary ids on the way out.
+    User ids are resolved through a sorted copy of the vocabulary, so the
+    arrays can be memory-mapped as-is without building a Python dict.
+    """
+
+    def __init__(
+        self,
+        user_vocabulary,
+        user_embeddings,
+        item_vocabulary,
+        item_embeddings,
+        index_kind=None,
+        index=None,
+        user_lookup=None,
+        version=None,
+        **index_params,
+    ):
+        self.version = version
+        self.user_vocabulary = np.asarray(user_vocabulary)
+        self.item_vocabulary = np.asarray(item_vocabulary)
+        self.user_embeddings = user_embeddings
+        self.item_embeddings = item_embeddings
+        self.sorted_users, self.sorted_user_positions = user_lookup or sorted_lookup(self.user_vocabulary)
+        self._item_lookup = None
+
+        if index is None:
+            index_kind = index_kind or settings.TFRS_INDEX
+            if index_kind == "ivf":
+                index_params.setdefault("n_lists", settings.TFRS_IVF_LISTS)
+                index_params.setdefault("n_probe", settings.TFRS_IVF_PROBES)
+            index = build_retrieval_index(
+                index_kind, item_embeddings[1:], np.arange(1, len(self.item_vocabulary)), **index_params
+            )
+        self.index = index
+
+    def user_positions(self, user_ids) -> np.ndarray:
+        """Embedding rows of ``user_ids``; unknown users map to the OOV row 0, as StringLookup would."""
+        keys = np.asarray([str(user_id) for user_id in user_ids], dtype=self.sorted_users.dtype)
+        found = np.searchsorted(self.sorted_users, keys)
+        found = np.minimum(found, len(self.sorted_users) - 1)
+        return np.where(self.sorted_users[found] == keys, self.sorted_user_positions[found], 0)
+
+    def item_positions(self, item_ids) -> np.ndarray:
+        """Embedding rows of ``item_ids``; 0 for items the model was not trained on."""
+        if self._item_lookup is None:
+            # Only fold-in maps items back to rows, so the sorted copy is built on first use
+            self._item_lookup = sorted_lookup(self.item_vocabulary)
+        sorted_items, sorted_item_positions = self._item_lookup
+        keys = np.asarray([str(item_id) for item_id in item_ids], dtype=sorted_items.dtype)
+        found = np.minimum(np.searchsorted(sorted_items, keys), len(sorted_items) - 1)
+        return np.where(sorted_items[found] == keys, sorted_item_positions[found], 0)
+
+    def user_vector(self, user_id) -> np.ndarray:
+        return self.user_embeddings[self.user_positions([user_id])[0]]
+
+    def recommend(self, user_id, top_k=5):
+        item_ids, _ = self.recommend_scored(user_id, top_k)
+        return item_ids.tolist()
+
+    def recommend_scored(self, user_id, top_k=5):
+        """Like ``recommend`` but returns (item ids, scores) arrays."""
+        return self.recommend_vector(self.user_vector(user_id), top_k)
+
+    def recommend_vector(self, vector: np.ndarray, top_k=5):
+        """(item ids, scores) of the items closest to a user vector, e.g. one folded in online."""
+        positions, scores = self.index.search(vector, top_k)
+        found = positions >= 0
+        return self.item_vocabulary[positions[found]], scores[found]
+
+    def batch_chunk_size(self) -> int:
+        """Users per scoring chunk that keep the float32 (users x items) block within TFRS_BATCH_SCORE_MEMORY_MB."""
+        n_items = max(len(self.item_vocabulary) - 1, 1)
+        return max(1, settings.TFRS_BATCH_SCORE_MEMORY_MB * 2**20 // (4 * n_items))
+
+    def recommend_batch(self, user_ids, top_k=5, chunk_size=None):
+        """Score many users at once; returns one (item ids, scores) pair per user.
+
+        Users are scored ``chunk_size`` at a time, by default as many as fit
+        the score memory budget, so the (users x items) score block stays
+        bounded for large catalogues.
+        """
+        chunk_size = chunk_size or self.batch_chunk_size()
+        positions = self.user_positions(user_ids)
+        results = []
+        for start in range(0, len(positions), chunk_size):
+            queries = self.user_embeddings[positions[start:start + chunk_size]]
+            item_positions, scores = self.index.search_batch(queries, top_k)
+            for row_positions, row_scores in zip(item_positions, scores):
+                found = row_positions >= 0
+                results.append((self.item_vocabulary[row_positions[found]], row_scores[found]))
+        return results
+
+
+def sorted_lookup(vocabulary: np.ndarray):
+    """Sorted vocabulary plus the original position of every entry, for searchsorted lookups."""
+    order = np.argsort(vocabulary, kind="stable")
+    return vocabulary[order], order.astype(np.int64)
+
+
+_active_retriever = None
+_active_retriever_lock = threading.Lock()
+
+
+def get_active_retriever():
+    """The retriever currently serving embedding recommendations, or None."""
+    return _active_retriever
+
+
+def set_active_retriever(retriever) -> None:
+    # In-flight requests keep the reference they already read, so swapping is atomic
+    global _active_retriever
+    with _active_retriever_lock:
+        previous = _active_retriever
+        _active_retriever = retriever
+    recommendation_cache.clear()
+    logging.info(
+        f"Active embedding model: {getattr(previous, 'version', None)} -> {getattr(retriever, 'version', None)}"
+    )
+
+
+def ivf_index_from_arrays(item_vocabulary, arrays) -> IVFIndex:
+    return IVFIndex.from_arrays(
+        np.arange(1, len(item_vocabulary)),
+        arrays["centroids"],
+        arrays["order"],
+        arrays["offsets"],
+        arrays["list_embeddings"],
+        n_probe=settings.TFRS_IVF_PROBES,
+    )
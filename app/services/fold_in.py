@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.config import settings
+from app.services.embeddings import EmbeddingRetriever, get_active_retriever
+
+
+class FoldInTable:
+    """User vectors recomputed online from one retriever's fixed item embeddings.
+
+    A user's vector is refitted from their interaction weights whenever new
+    events arrive, so users who just interacted, including users the model
+    was never trained on, are served from their latest history instead of
+    the trained (or OOV) embedding. Two fits are available:
+
+    * ``least_squares``: the implicit ALS user step, exact for ALS models
+      (confidence ``1 + alpha * r``, the full item Gram matrix as the
+      unobserved-item term)
+    * ``average``: the weight-averaged item vector, for models such as TFRS
+      that were not fitted by least squares
+
+    Entries hold the vector and the history it was fitted on, and the least
+    recently used ones are evicted beyond ``max_users``. A table belongs to
+    one model version and is replaced when the active retriever changes.
+    """
+
+    def __init__(self, retriever: EmbeddingRetriever, max_users: int = None, method: str = None):
+        self.retriever = retriever
+        self.max_users = max_users or settings.FOLD_IN_MAX_USERS
+        manifest = getattr(retriever, "manifest", None) or {}
+        method = method or settings.FOLD_IN_METHOD
+        if method == "auto":
+            method = "least_squares" if manifest.get("model") == "als" else "average"
+        self.method = method
+        self.alpha = manifest.get("alpha", settings.ALS_ALPHA)
+        self.regularization = manifest.get("regularization", settings.ALS_REGULARIZATION)
+        self._gram = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """The folded-in vector of a user, or None."""
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    @property
+    def gram(self) -> np.ndarray:
+        if self._gram is None:
+            items = np.asarray(self.retriever.item_embeddings[1:], dtype=np.float32)
+            self._gram = items.T @ items
+        return self._gram
+
+    def fit(self, product_ids: np.ndarray, weights: np.ndarray):
+        """User vector for the given history, or None when none of the products are in the model."""
+        rows = self.retriever.item_positions(product_ids)
+        known = rows > 0
+        if not known.any():
+            return None
+        items = np.asarray(self.retriever.item_embeddings[rows[known]], dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)[known]
+        if self.method == "average":
+            return (weights @ items / max(float(weights.sum()), 1e-9)).astype(np.float32)
+        confidence = self.alpha * weights
+        system = self.gram + (items.T * confidence) @ items + self.regularization * np.eye(items.shape[1], dtype=np.float32)
+        return np.linalg.solve(system, items.T @ (1.0 + confidence)).astype(np.float32)
+
+    def add(self, user_id, weights: dict, history=None):
+        """Add {product id: weight} events to a user's history and refit their vector.
+
+        ``history(user_id) -> (product ids, weights)`` seeds users without an
+        entry; it must not include the events being added.
+        """
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            combined = dict(entry[1])
+        elif history is not None:
+            product_ids, previous = history(user_id)
+            combined = dict(zip(np.asarray(product_ids).tolist(), np.asarray(previous).tolist()))
+        else:
+            combined = {}
+        for product_id, weight in weights.items():
+            combined[product_id] = combined.get(product_id, 0.0) + weight
+
+        vector = self.fit(np.fromiter(combined, dtype=np.int64, count=len(combined)),
+                          np.fromiter(combined.values(), dtype=np.float32, count=len(combined)))
+        if vector is None:
+            return None
+        with self._lock:
+            self._entries[key] = (vector, combined)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return vector
+
+
+_fold_in_table = None
+_fold_in_lock = threading.Lock()
+
+
+def get_fold_in_table(retriever: EmbeddingRetriever) -> FoldInTable:
+    """The table for ``retriever``; vectors folded in against a previous model are dropped."""
+    global _fold_in_table
+    table = _fold_in_table
+    if table is None or table.retriever is not retriever:
+        with _fold_in_lock:
+            if _fold_in_table is None or _fold_in_table.retriever is not retriever:
+                _fold_in_table = FoldInTable(retriever)
+            table = _fold_in_table
+    return table
+
+
+def folded_user_vector(retriever: EmbeddingRetriever, user_id):
+    """The user's folded-in vector for ``retriever``, or None to use the trained embedding."""
+    table = _fold_in_table
+    if table is None or table.retriever is not retriever:
+        return None
+    return table.get(user_id)
+
+
+def fold_in_interactions(events, history=None) -> int:
+    """Refit the vectors of the users in (user_id, product_id, weight) ``events``; returns how many were updated."""
+    retriever = get_active_retriever()
+    if retriever is None or not settings.FOLD_IN_MAX_USERS:
+        return 0
+    by_user = {}
+    for user_id, product_id, weight in events:
+        weights = by_user.setdefault(user_id, {})
+        weights[product_id] = weights.get(product_id, 0.0) + weight
+    table = get_fold_in_table(retriever)
+    return sum(table.add(user_id, weights, history) is not None for user_id, weights in by_user.items())
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from app.config import settings
+from app.services.content import ContentIndex
+from app.services.embeddings import EmbeddingRetriever
+from app.services.fold_in import folded_user_vector
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.item_similarity import current_item_neighbour_index
+from app.services.metrics import record_degraded, timed_stage
+from app.services.popularity import get_popularity_index
+from app.services.ranking import top_k_indices
+from app.services.strategies import enabled_strategies, is_strategy_ready
+from app.services.user_similarity import score_user_neighbours
+
+FUSION_METHODS = ("weighted", "rrf")
+EMPTY = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
+class HybridContext:
+    """The in-memory structures a hybrid request scores against, resolved once up front."""
+
+    def __init__(self, matrix: InteractionMatrix, content_index: ContentIndex = None, retriever: EmbeddingRetriever = None):
+        self.matrix = matrix
+        self.content_index = content_index
+        self.retriever = retriever
+
+
+def _score_user_based(user_id, limit, context):
+    return score_user_neighbours(context.matrix, user_id, settings.USER_KNN_NEIGHBOURS, limit)
+
+def _score_item_based(user_id, limit, context):
+    index = current_item_neighbour_index(context.matrix)
+    if index is None:
+        return EMPTY
+    items, weights = context.matrix.user_items(user_id)
+    return index.recommend(items, weights, limit)
+
+def _score_content(user_id, limit, context):
+    if context.content_index is None:
+        return EMPTY
+    items, weights = context.matrix.user_items(user_id)
+    return context.content_index.recommend(context.matrix.item_ids[items], weights, limit)
+
+def _score_tfrs(user_id, limit, context):
+    retriever = context.retriever
+    if retriever is None:
+        return EMPTY
+    folded = folded_user_vector(retriever, user_id)
+    if folded is not None:
+        item_ids, scores = retriever.recommend_vector(folded, limit)
+    # Unknown users map to the OOV embedding, which would rank arbitrary items
+    elif not retriever.user_positions([str(user_id)])[0]:
+        return EMPTY
+    else:
+        item_ids, scores = retriever.recommend_scored(str(user_id), limit)
+    return item_ids.astype(np.int64), scores
+
+def _score_popularity(user_id, limit, context):
+    index = get_popularity_index()
+    if index is None:
+        return EMPTY
+    items, _ = context.matrix.user_items(user_id)
+    return index.top_products(limit, exclude=context.matrix.item_ids[items])
+
+
+# name -> scorer(user_id, limit, context) returning (product ids, scores)
+STRATEGIES = {
+    "user_based": _score_user_based,
+    "item_based": _score_item_based,
+    "content": _score_content,
+    "tfrs": _score_tfrs,
+    "popularity": _score_popularity,
+}
+
+
+def parse_strategy_values(spec: str, default: float = 1.0) -> dict:
+    """Parse ``"user_based:1,content:0.5"`` into {strategy: value}; a bare name gets ``default``."""
+    values = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = part.partition(":")
+        if name not in STRATEGIES:
+            raise ValueError(f"Unknown hybrid strategy {name!r}")
+        values[name] = float(value) if value else default
+    return values
+
+
+def fuse(results: dict, weights: dict, method: str = "rrf", limit: int = 20, offset: int = 0, rrf_k: int = 60):
+    """Fuse per-strategy (product ids, scores) into one ranked (product ids, scores).
+
+    ``weighted`` sums each strategy's scores after scaling them to [0, 1] by
+    the strategy's maximum; ``rrf`` sums ``weight / (rrf_k + rank)`` and so
+    ignores score scales entirely.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}")
+    all_ids, all_contributions = [], []
+    for name, (product_ids, scores) in results.items():
+        if not len(product_ids):
+            continue
+        weight = weights.get(name, 1.0)
+        if method == "rrf":
+            contributions = weight / (rrf_k + np.arange(1, len(product_ids) + 1, dtype=np.float32))
+        else:
+            scores = np.asarray(scores, dtype=np.float32)
+            top = scores.max()
+            contributions = weight * (scores / top if top > 0 else np.zeros_like(scores))
+        all_ids.append(np.asarray(product_ids, dtype=np.int64))
+        all_contributions.append(contributions)
+    if not all_ids:
+        return EMPTY
+
+    candidates, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(all_contributions)).astype(np.float32)
+    top = top_k_indices(totals, limit + offset)[offset:]
+    return candidates[top], totals[top]
+
+
+class HybridRecommender:
+    """Runs the configured strategies concurrently and fuses their rankings.
+
+    Every strategy scores in the shared thread pool against in-memory
+    structures and gets its own timeout; a strategy that misses its budget
+    or fails is left out and reported alongside the ranking, so a request
+    costs at most the slowest budget rather than the sum of all strategies.
+    Timed-out scorers are not interrupted; their threads finish in the
+    background and the result is discarded.
+    """
+
+    def __init__(self, weights: dict = None, method: str = None, timeout: float = None, candidates: int = None,
+                 timeouts: dict = None, executor: ThreadPoolExecutor = None):
+        if weights is None:
+            enabled = enabled_strategies()
+            weights = {name: weight for name, weight in parse_strategy_values(settings.HYBRID_STRATEGIES).items() if name in enabled}
+        self.weights = weights
+        self.method = method or settings.HYBRID_FUSION
+        self.timeout = timeout if timeout is not None else settings.HYBRID_STRATEGY_TIMEOUT_MS / 1000
+        if timeouts is None:
+            timeouts = {
+                name: milliseconds / 1000
+                for name, milliseconds in parse_strategy_values(settings.HYBRID_STRATEGY_TIMEOUTS_MS).items()
+            }
+        self.timeouts = timeouts
+        self.candidates = candidates or settings.HYBRID_CANDIDATES
+        self.executor = executor or _get_executor()
+
+    def _submit(self, user_id, limit, context, skip=()):
+        n_candidates = max(self.candidates, limit)
+        # Skipped strategies get no future and are reported like ones that missed their budget
+        return {
+            name: self.executor.submit(_timed, name, STRATEGIES[name], user_id, n_candidates, context)
+            if name not in skip else None
+            for name in self.weights
+        }
+
+    def _collect(self, futures, finished):
+        results, degraded = {}, []
+        for name, future in futures.items():
+            if future is None:
+                degraded.append(name)
+                continue
+            if future not in finished or future.cancelled():
+                future.cancel()
+                degraded.append(name)
+                continue
+            try:
+                results[name] = future.result()
+            except Exception:
+                logging.exception(f"Hybrid strategy {name} failed.")
+                degraded.append(name)
+        if degraded:
+            record_degraded(degraded)
+            logging.warning(f"Hybrid recommendation degraded; skipped strategies: {', '.join(degraded)}.")
+        return results, degraded
+
+    def recommend(self, user_id, context: HybridContext, limit: int = 20, offset: int = 0, method: str = None):
+        """Return fused (product ids, scores) and the names of strategies that were dropped."""
+        futures = self._submit(user_id, limit + offset, context)
+        finished = set()
+        started = time.monotonic()
+        for name, future in futures.items():
+            if future is None:
+                continue
+            remaining = started + self.timeouts.get(name, self.timeout) - time.monotonic()
+            done, _ = wait([future], timeout=max(0.0, remaining))
+            finished |= done
+        results, degraded = self._collect(futures, finished)
+        return fuse(results, self.weights, method or self.method, limit, offset, settings.HYBRID_RRF_K), degraded
+
+    async def recommend_async(self, user_id, context: HybridContext, limit: int = 20, offset: int = 0, method: str = None):
+        """Like ``recommend``; strategies the service has not finished loading are skipped as degraded."""
+        loading = [name for name in self.weights if not is_strategy_ready(name)]
+        futures = self._submit(user_id, limit + offset, context, skip=loading)
+        waiters = {
+            name: asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeouts.get(name, self.timeout))
+            for name, future in futures.items() if future is not None
+        }
+        await asyncio.gather(*waiters.values(), return_exceptions=True)
+        finished = {future for future in futures.values() if future is not None and future.done()}
+        results, degraded = self._collect(futures, finished)
+        return fuse(results, self.weights, method or self.method, limit, offset, settings.HYBRID_RRF_K), degraded
+
+
+def _timed(name, scorer, user_id, limit, context):
+    with timed_stage("scoring", f"hybrid.{name}"):
+        return scorer(user_id, limit, context)
+
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.HYBRID_WORKERS, thread_name_prefix="hybrid")
+    return _executor
+
+
+_hybrid_recommender = None
+
+
+def get_hybrid_recommender() -> HybridRecommender:
+    global _hybrid_recommender
+    if _hybrid_recommender is None:
+        _hybrid_recommender = HybridRecommender()
+    return _hybrid_recommender
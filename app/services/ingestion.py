@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.config import settings
+from app.crud.product import get_existing_product_ids_async
+from app.database import AsyncSessionLocal
+from app.models.recommendation import UserInteractionModel
+from app.services.interaction_matrix import record_interactions
+from app.services.metrics import record_dropped_interactions
+
+
+class BufferFullError(Exception):
+    """Raised when accepting more events would exceed the buffer's capacity."""
+
+
+async def write_interactions(events):
+    """Insert buffered events with one multi-row INSERT per flush."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(UserInteractionModel), events)
+        await db.commit()
+
+
+async def existing_product_ids(product_ids) -> set:
+    async with AsyncSessionLocal() as db:
+        return await get_existing_product_ids_async(db, list(product_ids))
+
+
+class InteractionBuffer:
+    """In-memory buffer that batches interaction events into bulk writes.
+
+    Events are flushed when ``flush_size`` of them are waiting or every
+    ``flush_interval`` seconds, whichever comes first. ``submit`` rejects
+    events with ``BufferFullError`` once ``max_size`` are pending so callers
+    can apply backpressure instead of growing memory without bound. After a
+    successful write the events are applied to the in-memory interaction
+    structures via ``record_interactions``, in a worker thread.
+
+    Events for products that do not exist are dropped and counted before the
+    write, with one lookup per flush rather than one per request. A batch the
+    database still rejects (constraint or data errors) is bisected
+    until the offending rows are isolated; those are dropped and counted,
+    and the rest is written. Any other failure is treated as transient: the
+    unwritten events are retried first on the following flushes, and dropped
+    after ``max_retries`` consecutive failures so an outage cannot wedge the
+    buffer for good.
+    """
+
+    def __init__(self, max_size: int, flush_size: int, flush_interval: float, max_retries: int = None,
+                 writer=write_interactions, product_filter=existing_product_ids):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = settings.INGEST_MAX_RETRIES if max_retries is None else max_retries
+        self.writer = writer
+        self.product_filter = product_filter
+        self._pending = []
+        self._retrying = []
+        self._retries = 0
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._pending) + len(self._retrying)
+
+    def submit(self, events):
+        """Queue dicts with user_id, product_id, interaction_type and interaction_value."""
+        if len(self) + len(events) > self.max_size:
+            raise BufferFullError(f"Interaction buffer is full ({len(self)}/{self.max_size} pending)")
+        self._pending.extend(events)
+        if len(self._pending) >= self.flush_size:
+            self._flush_requested.set()
+
+    def _drop(self, events, reason: str):
+        self.dropped += len(events)
+        record_dropped_interactions(reason, len(events))
+        logging.error(f"Dropped {len(events)} interactions ({reason}), e.g. {events[0]}.")
+
+    def _retry_later(self, events):
+        self.failed_flushes += 1
+        self._retries += 1
+        if self._retries > self.max_retries:
+            self._retries = 0
+            logging.exception(f"Failed to flush {len(events)} interactions {self.max_retries + 1} times in a row.")
+            self._drop(events, "retries_exhausted")
+        else:
+            self._retrying = events
+            logging.exception(f"Failed to flush {len(events)} interactions; will retry.")
+
+    async def flush(self):
+        async with self._flush_lock:
+            # Events of a failed flush go first so they are not overtaken by newer ones
+            if self._retrying:
+                events, self._retrying = self._retrying, []
+            else:
+                events, self._pending = self._pending, []
+            if not events:
+                return 0
+            started = time.perf_counter()
+            try:
+                existing = await self.product_filter({event["product_id"] for event in events})
+            except Exception:
+                self._retry_later(events)
+                return 0
+            unknown = [event for event in events if event["product_id"] not in existing]
+            if unknown:
+                # They would only fail the foreign key, one bisection step at a time
+                self._drop(unknown, "unknown_product")
+                events = [event for event in events if event["product_id"] in existing]
+            written, batches = [], [events] if events else []
+            while batches:
+                batch = batches.pop()
+                try:
+                    await self.writer(batch)
+                except (IntegrityError, DataError):
+                    if len(batch) == 1:
+                        self._drop(batch, "rejected")
+                    else:
+                        middle = len(batch) // 2
+                        batches += [batch[middle:], batch[:middle]]
+                    continue
+                except Exception:
+                    self._retry_later(batch + [event for rest in reversed(batches) for event in rest])
+                    break
+                written.extend(batch)
+            else:
+                self._retries = 0
+            if not written:
+                return 0
+
+            # Fold-in solves, matrix merges and shared-cache invalidations all block
+            await asyncio.to_thread(record_interactions, [
+                (event["user_id"], event["product_id"], event["interaction_type"], event["interaction_value"])
+                for event in written
+            ])
+            self.flushed += len(written)
+            logging.info(f"Flushed {len(written)} interactions in {(time.perf_counter() - started) * 1000:.1f}ms.")
+            return len(written)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self),
+            "capacity": self.max_size,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+
+interaction_buffer = InteractionBuffer(
+    max_size=settings.INGEST_BUFFER_MAX_SIZE,
+    flush_size=settings.INGEST_FLUSH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL_SECONDS,
+)
@@ -0,0 +1,387 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud.interactions import stream_interactions, stream_interactions_async
+from app.services.cache import recommendation_cache
+from app.services.fold_in import fold_in_interactions
+from app.services.materialized import mark_users_stale
+
+# Relative weight of each interaction type, multiplied by interaction_value.
+# Unknown types count like a view.
+INTERACTION_WEIGHTS = {
+    "view": 1.0,
+    "click": 1.0,
+    "like": 2.0,
+    "add_to_cart": 3.0,
+    "purchase": 5.0,
+}
+DEFAULT_INTERACTION_WEIGHT = 1.0
+
+# Rows fetched per round trip while building the matrix from the database
+BUILD_CHUNK_SIZE = 50000
+
+
+def interaction_weight(interaction_type: str, interaction_value: float) -> float:
+    return INTERACTION_WEIGHTS.get(interaction_type, DEFAULT_INTERACTION_WEIGHT) * float(interaction_value)
+
+
+def interaction_rows_to_arrays(rows):
+    """Convert (user_id, product_id, interaction_type, interaction_value) rows to id and weight arrays."""
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    user_ids, product_ids, interaction_types, interaction_values = zip(*rows)
+    type_weights = np.array(
+        [INTERACTION_WEIGHTS.get(interaction_type, DEFAULT_INTERACTION_WEIGHT) for interaction_type in interaction_types],
+        dtype=np.float32,
+    )
+    return (
+        np.asarray(user_ids, dtype=np.int64),
+        np.asarray(product_ids, dtype=np.int64),
+        type_weights * np.asarray(interaction_values, dtype=np.float32),
+    )
+
+
+class SortedIdIndex:
+    """Read-only id -> position map over a sorted copy of the ids.
+
+    Stands in for the ``dict`` indexes when the ids are memory-mapped from a
+    shared snapshot, so attaching to it creates no per-process Python objects.
+    """
+
+    def __init__(self, sorted_ids: np.ndarray, positions: np.ndarray):
+        self.sorted_ids = sorted_ids
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        if not isinstance(key, (int, np.integer)):
+            return default
+        found = int(np.searchsorted(self.sorted_ids, key))
+        if found < len(self.sorted_ids) and self.sorted_ids[found] == key:
+            return int(self.positions[found])
+        return default
+
+
+class InteractionMatrix:
+    """Weighted user x item interaction matrix shared by the collaborative strategies.
+
+    Rows are users and columns are products, both addressed through dense
+    id -> index maps. New interactions are appended to a pending buffer and
+    merged into the CSR matrix once it grows past ``merge_threshold`` or when
+    ``merge()`` is called (see ``start_interaction_matrix_merger``). Reads
+    never merge: they serve the last merged snapshot, whose CSC copy and user
+    norms are rebuilt by the merge before it is swapped in.
+    """
+
+    def __init__(self, merge_threshold: int = None):
+        self.merge_threshold = merge_threshold or settings.INTERACTION_MERGE_THRESHOLD
+        self.user_index = {}
+        self.item_index = {}
+        self._user_ids = []
+        self._item_ids = []
+        self._user_id_array = np.empty(0, dtype=np.int64)
+        self._item_id_array = np.empty(0, dtype=np.int64)
+        self._csr = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._csc = None
+        self._user_norms = None
+        self._pending_rows = []
+        self._pending_cols = []
+        self._pending_values = []
+        # Bumped on every merge so derived structures know when to refresh
+        self.version = 0
+        # Set for snapshots attached from shared memory, which never merge new events
+        self.read_only = False
+        # Item neighbour index published together with a read-only snapshot
+        self.neighbour_index = None
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, user_ids, item_ids, weights, merge_threshold: int = None) -> "InteractionMatrix":
+        """Build the matrix from parallel arrays of user ids, product ids and weights."""
+        matrix = cls(merge_threshold=merge_threshold)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_items, cols = np.unique(item_ids, return_inverse=True)
+        matrix._user_ids = unique_users.tolist()
+        matrix._item_ids = unique_items.tolist()
+        matrix._user_id_array = unique_users
+        matrix._item_id_array = unique_items
+        matrix.user_index = {user_id: i for i, user_id in enumerate(matrix._user_ids)}
+        matrix.item_index = {item_id: i for i, item_id in enumerate(matrix._item_ids)}
+
+        # COO -> CSR sums duplicate (user, item) pairs
+        matrix._csr = sp.csr_matrix(
+            (weights, (rows, cols)), shape=(len(unique_users), len(unique_items)), dtype=np.float32
+        )
+        matrix._csr.sum_duplicates()
+        return matrix
+
+    @classmethod
+    def from_shared(cls, csr, csc, user_ids, item_ids, user_lookup, item_lookup, user_norms, version: int):
+        """Wrap arrays published by ``app.jobs.publish_state`` without copying them.
+
+        ``user_lookup`` and ``item_lookup`` are (sorted ids, positions) pairs.
+        The matrix is read-only: new interactions arrive with the next
+        published snapshot.
+        """
+        matrix = cls()
+        matrix.user_index = SortedIdIndex(*user_lookup)
+        matrix.item_index = SortedIdIndex(*item_lookup)
+        matrix._user_ids = matrix._user_id_array = user_ids
+        matrix._item_ids = matrix._item_id_array = item_ids
+        matrix._csr = csr
+        matrix._csc = (csr, csc)
+        matrix._user_norms = (csr, user_norms)
+        matrix.version = version
+        matrix.read_only = True
+        return matrix
+
+    @classmethod
+    def from_db(cls, db: Session, merge_threshold: int = None) -> "InteractionMatrix":
+        """Build the matrix from user_interactions, streaming only the needed columns."""
+        chunks = [interaction_rows_to_arrays(rows) for rows in stream_interactions(db, BUILD_CHUNK_SIZE)]
+        return cls._from_chunks(chunks, merge_threshold)
+
+    @classmethod
+    async def from_db_async(cls, db, merge_threshold: int = None) -> "InteractionMatrix":
+        chunks = [interaction_rows_to_arrays(rows) async for rows in stream_interactions_async(db, BUILD_CHUNK_SIZE)]
+        return cls._from_chunks(chunks, merge_threshold)
+
+    @classmethod
+    def _from_chunks(cls, chunks, merge_threshold: int) -> "InteractionMatrix":
+        user_ids, item_ids, weights = (
+            [np.concatenate(parts) for parts in zip(*chunks)] if chunks else interaction_rows_to_arrays([])
+        )
+        matrix = cls.from_arrays(user_ids, item_ids, weights, merge_threshold=merge_threshold)
+        logging.info(
+            f"Built interaction matrix: {matrix.shape[0]} users x {matrix.shape[1]} items, "
+            f"{matrix.csr.nnz} non-zeros."
+        )
+        return matrix
+
+    def add_interactions(self, interactions):
+        """Append (user_id, product_id, interaction_type, interaction_value) events."""
+        if self.read_only:
+            raise RuntimeError("Cannot add interactions to a read-only shared interaction matrix")
+        with self._lock:
+            for user_id, product_id, interaction_type, interaction_value in interactions:
+                if product_id is None:
+                    continue
+                self._pending_rows.append(self._index_of(self.user_index, self._user_ids, user_id))
+                self._pending_cols.append(self._index_of(self.item_index, self._item_ids, product_id))
+                self._pending_values.append(interaction_weight(interaction_type, interaction_value))
+            merge = len(self._pending_values) >= self.merge_threshold
+        if merge:
+            self.merge()
+
+    @staticmethod
+    def _index_of(index, ids, key):
+        position = index.get(key)
+        if position is None:
+            position = len(ids)
+            index[key] = position
+            ids.append(key)
+        return position
+
+    @property
+    def pending(self) -> int:
+        """Events recorded but not merged into the snapshot readers see yet."""
+        return len(self._pending_values)
+
+    def merge(self) -> np.ndarray:
+        """Merge the pending events into a new snapshot and swap it in; returns the ids of the users they touched.
+
+        The O(nnz) rebuild runs outside the lock ``add_interactions`` takes,
+        so recording events never waits for it, and readers keep the previous
+        snapshot until the new one is complete.
+        """
+        with self._merge_lock:
+            with self._lock:
+                shape = (len(self._user_ids), len(self._item_ids))
+                current = self._csr
+                if not self._pending_values and shape == current.shape:
+                    return np.empty(0, dtype=np.int64)
+                rows = np.asarray(self._pending_rows, dtype=np.int64)
+                cols = np.asarray(self._pending_cols, dtype=np.int64)
+                values = np.asarray(self._pending_values, dtype=np.float32)
+                self._pending_rows, self._pending_cols, self._pending_values = [], [], []
+                user_ids = np.asarray(self._user_ids, dtype=np.int64)
+                item_ids = np.asarray(self._item_ids, dtype=np.int64)
+
+            grown = sp.csr_matrix(
+                (current.data, current.indices, np.pad(current.indptr, (0, shape[0] - current.shape[0]), mode="edge")),
+                shape=shape,
+            )
+            delta = sp.csr_matrix((values, (rows, cols)), shape=shape, dtype=np.float32)
+            merged = (grown + delta).tocsr()
+            merged.sum_duplicates()
+            # Derived arrays readers already use are rebuilt here rather than on their next request
+            csc = (merged, merged.tocsc()) if self._csc is not None else None
+            user_norms = (merged, self._row_norms(merged)) if self._user_norms is not None else None
+
+            # Ids are append-only, so the new id arrays also index the previous snapshot
+            self._user_id_array = user_ids
+            self._item_id_array = item_ids
+            self._csc = csc
+            self._user_norms = user_norms
+            self._csr = merged
+            self.version += 1
+            return np.unique(user_ids[rows])
+
+    @staticmethod
+    def _row_norms(csr: sp.csr_matrix) -> np.ndarray:
+        return np.sqrt(np.asarray(csr.multiply(csr).sum(axis=1)).ravel()).astype(np.float32)
+
+    @property
+    def csr(self) -> sp.csr_matrix:
+        return self._csr
+
+    @property
+    def csc(self) -> sp.csc_matrix:
+        csr = self._csr
+        cached = self._csc
+        if cached is None or cached[0] is not csr:
+            cached = (csr, csr.tocsc())
+            # A reader still on a replaced snapshot must not evict the merge's copy
+            if csr is self._csr:
+                self._csc = cached
+        return cached[1]
+
+    @property
+    def user_norms(self) -> np.ndarray:
+        """L2 norm of every user row, cached per matrix snapshot."""
+        csr = self._csr
+        cached = self._user_norms
+        if cached is None or cached[0] is not csr:
+            cached = (csr, self._row_norms(csr))
+            if csr is self._csr:
+                self._user_norms = cached
+        return cached[1]
+
+    @property
+    def shape(self):
+        return self._csr.shape
+
+    @property
+    def user_ids(self) -> np.ndarray:
+        """Row index -> user id."""
+        return self._user_id_array
+
+    @property
+    def item_ids(self) -> np.ndarray:
+        """Column index -> product id."""
+        return self._item_id_array
+
+    def user_items(self, user_id: int):
+        """Return (item indices, weights) of a user's row, or empty arrays for unknown users."""
+        row = self.user_index.get(user_id)
+        csr = self.csr
+        if row is None or row >= csr.shape[0]:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        start, end = csr.indptr[row], csr.indptr[row + 1]
+        return csr.indices[start:end], csr.data[start:end]
+
+    def user_item_ids(self, user_id: int) -> np.ndarray:
+        """Product ids the user interacted with, strongest interaction first."""
+        items, weights = self.user_items(user_id)
+        if not len(items):
+            return np.empty(0, dtype=np.int64)
+        order = np.argsort(-weights, kind="stable")
+        return self.item_ids[items[order]]
+
+
+_interaction_matrix = None
+_interaction_matrix_lock = threading.Lock()
+
+
+def current_interaction_matrix():
+    """The process-wide interaction matrix, or None until it has been built."""
+    return _interaction_matrix
+
+
+def get_interaction_matrix(db: Session) -> InteractionMatrix:
+    """Return the process-wide interaction matrix, building it on first use."""
+    global _interaction_matrix
+    if _interaction_matrix is None:
+        with _interaction_matrix_lock:
+            if _interaction_matrix is None:
+                _interaction_matrix = InteractionMatrix.from_db(db)
+    return _interaction_matrix
+
+
+def set_interaction_matrix(matrix) -> None:
+    global _interaction_matrix
+    with _interaction_matrix_lock:
+        _interaction_matrix = matrix
+
+
+def record_interactions(interactions) -> None:
+    """Apply newly stored interactions to the in-memory structures and drop stale cache entries."""
+    interactions = list(interactions)
+    matrix = _interaction_matrix
+
+    def history(user_id):
+        items, weights = matrix.user_items(user_id)
+        return matrix.item_ids[items], weights
+
+    # Refit the users' embedding vectors while their matrix rows still hold only the older history
+    fold_in_interactions(
+        [(user_id, product_id, interaction_weight(interaction_type, value))
+         for user_id, product_id, interaction_type, value in interactions],
+        history=history if matrix is not None else None,
+    )
+    # A shared snapshot picks the events up from the database when it is next published
+    if matrix is not None and not matrix.read_only:
+        matrix.add_interactions(interactions)
+    user_ids = {interaction[0] for interaction in interactions}
+    for user_id in user_ids:
+        recommendation_cache.invalidate_user(user_id)
+    mark_users_stale(user_ids)
+
+
+def merge_interaction_matrix() -> int:
+    """Merge the process-wide matrix's pending events; returns the number of users whose rows changed.
+
+    Responses computed between recording an event and this merge read the
+    user's old row, so their cache entries are dropped again once it is visible.
+    """
+    matrix = _interaction_matrix
+    if matrix is None or matrix.read_only:
+        return 0
+    user_ids = matrix.merge()
+    for user_id in user_ids.tolist():
+        recommendation_cache.invalidate_user(user_id)
+    return len(user_ids)
+
+
+def start_interaction_matrix_merger(interval: float = None) -> threading.Thread:
+    """Merge recorded interactions into the matrix every ``interval`` seconds in a daemon thread."""
+    interval = interval if interval is not None else settings.INTERACTION_MERGE_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                merge_interaction_matrix()
+            except Exception:
+                logging.exception("Failed to merge recorded interactions into the interaction matrix.")
+
+    thread = threading.Thread(target=run, name="interaction-matrix-merger", daemon=True)
+    thread.start()
+    return thread
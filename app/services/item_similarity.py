@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.interaction_matrix import InteractionMatrix, get_interaction_matrix
+from app.services.ranking import top_k_indices
+
+# Upper bound on the dense similarity block materialised at once while building
+SIMILARITY_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+class ItemNeighbourIndex:
+    """Top-K item-item similarities stored as two (n_items, k) arrays.
+
+    ``neighbours[i]`` holds the column indices of item ``i``'s most similar
+    items (padded with -1) and ``scores[i]`` their similarities. Indices refer
+    to the interaction matrix columns, which are append-only, so the index
+    stays valid while new interactions are merged in.
+    """
+
+    def __init__(self, item_ids: np.ndarray, neighbours: np.ndarray, scores: np.ndarray, matrix_version: int = 0):
+        self.item_ids = item_ids
+        self.neighbours = neighbours
+        self.scores = scores
+        self.matrix_version = matrix_version
+
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+
+    def recommend(self, item_indices: np.ndarray, weights: np.ndarray, limit: int, offset: int = 0):
+        """Merge the neighbour lists of a user's items into ranked (product ids, scores).
+
+        Each neighbour contributes ``similarity * interaction weight``; items
+        the user already interacted with are excluded.
+        """
+        known = item_indices < len(self.neighbours)
+        item_indices, weights = item_indices[known], weights[known]
+        if not len(item_indices):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        neighbours = self.neighbours[item_indices].ravel()
+        contributions = (self.scores[item_indices] * weights[:, None]).ravel()
+        valid = neighbours >= 0
+        candidates, inverse = np.unique(neighbours[valid], return_inverse=True)
+        totals = np.bincount(inverse, weights=contributions[valid]).astype(np.float32)
+
+        unseen = ~np.isin(candidates, item_indices)
+        candidates, totals = candidates[unseen], totals[unseen]
+        top = top_k_indices(totals, limit + offset)[offset:]
+        return self.item_ids[candidates[top]], totals[top]
+
+
+def build_item_neighbour_index(matrix: InteractionMatrix, k: int = 50, adjusted: bool = False) -> ItemNeighbourIndex:
+    """Compute item-item cosine similarities and keep the top ``k`` per item.
+
+    With ``adjusted=True`` each user's mean weight is subtracted from their
+    interactions first (adjusted cosine). Similarities are computed a block of
+    items at a time with sparse products so memory stays bounded.
+    """
+    started = time.perf_counter()
+    csr = matrix.csr.astype(np.float32)
+    version = matrix.version
+    item_ids = matrix.item_ids[: csr.shape[1]]
+    n_items = csr.shape[1]
+
+    if adjusted and csr.nnz:
+        counts = np.diff(csr.indptr)
+        means = np.asarray(csr.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        csr = csr.copy()
+        csr.data -= np.repeat(means, counts).astype(np.float32)
+        csr.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(csr.multiply(csr).sum(axis=0)).ravel())
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalised = (csr @ sp.diags(inverse_norms.astype(np.float32))).tocsc()
+    items_by_users = normalised.T.tocsr()
+
+    neighbours = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    block = max(1, min(n_items, SIMILARITY_BLOCK_BYTES // max(1, n_items * 4)))
+
+    for start in range(0, n_items, block):
+        end = min(start + block, n_items)
+        similarities = (items_by_users[start:end] @ normalised).toarray()
+        # An item is not its own neighbour
+        similarities[np.arange(end - start), np.arange(start, end)] = 0.0
+
+        width = min(k, n_items)
+        if width < n_items:
+            top = np.argpartition(-similarities, width - 1, axis=1)[:, :width]
+        else:
+            top = np.tile(np.arange(n_items), (end - start, 1))
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        # Drop non-positive similarities so they never contribute to a score
+        top[top_scores <= 0] = -1
+        top_scores[top_scores <= 0] = 0.0
+        neighbours[start:end, :width] = top
+        scores[start:end, :width] = top_scores
+
+    logging.info(
+        f"Built item neighbour index for {n_items} items (k={k}) in {time.perf_counter() - started:.2f}s."
+    )
+    return ItemNeighbourIndex(item_ids, neighbours, scores, matrix_version=version)
+
+
+_item_index = None
+_item_index_lock = threading.Lock()
+
+
+def current_item_neighbour_index(matrix: InteractionMatrix):
+    """The neighbour index matching ``matrix``, or None until it has been built; never builds one."""
+    if matrix.neighbour_index is not None:
+        return matrix.neighbour_index
+    return _item_index
+
+
+def get_item_neighbour_index(matrix: InteractionMatrix) -> ItemNeighbourIndex:
+    """Return the process-wide neighbour index, building it from ``matrix`` on first use.
+
+    A shared snapshot carries its own index, whose columns match that matrix.
+    """
+    if matrix.neighbour_index is not None:
+        return matrix.neighbour_index
+    global _item_index
+    if _item_index is None:
+        with _item_index_lock:
+            if _item_index is None:
+                _item_index = build_item_neighbour_index(matrix, k=settings.ITEM_SIMILARITY_TOP_K)
+    return _item_index
+
+
+def set_item_neighbour_index(index: ItemNeighbourIndex) -> None:
+    global _item_index
+    with _item_index_lock:
+        _item_index = index
+
+
+def refresh_item_neighbour_index(db: Session) -> ItemNeighbourIndex:
+    """Rebuild the neighbour index if the interaction matrix changed since the last build."""
+    global _item_index
+    matrix = get_interaction_matrix(db)
+    current = _item_index
+    if current is not None and current.matrix_version == matrix.version:
+        return current
+    rebuilt = build_item_neighbour_index(matrix, k=settings.ITEM_SIMILARITY_TOP_K)
+    with _item_index_lock:
+        _item_index = rebuilt
+    return rebuilt
+
+
+def start_item_similarity_refresher(session_factory, interval: float = None) -> threading.Thread:
+    """Periodically rebuild the neighbour index in a daemon thread."""
+    interval = interval if interval is not None else settings.ITEM_SIMILARITY_REFRESH_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            db = session_factory()
+            try:
+                refresh_item_neighbour_index(db)
+            except Exception:
+                logging.exception("Failed to refresh item neighbour index.")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run, name="item-similarity-refresher", daemon=True)
+    thread.start()
+    return thread
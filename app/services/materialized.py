@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.metrics import record_materialized_lookup
+from app.services.model_store import LATEST_FILE, MANIFEST_FILE, _write_atomic, latest_version, list_versions
+
+# Layout of the per-user recommendation store written by app.jobs.materialize:
+#   <root>/<strategy>/<version>/manifest.json
+#   <root>/<strategy>/<version>/{user_ids,offsets,product_ids,scores}.npy
+#   <root>/<strategy>/LATEST
+# User ``user_ids[i]`` owns ``product_ids[offsets[i]:offsets[i + 1]]``, best first.
+ARRAY_NAMES = ("user_ids", "offsets", "product_ids", "scores")
+MATERIALIZED_STRATEGIES = ("user_based", "item_based", "content", "tfrs")
+
+
+class MaterializedRecommendations:
+    """Precomputed top-K lists for every user of one strategy, memory-mapped from disk.
+
+    Lookups are a binary search over the sorted user ids followed by an O(K)
+    slice, so serving never touches the scoring structures.
+    """
+
+    def __init__(self, user_ids, offsets, product_ids, scores, manifest: dict):
+        self.user_ids = user_ids
+        self.offsets = offsets
+        self.product_ids = product_ids
+        self.scores = scores
+        self.manifest = manifest
+        self.strategy = manifest["strategy"]
+        self.version = manifest["version"]
+        self.top_k = manifest["top_k"]
+        self.computed_at = manifest["computed_at"]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def is_fresh(self, max_age: float = None, now: float = None) -> bool:
+        max_age = settings.MATERIALIZED_MAX_AGE_SECONDS if max_age is None else max_age
+        return (time.time() if now is None else now) - self.computed_at <= max_age
+
+    def user_slice(self, user_id):
+        """(start, end) of the user's list, or None if the user was not materialized."""
+        position = int(np.searchsorted(self.user_ids, user_id))
+        if position >= len(self.user_ids) or self.user_ids[position] != user_id:
+            return None
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def lookup(self, user_id: int, limit: int, offset: int = 0):
+        """(product ids, scores) for one page, or None when the store cannot answer it."""
+        bounds = self.user_slice(user_id)
+        if bounds is None:
+            return None
+        start, end = bounds
+        # A full list may have been cut at top_k; pages past it need online scoring
+        if end - start >= self.top_k and offset + limit > self.top_k:
+            return None
+        window = slice(min(end, start + offset), min(end, start + offset + limit))
+        return np.asarray(self.product_ids[window]), np.asarray(self.scores[window])
+
+
+def pack_lists(user_ids, counts, product_ids, scores):
+    """Sort per-user lists given as (user ids, list lengths, flat products, flat scores) by user id."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    order = np.argsort(user_ids, kind="stable")
+    counts = counts[order]
+    # Gather the flat arrays in user order with one fancy index
+    positions = np.repeat(starts[order] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    positions += np.arange(int(counts.sum()), dtype=np.int64)
+    return (
+        user_ids[order],
+        np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        np.asarray(product_ids, dtype=np.int64)[positions],
+        np.asarray(scores, dtype=np.float32)[positions],
+    )
+
+
+def merge_lists(previous: MaterializedRecommendations, user_ids, counts, product_ids, scores):
+    """Replace the lists of ``user_ids`` in ``previous`` and keep everyone else's."""
+    user_ids, offsets, product_ids, scores = pack_lists(user_ids, counts, product_ids, scores)
+    kept = ~np.isin(previous.user_ids, user_ids)
+    kept_counts = np.diff(previous.offsets)[kept]
+    kept_rows = np.repeat(kept, np.diff(previous.offsets))
+    return pack_lists(
+        np.concatenate([np.asarray(previous.user_ids)[kept], user_ids]),
+        np.concatenate([kept_counts, np.diff(offsets)]),
+        np.concatenate([np.asarray(previous.product_ids)[kept_rows], product_ids]),
+        np.concatenate([np.asarray(previous.scores)[kept_rows], scores]),
+    )
+
+
+def save_materialized(root: str, strategy: str, user_ids, offsets, product_ids, scores, metadata: dict = None) -> str:
+    """Write a new version of ``strategy``'s store and point LATEST at it; returns the version name."""
+    strategy_root = os.path.join(root, strategy)
+    os.makedirs(strategy_root, exist_ok=True)
+    version = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    suffix = 0
+    while os.path.exists(os.path.join(strategy_root, version if not suffix else f"{version}-{suffix}")):
+        suffix += 1
+    version = version if not suffix else f"{version}-{suffix}"
+
+    staging = os.path.join(strategy_root, f".{version}.tmp")
+    os.makedirs(staging)
+    try:
+        for name, array in zip(ARRAY_NAMES, (user_ids, offsets, product_ids, scores)):
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+        manifest = {
+            "version": version,
+            "strategy": strategy,
+            "num_users": len(user_ids),
+            "num_recommendations": len(product_ids),
+            **(metadata or {}),
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.rename(staging, os.path.join(strategy_root, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_atomic(os.path.join(strategy_root, LATEST_FILE), version)
+    logging.info(f"Saved materialized {strategy} recommendations {version} for {len(user_ids)} users.")
+    return version
+
+
+def load_materialized(root: str, strategy: str, version: str = None) -> MaterializedRecommendations:
+    """Memory-map a version (default: LATEST) of ``strategy``'s store."""
+    strategy_root = os.path.join(root, strategy)
+    version = version or latest_version(strategy_root)
+    if version is None:
+        raise FileNotFoundError(f"No materialized {strategy} recommendations in {root}")
+    path = os.path.join(strategy_root, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES]
+    return MaterializedRecommendations(*arrays, manifest=manifest)
+
+
+def prune_versions(root: str, strategy: str, keep: int = 2) -> None:
+    """Delete all but the newest ``keep`` versions; mapped files stay readable until unmapped."""
+    strategy_root = os.path.join(root, strategy)
+    for version in list_versions(strategy_root)[:-keep]:
+        shutil.rmtree(os.path.join(strategy_root, version), ignore_errors=True)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+# user id -> time of the user's latest interaction seen by this process
+_interacted_at = {}
+
+
+def get_materialized(strategy: str):
+    """The loaded store for ``strategy``, or None."""
+    return _stores.get(strategy)
+
+
+def load_materialized_stores(root: str = None) -> dict:
+    """(Re)load the LATEST version of every strategy whose version changed; returns the loaded stores."""
+    root = root or settings.MATERIALIZED_DIR
+    for strategy in MATERIALIZED_STRATEGIES:
+        version = latest_version(os.path.join(root, strategy))
+        current = _stores.get(strategy)
+        if version is None or (current is not None and current.version == version):
+            continue
+        try:
+            store = load_materialized(root, strategy, version)
+        except (FileNotFoundError, KeyError, ValueError):
+            logging.exception(f"Failed to load materialized {strategy} recommendations {version}.")
+            continue
+        with _stores_lock:
+            _stores[strategy] = store
+        logging.info(f"Serving materialized {strategy} recommendations {version} for {len(store)} users.")
+    return dict(_stores)
+
+
+def lookup_materialized(strategy: str, user_id, limit: int, offset: int = 0, model_version=None):
+    """Precomputed (product ids, scores) when a fresh store can answer, else None.
+
+    ``model_version`` rejects lists computed with a different model than
+    the one currently serving, e.g. a retrained TFRS artifact.
+    """
+    store = _stores.get(strategy)
+    scored = None
+    if (
+        store is not None
+        and store.is_fresh()
+        and model_version in (None, store.manifest.get("model_version", model_version))
+        and _interacted_at.get(int(user_id), 0.0) < store.computed_at
+    ):
+        scored = store.lookup(int(user_id), limit, offset)
+    record_materialized_lookup(strategy, hit=scored is not None)
+    return scored
+
+
+def mark_users_stale(user_ids) -> None:
+    """Serve ``user_ids`` online until a store computed after their new interactions is loaded."""
+    now = time.time()
+    for user_id in user_ids:
+        _interacted_at[int(user_id)] = now
+
+
+def _forget_old_interactions(max_age: float) -> None:
+    # Stores older than max_age are not served anyway, so older marks can go
+    cutoff = time.time() - max_age
+    for user_id, interacted_at in list(_interacted_at.items()):
+        if interacted_at < cutoff:
+            _interacted_at.pop(user_id, None)
+
+
+def start_materialized_refresher(root: str = None, interval: float = None) -> threading.Thread:
+    """Pick up versions written by the materialization job in a daemon thread."""
+    interval = interval if interval is not None else settings.MATERIALIZED_REFRESH_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                load_materialized_stores(root)
+                _forget_old_interactions(settings.MATERIALIZED_MAX_AGE_SECONDS)
+            except Exception:
+                logging.exception("Failed to refresh materialized recommendations.")
+
+    thread = threading.Thread(target=run, name="materialized-refresher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,163 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.config import settings
+from app.services.embeddings import OOV_TOKEN, EmbeddingRetriever
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.model_store import save_embedding_artifact
+
+# Rows solved per task; each task touches the fixed factors of its rows' interactions only
+SOLVE_BLOCK_ROWS = 2048
+
+
+def _confidence_matrix(csr: sp.csr_matrix, alpha: float) -> sp.csr_matrix:
+    """``alpha * r`` for every observed interaction, i.e. confidence minus the baseline 1."""
+    confidence = csr.astype(np.float32, copy=True)
+    confidence.data *= alpha
+    return confidence
+
+
+def _solve_block(target: np.ndarray, fixed: np.ndarray, gram: np.ndarray, confidence: sp.csr_matrix,
+                 start: int, end: int, cg_steps: int) -> None:
+    """Update ``target[start:end]`` in place with a few conjugate-gradient steps on the implicit ALS normal equations.
+
+    For row ``u`` with confidences ``c_ui = 1 + alpha * r_ui`` and preferences
+    ``p_ui = 1`` on observed items, the system is
+    ``(Y^T Y + reg * I + Y^T (C_u - I) Y) x_u = Y^T C_u p_u``. Only the
+    observed items enter the correction term, so a block costs
+    O(nnz * factors) and the rows of a block are solved together, vectorised.
+    """
+    block = confidence[start:end]
+    lengths = np.diff(block.indptr)
+    rows = np.repeat(np.arange(end - start), lengths)
+    observed = fixed[block.indices]
+    extra = block.data[:, None]
+
+    def product(x):
+        # (Y^T Y + reg * I) x + Y^T (C_u - I) Y x, row by row
+        projections = (observed * x[rows]).sum(axis=1, keepdims=True)
+        return x @ gram + sp.csr_matrix(((extra * projections).ravel(), block.indices, block.indptr),
+                                        shape=block.shape) @ fixed
+
+    x = target[start:end]
+    right = sp.csr_matrix((block.data + 1.0, block.indices, block.indptr), shape=block.shape) @ fixed
+    residual = right - product(x)
+    direction = residual.copy()
+    squared = (residual * residual).sum(axis=1)
+    for _ in range(cg_steps):
+        if not squared.any():
+            break
+        step_direction = product(direction)
+        curvature = (direction * step_direction).sum(axis=1)
+        step = np.divide(squared, curvature, out=np.zeros_like(squared), where=curvature > 0)
+        x += step[:, None] * direction
+        residual -= step[:, None] * step_direction
+        updated = (residual * residual).sum(axis=1)
+        ratio = np.divide(updated, squared, out=np.zeros_like(updated), where=squared > 0)
+        direction = residual + ratio[:, None] * direction
+        squared = updated
+    target[start:end] = x
+
+
+class ALSRecommender:
+    """Implicit-feedback matrix factorization trained with alternating least squares.
+
+    Interaction weights (type weight times ``interaction_value``) are read as
+    confidence ``1 + alpha * r`` that the user prefers the item (Hu, Koren &
+    Volinsky, 2008). Each half-iteration fixes one side's factors and solves
+    every row of the other side independently, so rows are split into blocks
+    solved on a thread pool; numpy and scipy release the GIL in the dense and
+    sparse products that dominate a block. The factors are exported like the
+    TFRS embeddings, with an out-of-vocabulary row 0, so they are served by the
+    same ``EmbeddingRetriever`` and artifact store.
+    """
+
+    def __init__(self, factors: int = None, regularization: float = None, alpha: float = None,
+                 cg_steps: int = None, threads: int = None, seed: int = 0):
+        self.factors = factors or settings.ALS_FACTORS
+        self.regularization = settings.ALS_REGULARIZATION if regularization is None else regularization
+        self.alpha = settings.ALS_ALPHA if alpha is None else alpha
+        self.cg_steps = cg_steps or settings.ALS_CG_STEPS
+        self.threads = threads or settings.ALS_THREADS or os.cpu_count() or 1
+        self.seed = seed
+        self.user_ids = None
+        self.item_ids = None
+        self.user_factors = None
+        self.item_factors = None
+        self.retriever = None
+
+    def _half_step(self, executor: ThreadPoolExecutor, target: np.ndarray, fixed: np.ndarray,
+                   confidence: sp.csr_matrix) -> None:
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=np.float32)
+        futures = [
+            executor.submit(_solve_block, target, fixed, gram, confidence, start,
+                            min(start + SOLVE_BLOCK_ROWS, len(target)), self.cg_steps)
+            for start in range(0, len(target), SOLVE_BLOCK_ROWS)
+        ]
+        for future in futures:
+            future.result()
+
+    def train(self, matrix: InteractionMatrix, iterations: int = None):
+        """Fit user and item factors to the interaction matrix; repeated calls continue from the current factors."""
+        iterations = iterations or settings.ALS_ITERATIONS
+        csr = matrix.csr
+        user_ids = matrix.user_ids[: csr.shape[0]]
+        item_ids = matrix.item_ids[: csr.shape[1]]
+        if self.user_factors is None or len(self.user_factors) != len(user_ids) or len(self.item_factors) != len(item_ids):
+            rng = np.random.default_rng(self.seed)
+            self.user_factors = (rng.standard_normal((len(user_ids), self.factors)) * 0.01).astype(np.float32)
+            self.item_factors = (rng.standard_normal((len(item_ids), self.factors)) * 0.01).astype(np.float32)
+        self.user_ids, self.item_ids = user_ids, item_ids
+
+        user_confidence = _confidence_matrix(csr, self.alpha)
+        item_confidence = user_confidence.T.tocsr()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="als") as executor:
+            for iteration in range(iterations):
+                iteration_started = time.perf_counter()
+                self._half_step(executor, self.user_factors, self.item_factors, user_confidence)
+                self._half_step(executor, self.item_factors, self.user_factors, item_confidence)
+                logging.info(f"ALS iteration {iteration + 1}: {time.perf_counter() - iteration_started:.2f}s")
+        logging.info(
+            f"Trained ALS model ({len(user_ids)} users x {len(item_ids)} items, {self.factors} factors) "
+            f"for {iterations} iterations on {self.threads} threads in {time.perf_counter() - started:.1f}s."
+        )
+        self.build_index()
+        return self
+
+    def build_index(self, kind=None, **params):
+        """Snapshot the factors and vocabularies into a retrieval index, in the TFRS embedding layout."""
+        oov = np.zeros((1, self.factors), dtype=np.float32)
+        self.retriever = EmbeddingRetriever(
+            user_vocabulary=np.array([OOV_TOKEN] + [str(user_id) for user_id in self.user_ids.tolist()]),
+            user_embeddings=np.vstack([oov, self.user_factors]),
+            item_vocabulary=np.array([OOV_TOKEN] + [str(item_id) for item_id in self.item_ids.tolist()]),
+            item_embeddings=np.vstack([oov, self.item_factors]),
+            index_kind=kind,
+            **params,
+        )
+
+    def save_artifact(self, root, metadata=None):
+        """Export the factors as a new versioned embedding artifact under ``root``."""
+        if self.retriever is None:
+            self.build_index()
+        return save_embedding_artifact(
+            root,
+            user_vocabulary=self.retriever.user_vocabulary,
+            user_embeddings=self.retriever.user_embeddings,
+            item_vocabulary=self.retriever.item_vocabulary,
+            item_embeddings=self.retriever.item_embeddings,
+            index=self.retriever.index,
+            metadata={"model": "als", "factors": self.factors, "regularization": self.regularization,
+                      "alpha": self.alpha, **(metadata or {})},
+        )
+
+    def recommend(self, user_id, top_k=5):
+        if self.retriever is None:
+            self.build_index()
+        return self.retriever.recommend(user_id, top_k)
@@ -0,0 +1,270 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request.", ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ["method", "route"], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Latency of single SQL statements.", ["operation"], buckets=LATENCY_BUCKETS,
+)
+STRATEGY_LATENCY = Histogram(
+    "recommendation_strategy_duration_seconds", "Time to compute an uncached recommendation response.",
+    ["strategy"], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "recommendation_stage_duration_seconds", "Time per strategy spent in the db, scoring, reranking and serialization stages.",
+    ["strategy", "stage"], buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "recommendation_cache_lookups", "Response cache lookups by strategy and result.", ["strategy", "result"],
+)
+MATERIALIZED_LOOKUPS = Counter(
+    "recommendation_materialized_lookups", "Lookups in the precomputed per-user store.", ["strategy", "result"],
+)
+DEGRADED_STRATEGIES = Counter(
+    "recommendation_hybrid_degraded", "Hybrid strategies dropped for missing their budget or failing.", ["strategy"],
+)
+INTERACTIONS_DROPPED = Counter(
+    "ingest_interactions_dropped", "Buffered interactions dropped instead of written.", ["reason"],
+)
+LOAD_SHED = Counter(
+    "recommendation_load_shed", "Requests served a fallback because their strategy was at its concurrency limit.",
+    ["strategy"],
+)
+
+
+class RequestStats:
+    """Per-request counters filled in by the SQLAlchemy cursor events."""
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+
+
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+_strategy: ContextVar = ContextVar("strategy", default="none")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_seconds += elapsed
+        stats.db_queries += 1
+
+
+def instrument_engines() -> None:
+    """Time every statement on every engine, including the sync engine behind the async one."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _db_seconds() -> float:
+    stats = _request_stats.get()
+    return stats.db_seconds if stats is not None else 0.0
+
+
+@contextmanager
+def timed_stage(stage: str, strategy: str = None):
+    """Record the time spent in a stage of a strategy, excluding SQL time.
+
+    Works as a context manager and as a decorator. Without ``strategy`` the
+    label comes from the enclosing ``observe_strategy``.
+    """
+    started, db_started = time.perf_counter(), _db_seconds()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (_db_seconds() - db_started)
+        STAGE_LATENCY.labels(strategy or _strategy.get(), stage).observe(elapsed)
+
+
+@contextmanager
+def observe_strategy(strategy: str):
+    """Label the stages timed inside with ``strategy``; record its total latency and SQL time."""
+    token = _strategy.set(strategy)
+    started, db_started = time.perf_counter(), _db_seconds()
+    try:
+        yield
+    finally:
+        STRATEGY_LATENCY.labels(strategy).observe(time.perf_counter() - started)
+        STAGE_LATENCY.labels(strategy, "db").observe(_db_seconds() - db_started)
+        _strategy.reset(token)
+
+
+def record_cache_lookup(strategy: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(strategy, "hit" if hit else "miss").inc()
+
+
+def record_materialized_lookup(strategy: str, hit: bool) -> None:
+    MATERIALIZED_LOOKUPS.labels(strategy, "hit" if hit else "miss").inc()
+
+
+def record_degraded(strategies) -> None:
+    for strategy in strategies:
+        DEGRADED_STRATEGIES.labels(strategy).inc()
+
+
+def record_dropped_interactions(reason: str, count: int) -> None:
+    INTERACTIONS_DROPPED.labels(reason).inc(count)
+
+
+def record_load_shed(strategy: str) -> None:
+    LOAD_SHED.labels(strategy).inc()
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners cannot blow up the series count
+    return getattr(route, "path", "unmatched")
+
+
+_profiler_missing = False
+
+
+def _start_profiler():
+    global _profiler_missing
+    if _profiler_missing:
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logging.warning("PROFILE_SLOW_REQUEST_MS is set but pyinstrument is not installed; profiling is disabled.")
+        _profiler_missing = True
+        return None
+    profiler = Profiler(interval=settings.PROFILE_INTERVAL_MS / 1000, async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, SQL time and query count per route template.
+
+    When ``PROFILE_SLOW_REQUEST_MS`` is set, a ``PROFILE_SAMPLE_RATE`` share of
+    requests runs under the pyinstrument sampling profiler and the call tree
+    of those slower than the threshold is logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler = None
+        if settings.PROFILE_SLOW_REQUEST_MS > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+            profiler = _start_profiler()
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            method, route = scope["method"], _route_template(scope)
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            REQUEST_DB_TIME.labels(method, route).observe(stats.db_seconds)
+            REQUEST_QUERIES.labels(method, route).observe(stats.db_queries)
+            if profiler is not None:
+                profiler.stop()
+                if elapsed * 1000 >= settings.PROFILE_SLOW_REQUEST_MS:
+                    logging.warning(
+                        f"Slow request {method} {scope['path']} took {elapsed * 1000:.0f}ms "
+                        f"({stats.db_queries} queries, {stats.db_seconds * 1000:.0f}ms in SQL):\n"
+                        + profiler.output_text(color=False)
+                    )
+
+
+class ServiceStateCollector:
+    """Exports cache counters, strategy concurrency and the versions of the in-memory models at scrape time."""
+
+    def describe(self):
+        # Registering must not call collect(), which imports the services this module is imported by
+        return []
+
+    def collect(self):
+        from app.services import content, embeddings, interaction_matrix, item_similarity, popularity, shared_state
+        from app.services.cache import recommendation_cache
+        from app.services.concurrency import limiter_stats
+
+        stats = recommendation_cache.stats()
+        yield GaugeMetricFamily("recommendation_cache_entries", "Entries in the local cache tier.", value=stats["entries"])
+        yield CounterMetricFamily("recommendation_cache_hits", "Cache hits on either tier.", value=stats["hits"])
+        yield CounterMetricFamily("recommendation_cache_shared_hits", "Cache hits served by the shared tier.",
+                                  value=stats["shared_hits"])
+        yield CounterMetricFamily("recommendation_cache_misses", "Cache misses.", value=stats["misses"])
+        yield CounterMetricFamily("recommendation_cache_evictions", "LRU evictions from the local tier.",
+                                  value=stats["evictions"])
+        yield GaugeMetricFamily("recommendation_cache_hit_ratio", "Hits over lookups since start.", value=stats["hit_ratio"])
+        yield CounterMetricFamily("recommendation_cache_coalesced", "Misses that joined an identical in-flight computation.",
+                                  value=stats["coalesced"])
+
+        running = GaugeMetricFamily("recommendation_strategy_running", "Uncached computations holding a slot.", labels=["strategy"])
+        queued = GaugeMetricFamily("recommendation_strategy_queued", "Uncached computations waiting for a slot.", labels=["strategy"])
+        for strategy, (active, waiting) in limiter_stats().items():
+            running.add_metric([strategy], active)
+            queued.add_metric([strategy], waiting)
+        yield running
+        yield queued
+
+        versions = GaugeMetricFamily(
+            "recommendation_model_info", "Loaded model and index versions; the value is always 1.", labels=["model", "version"]
+        )
+        models = {
+            "interaction_matrix": getattr(interaction_matrix._interaction_matrix, "version", None),
+            "item_neighbours": getattr(item_similarity._item_index, "matrix_version", None),
+            "content": getattr(content._content_index, "version", None),
+            "popularity": getattr(popularity.get_popularity_index(), "version", None),
+            "tfrs": getattr(embeddings.get_active_retriever(), "version", None),
+            "shared_state": getattr(shared_state.get_shared_state(), "version", None),
+        }
+        for model, version in models.items():
+            if version is not None:
+                versions.add_metric([model, str(version)], 1)
+        yield versions
+
+
+REGISTRY.register(ServiceStateCollector())
+
+
+def render_metrics():
+    """Return the (payload, content type) of the Prometheus text exposition."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
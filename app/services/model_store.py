@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.embeddings import EmbeddingRetriever, ivf_index_from_arrays, sorted_lookup
+from app.services.retrieval_index import IVFIndex
+
+# Layout of one versioned artifact directory:
+#   <root>/<version>/manifest.json
+#   <root>/<version>/{user,item}_{vocabulary,embeddings}.npy
+#   <root>/<version>/user_lookup_{keys,positions}.npy
+#   <root>/<version>/ivf_*.npy            (only when trained with an IVF index)
+#   <root>/LATEST                         (name of the newest complete version)
+MANIFEST_FILE = "manifest.json"
+LATEST_FILE = "LATEST"
+IVF_PREFIX = "ivf_"
+
+
+def save_embedding_artifact(
+    root: str,
+    user_vocabulary,
+    user_embeddings: np.ndarray,
+    item_vocabulary,
+    item_embeddings: np.ndarray,
+    index=None,
+    metadata: dict = None,
+) -> str:
+    """Write a new artifact version and point LATEST at it; returns the version name.
+
+    Files are written into a temporary directory that is renamed into place,
+    so readers never observe a half-written version.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    suffix = 0
+    while os.path.exists(os.path.join(root, version if not suffix else f"{version}-{suffix}")):
+        suffix += 1
+    version = version if not suffix else f"{version}-{suffix}"
+
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+    try:
+        user_vocabulary = np.asarray([str(user_id) for user_id in user_vocabulary])
+        item_vocabulary = np.asarray([str(item_id) for item_id in item_vocabulary])
+        lookup_keys, lookup_positions = sorted_lookup(user_vocabulary)
+        arrays = {
+            "user_vocabulary": user_vocabulary,
+            "item_vocabulary": item_vocabulary,
+            "user_embeddings": np.asarray(user_embeddings, dtype=np.float32),
+            "item_embeddings": np.asarray(item_embeddings, dtype=np.float32),
+            "user_lookup_keys": lookup_keys,
+            "user_lookup_positions": lookup_positions,
+        }
+        if isinstance(index, IVFIndex):
+            arrays.update({f"{IVF_PREFIX}{name}": array for name, array in index.to_arrays().items()})
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+
+        manifest = {
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "num_users": len(user_vocabulary) - 1,
+            "num_items": len(item_vocabulary) - 1,
+            "embedding_dimension": int(arrays["item_embeddings"].shape[1]),
+            "index": "ivf" if isinstance(index, IVFIndex) else "brute_force",
+            "files": sorted(f"{name}.npy" for name in arrays),
+            **(metadata or {}),
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+        os.rename(staging, os.path.join(root, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_atomic(os.path.join(root, LATEST_FILE), version)
+    logging.info(f"Saved embedding artifact {version} to {root}.")
+    return version
+
+
+def _write_atomic(path: str, content: str):
+    staging = f"{path}.tmp"
+    with open(staging, "w") as handle:
+        handle.write(content)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(staging, path)
+
+
+def list_versions(root: str):
+    """Complete artifact versions under ``root``, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+def latest_version(root: str):
+    try:
+        with open(os.path.join(root, LATEST_FILE)) as handle:
+            version = handle.read().strip()
+    except FileNotFoundError:
+        versions = list_versions(root)
+        return versions[-1] if versions else None
+    return version or None
+
+
+def load_embedding_artifact(root: str, version: str = None, mmap: bool = True) -> EmbeddingRetriever:
+    """Load an artifact version (default: LATEST) as a ready-to-serve retriever.
+
+    Arrays are memory-mapped read-only, so every worker on the host shares the
+    same page-cache pages and loading costs no more than opening the files.
+    """
+    version = version or latest_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No embedding artifacts found in {root}")
+    path = os.path.join(root, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    mmap_mode = "r" if mmap else None
+    arrays = {
+        file_name[:-len(".npy")]: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode)
+        for file_name in manifest["files"]
+    }
+
+    index = None
+    if manifest["index"] == "ivf" and settings.TFRS_INDEX == "ivf":
+        index = ivf_index_from_arrays(
+            arrays["item_vocabulary"],
+            {name[len(IVF_PREFIX):]: array for name, array in arrays.items() if name.startswith(IVF_PREFIX)},
+        )
+
+    retriever = EmbeddingRetriever(
+        user_vocabulary=arrays["user_vocabulary"],
+        user_embeddings=arrays["user_embeddings"],
+        item_vocabulary=arrays["item_vocabulary"],
+        item_embeddings=arrays["item_embeddings"],
+        index=index,
+        user_lookup=(arrays["user_lookup_keys"], arrays["user_lookup_positions"]),
+        version=version,
+    )
+    retriever.manifest = manifest
+    return retriever
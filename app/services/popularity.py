@@ -0,0 +1,266 @@
+import logging
+import math
+import threading
+import time
+from datetime import timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud.interactions import stream_interaction_events
+from app.crud.product import get_product_vendors
+from app.services.interaction_matrix import INTERACTION_WEIGHTS, DEFAULT_INTERACTION_WEIGHT
+from app.services.ranking import top_k_indices
+
+# Rebase the decay reference before exp() of an event's offset grows past this
+MAX_DECAY_EXPONENT = 50.0
+EMPTY = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
+def _epoch_seconds(timestamp) -> float:
+    if timestamp is None:
+        return time.time()
+    # SQLite hands back naive datetimes; they are stored in UTC
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class PopularityRankings:
+    """Precomputed top-K arrays: products overall, products per vendor and vendors overall."""
+
+    def __init__(self, product_ids, scores, vendor_products, vendor_ids, vendor_scores, computed_at: float):
+        self.product_ids = product_ids
+        self.scores = scores
+        self.vendor_products = vendor_products
+        self.vendor_ids = vendor_ids
+        self.vendor_scores = vendor_scores
+        self.computed_at = computed_at
+
+
+def _slice(product_ids, scores, limit: int, offset: int, exclude):
+    if exclude is None or not len(exclude):
+        return product_ids[offset:offset + limit], scores[offset:offset + limit]
+    # Over-fetch by the number of excluded ids, so this stays O(K + len(exclude))
+    window = offset + limit + len(exclude)
+    keep = ~np.isin(product_ids[:window], exclude)
+    return product_ids[:window][keep][offset:offset + limit], scores[:window][keep][offset:offset + limit]
+
+
+class PopularityIndex:
+    """Exponentially time-decayed popularity counters per product.
+
+    Every event adds ``type weight * interaction_value * exp(rate * (t - t0))``
+    to its product, where ``t0`` is a fixed reference time. Since every
+    counter shares the same ``exp(-rate * (now - t0))`` factor, ranking never
+    needs to touch old counters: applying new events is O(events) and the
+    decay is applied once, vectorised, when the rankings are recomputed.
+    ``compute_rankings`` turns the counters into compact top-K arrays (global,
+    per-vendor and vendors overall), so serving a request is an O(K) slice.
+
+    Refreshes re-read ``id_overlap`` event ids below ``last_event_id``, where
+    transactions that committed late can still add events; the ids applied in
+    that window are remembered so no event is counted twice.
+    """
+
+    def __init__(self, half_life_seconds: float = None, top_k: int = None, id_overlap: int = None):
+        half_life_seconds = half_life_seconds or settings.POPULARITY_HALF_LIFE_HOURS * 3600
+        self.decay_rate = math.log(2) / half_life_seconds
+        self.top_k = top_k or settings.POPULARITY_TOP_K
+        self.reference_time = None
+        self.last_event_id = 0
+        self.id_overlap = id_overlap if id_overlap is not None else settings.INTERACTION_ID_OVERLAP
+        self._applied_ids = set()
+        self._positions = {}
+        self._product_ids = np.empty(0, dtype=np.int64)
+        self._vendor_ids = np.empty(0, dtype=np.int64)
+        self._counters = np.empty(0, dtype=np.float64)
+        self._lock = threading.Lock()
+        self.rankings = PopularityRankings(*EMPTY, {}, *EMPTY, computed_at=time.time())
+        self.version = 0
+
+    @classmethod
+    def from_rankings(cls, rankings: PopularityRankings, version: int) -> "PopularityIndex":
+        """A serving-only index around rankings computed by another process; it has no counters to refresh."""
+        index = cls()
+        index.rankings = rankings
+        index.version = version
+        return index
+
+    def _grow(self, product_ids):
+        new_ids = [product_id for product_id in dict.fromkeys(product_ids.tolist()) if product_id not in self._positions]
+        if not new_ids:
+            return
+        for offset, product_id in enumerate(new_ids):
+            self._positions[product_id] = len(self._product_ids) + offset
+        self._product_ids = np.concatenate([self._product_ids, np.asarray(new_ids, dtype=np.int64)])
+        self._vendor_ids = np.concatenate([self._vendor_ids, np.full(len(new_ids), -1, dtype=np.int64)])
+        self._counters = np.concatenate([self._counters, np.zeros(len(new_ids), dtype=np.float64)])
+
+    def add_events(self, product_ids, weights, timestamps, last_event_id: int = None) -> None:
+        """Apply events given as parallel arrays of product ids, weights and epoch seconds."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(product_ids):
+            return
+        weights = np.asarray(weights, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        with self._lock:
+            self._grow(product_ids)
+            if self.reference_time is None:
+                self.reference_time = float(timestamps.min())
+            newest = float(timestamps.max())
+            if self.decay_rate * (newest - self.reference_time) > MAX_DECAY_EXPONENT:
+                self._counters *= math.exp(-self.decay_rate * (newest - self.reference_time))
+                self.reference_time = newest
+            positions = np.fromiter((self._positions[product_id] for product_id in product_ids.tolist()),
+                                    dtype=np.int64, count=len(product_ids))
+            np.add.at(self._counters, positions, weights * np.exp(self.decay_rate * (timestamps - self.reference_time)))
+            if last_event_id is not None:
+                self.last_event_id = max(self.last_event_id, int(last_event_id))
+
+    @property
+    def resume_after(self) -> int:
+        """The event id refreshes read from: the high-water mark minus the overlap window."""
+        return max(0, self.last_event_id - self.id_overlap)
+
+    def add_rows(self, rows) -> int:
+        """Apply (id, product_id, interaction_type, interaction_value, created_at) rows, skipping ones already applied.
+
+        Returns the number of rows applied.
+        """
+        rows = [row for row in rows if row[0] not in self._applied_ids]
+        if not rows:
+            return 0
+        event_ids, product_ids, interaction_types, interaction_values, created_at = zip(*rows)
+        weights = np.array(
+            [INTERACTION_WEIGHTS.get(interaction_type, DEFAULT_INTERACTION_WEIGHT) for interaction_type in interaction_types]
+        ) * np.asarray(interaction_values, dtype=np.float64)
+        self.add_events(product_ids, weights, [_epoch_seconds(timestamp) for timestamp in created_at], max(event_ids))
+        # Only ids a later refresh re-reads need remembering
+        self._applied_ids.update(event_ids)
+        self._applied_ids = {event_id for event_id in self._applied_ids if event_id > self.resume_after}
+        return len(rows)
+
+    def products_without_vendor(self) -> np.ndarray:
+        return self._product_ids[self._vendor_ids < 0]
+
+    def set_vendors(self, vendor_rows) -> None:
+        """Record (product id, vendor id) pairs used for the per-vendor rankings."""
+        with self._lock:
+            for product_id, vendor_id in vendor_rows:
+                position = self._positions.get(product_id)
+                if position is not None and vendor_id is not None:
+                    self._vendor_ids[position] = vendor_id
+
+    def decayed_counts(self, now: float = None) -> np.ndarray:
+        """Current decayed count of every product, in internal position order."""
+        if self.reference_time is None:
+            return np.zeros(len(self._counters))
+        now = time.time() if now is None else now
+        return self._counters * math.exp(-self.decay_rate * (now - self.reference_time))
+
+    def compute_rankings(self, now: float = None) -> PopularityRankings:
+        """Recompute the top-K arrays from the counters and swap them in."""
+        with self._lock:
+            now = time.time() if now is None else now
+            counts = self.decayed_counts(now).astype(np.float32)
+            product_ids, vendor_ids = self._product_ids, self._vendor_ids.copy()
+
+        top = top_k_indices(counts, self.top_k)
+        top = top[counts[top] > 0]
+
+        # Sort by (vendor, -count) once, then cut each vendor's run to top_k
+        vendor_products = {}
+        with_vendor = np.flatnonzero((vendor_ids >= 0) & (counts > 0))
+        if len(with_vendor):
+            order = with_vendor[np.lexsort((-counts[with_vendor], vendor_ids[with_vendor]))]
+            vendors, starts = np.unique(vendor_ids[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            for vendor_id, start, end in zip(vendors.tolist(), starts, ends):
+                run = order[start:min(end, start + self.top_k)]
+                vendor_products[vendor_id] = (product_ids[run], counts[run])
+
+        unique_vendors, inverse = np.unique(vendor_ids[with_vendor], return_inverse=True)
+        vendor_totals = np.bincount(inverse, weights=counts[with_vendor]).astype(np.float32)
+        top_vendors = top_k_indices(vendor_totals, self.top_k)
+
+        rankings = PopularityRankings(
+            product_ids[top], counts[top], vendor_products,
+            unique_vendors[top_vendors], vendor_totals[top_vendors], computed_at=now,
+        )
+        self.rankings = rankings
+        self.version += 1
+        return rankings
+
+    def top_products(self, limit: int, offset: int = 0, vendor_id: int = None, exclude=None):
+        """Most popular (product ids, decayed counts), optionally for one vendor and skipping ``exclude``."""
+        rankings = self.rankings
+        if vendor_id is None:
+            return _slice(rankings.product_ids, rankings.scores, limit, offset, exclude)
+        product_ids, scores = rankings.vendor_products.get(vendor_id, EMPTY)
+        return _slice(product_ids, scores, limit, offset, exclude)
+
+    def top_vendors(self, limit: int, offset: int = 0):
+        rankings = self.rankings
+        return rankings.vendor_ids[offset:offset + limit], rankings.vendor_scores[offset:offset + limit]
+
+
+def refresh_popularity_index(index: PopularityIndex, db: Session, chunk_size: int = 50000) -> PopularityIndex:
+    """Apply interactions stored since the last refresh, fill in vendors and recompute the rankings."""
+    started = time.perf_counter()
+    applied = 0
+    for rows in stream_interaction_events(db, index.resume_after, chunk_size):
+        applied += index.add_rows(rows)
+    missing = index.products_without_vendor()
+    if len(missing):
+        index.set_vendors(get_product_vendors(db, missing.tolist()))
+    index.compute_rankings()
+    logging.info(f"Refreshed popularity with {applied} new interactions in {time.perf_counter() - started:.2f}s.")
+    return index
+
+
+_popularity_index = None
+_popularity_lock = threading.Lock()
+
+
+def get_popularity_index():
+    """The process-wide popularity index, or None until it has been built."""
+    return _popularity_index
+
+
+def set_popularity_index(index: PopularityIndex) -> None:
+    global _popularity_index
+    with _popularity_lock:
+        _popularity_index = index
+
+
+def build_popularity_index(db: Session) -> PopularityIndex:
+    global _popularity_index
+    with _popularity_lock:
+        if _popularity_index is None:
+            _popularity_index = refresh_popularity_index(PopularityIndex(), db)
+    return _popularity_index
+
+
+def start_popularity_refresher(session_factory, interval: float = None) -> threading.Thread:
+    """Periodically apply new interactions to the popularity index in a daemon thread."""
+    interval = interval if interval is not None else settings.POPULARITY_REFRESH_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            db = session_factory()
+            try:
+                if _popularity_index is None:
+                    build_popularity_index(db)
+                else:
+                    refresh_popularity_index(_popularity_index, db)
+            except Exception:
+                logging.exception("Failed to refresh popularity rankings.")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run, name="popularity-refresher", daemon=True)
+    thread.start()
+    return thread
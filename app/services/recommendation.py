@@ -1,90 +1,291 @@
+import asyncio
+import logging
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.crud.recommendation import get_user_interactions
-from app.crud.product import get_products_by_ids
-from app.models.product import ProductModel
-from app.models.recommendation import UserInteractionModel
-from app.models.vendor import VendorModel
+from app.config import settings
+from app.crud.product import get_products_by_ids, get_products_by_ids_async
+from app.crud.recommendation import get_user_history, get_user_history_async
+from app.crud.vendor import get_vendors_by_ids, get_vendors_by_ids_async
+from app.services.content import ContentIndex, current_content_index, get_content_index
+from app.services.embeddings import get_active_retriever
+from app.services.hybrid import HybridContext, get_hybrid_recommender
+from app.services.interaction_matrix import (
+    InteractionMatrix,
+    current_interaction_matrix,
+    get_interaction_matrix,
+    interaction_weight,
+)
+from app.services.item_similarity import current_item_neighbour_index, get_item_neighbour_index
+from app.services.materialized import lookup_materialized
+from app.services.metrics import record_degraded, timed_stage
+from app.services.popularity import EMPTY, get_popularity_index
+from app.services.reranking import Candidates, RerankRequest, get_product_attributes_async
+from app.services.strategies import StrategyNotReady
+from app.services.user_similarity import score_user_neighbours
+from app.services.vendor_affinity import current_vendor_affinity_index, user_vendor_affinity_query
+
+
+def _in_order(rows, product_ids):
+    products = {product.id: product for product in rows}
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+def _products_in_order(db: Session, product_ids):
+    """Fetch products by id, preserving the order of ``product_ids``."""
+    product_ids = [int(product_id) for product_id in product_ids]
+    if not product_ids:
+        return []
+    return _in_order(get_products_by_ids(db, product_ids), product_ids)
+
+
+async def _products_in_order_async(db: AsyncSession, product_ids):
+    product_ids = [int(product_id) for product_id in product_ids]
+    if not product_ids:
+        return []
+    return _in_order(await get_products_by_ids_async(db, product_ids), product_ids)
+
+
+def _loaded(structure, strategy: str):
+    """A structure warm-up built; requests never build one, or wait for the warm-up thread building it."""
+    if structure is None:
+        raise StrategyNotReady(strategy)
+    return structure
+
+
+# Scoring works on the in-memory structures only, so sync and async callers share it.
+# Users without any history fall back to the precomputed popularity ranking.
+
+@timed_stage("scoring", "popular")
+def score_products_popular(limit: int, offset: int = 0, vendor_id: int = None):
+    """Most popular products right now as (product ids, decayed counts)."""
+    index = get_popularity_index()
+    if index is None:
+        return EMPTY
+    return index.top_products(limit, offset, vendor_id=vendor_id)
+
+@timed_stage("scoring", "user_based")
+def score_products_user_based(user_id: int, matrix: InteractionMatrix, limit: int, offset: int = 0):
+    """Rank unseen products by what the user's nearest neighbours interacted with."""
+    if not len(matrix.user_items(user_id)[0]):
+        return score_products_popular(limit, offset)
+    return score_user_neighbours(matrix, user_id, settings.USER_KNN_NEIGHBOURS, limit, offset)
+
+@timed_stage("scoring", "item_based")
+def score_products_item_based(user_id: int, matrix: InteractionMatrix, limit: int, offset: int = 0):
+    """Rank unseen products by their similarity to the user's items as (product ids, scores)."""
+    items, weights = matrix.user_items(user_id)
+    if not len(items):
+        return score_products_popular(limit, offset)
+    index = _loaded(current_item_neighbour_index(matrix), "item_based")
+    # Items newer than the index have no neighbour lists until it is rebuilt; users with only those are cold too
+    if not (items < len(index.neighbours)).any():
+        return score_products_popular(limit, offset)
+    return index.recommend(items, weights, limit, offset)
+
+@timed_stage("scoring", "content")
+def score_products_content_based(user_id: int, matrix: InteractionMatrix, index: ContentIndex, limit: int, offset: int = 0):
+    """Rank unseen products by similarity to the weighted mean features of the user's items."""
+    items, weights = matrix.user_items(user_id)
+    if not len(items):
+        return score_products_popular(limit, offset)
+    return index.recommend(matrix.item_ids[items], weights, limit, offset)
+
+def _materialized_or(strategy: str, user_id: int, limit: int, offset: int, score):
+    """The precomputed page when the materialized store can serve it, otherwise ``score()`` online."""
+    scored = lookup_materialized(strategy, user_id, limit, offset)
+    return scored if scored is not None else score()
+
+def _ranked_history(rows) -> np.ndarray:
+    """Product ids of (product_id, interaction_type, interaction_value) rows, strongest first, as the matrix ranks them."""
+    weights = {}
+    for product_id, interaction_type, interaction_value in rows:
+        if product_id is not None:
+            weights[product_id] = weights.get(product_id, 0.0) + interaction_weight(interaction_type, interaction_value)
+    return np.asarray(sorted(weights, key=lambda product_id: (-weights[product_id], product_id)), dtype=np.int64)
+
+# History only needs the user's own row: until the matrix is built (strategies
+# still warming up, or user_based disabled) one indexed query answers them instead.
+
+def _user_item_ids(user_id: int, db: Session) -> np.ndarray:
+    matrix = current_interaction_matrix()
+    if matrix is None:
+        return _ranked_history(get_user_history(db, user_id))
+    return matrix.user_item_ids(user_id)
+
+async def _user_item_ids_async(user_id: int, db: AsyncSession) -> np.ndarray:
+    matrix = current_interaction_matrix()
+    if matrix is None:
+        return _ranked_history(await get_user_history_async(db, user_id))
+    return matrix.user_item_ids(user_id)
 
-def recommend_products(user_id: int, db: Session):
-    # Fetch user interaction data
-    user_data = db.query(UserInteractionModel).filter(UserInteractionModel.user_id == user_id).all()
+def _history_or_popular(product_ids: np.ndarray, limit: int, offset: int = 0):
+    if not len(product_ids):
+        product_ids, _ = score_products_popular(limit, offset)
+        return product_ids
+    return product_ids[offset:offset + limit]
 
-    # Implement a basic recommendation algorithm (e.g., collaborative filtering)
-    # For demonstration purposes, let's return random products
-    recommended_product_ids = [interaction.product_id for interaction in user_data]
+def _popular_vendor_ids(limit: int, offset: int = 0):
+    index = get_popularity_index()
+    if index is None:
+        return []
+    vendor_ids, _ = index.top_vendors(limit, offset)
+    return [int(vendor_id) for vendor_id in vendor_ids]
 
-    # Fetch recommended products from the database
-    recommended_products = db.query(ProductModel).filter(ProductModel.id.in_(recommended_product_ids)).all()
-    return recommended_products
 
-def recommend_products_user_based(user_id: int, db: Session):
-    # Fetch user interaction data
-    user_data = db.query(UserInteractionModel).filter(UserInteractionModel.user_id == user_id).all()
+def recommend_products(user_id: int, db: Session, limit: int = 20, offset: int = 0):
+    # Fetch the products the user interacted with, strongest interaction first
+    recommended_product_ids = _history_or_popular(_user_item_ids(user_id, db), limit, offset)
 
-    # Find similar users based on interaction patterns
-    similar_users = db.query(UserInteractionModel.user_id).filter(UserInteractionModel.product_id.in_(
-        [interaction.product_id for interaction in user_data])).distinct()
+    return _products_in_order(db, recommended_product_ids)
 
-    # Recommend products that these similar users have interacted with
-    recommended_product_ids = db.query(UserInteractionModel.product_id).filter(
-        UserInteractionModel.user_id.in_(similar_users)).distinct()
+def recommend_products_user_based(user_id: int, db: Session, limit: int = 20, offset: int = 0):
+    # Score candidates by the similarity-weighted interactions of the top-N similar users
+    matrix = get_interaction_matrix(db)
+    product_ids, _ = _materialized_or(
+        "user_based", user_id, limit, offset, lambda: score_products_user_based(user_id, matrix, limit, offset)
+    )
+    return _products_in_order(db, product_ids)
 
-    recommended_products = db.query(ProductModel).filter(
-        ProductModel.id.in_(recommended_product_ids)).all()
+def recommend_products_item_based(user_id: int, db: Session, limit: int = 20, offset: int = 0):
+    # Merge the precomputed neighbour lists of the user's items; sync callers run off the event loop and may build them
+    matrix = get_interaction_matrix(db)
+    get_item_neighbour_index(matrix)
+    product_ids, _ = _materialized_or(
+        "item_based", user_id, limit, offset, lambda: score_products_item_based(user_id, matrix, limit, offset)
+    )
+    return _products_in_order(db, product_ids)
 
-    return recommended_products
+def recommend_products_content_based(user_id: int, db: Session, limit: int = 20, offset: int = 0):
+    # Score every product against the user's feature profile
+    matrix, index = get_interaction_matrix(db), get_content_index(db)
+    product_ids, _ = _materialized_or(
+        "content", user_id, limit, offset, lambda: score_products_content_based(user_id, matrix, index, limit, offset)
+    )
+    return _products_in_order(db, product_ids)
 
-def recommend_products_item_based(user_id: int, db: Session):
-    # Fetch user interaction data
-    user_data = db.query(UserInteractionModel).filter(UserInteractionModel.user_id == user_id).all()
+def recommend_products_hybrid(user_id: int, db: Session, limit: int = 20, offset: int = 0, method: str = None):
+    """Fuse every configured strategy's ranking; returns (products, names of strategies that were skipped)."""
+    context = HybridContext(get_interaction_matrix(db), get_content_index(db), get_active_retriever())
+    (product_ids, _), degraded = get_hybrid_recommender().recommend(user_id, context, limit, offset, method)
+    return _products_in_order(db, product_ids), degraded
 
-    # Find products that similar users have interacted with
-    similar_product_ids = db.query(UserInteractionModel.product_id).filter(UserInteractionModel.user_id.in_(
-        db.query(UserInteractionModel.user_id).filter(UserInteractionModel.product_id.in_(
-            [interaction.product_id for interaction in user_data])).distinct())).distinct()
+def recommend_products_popular(db: Session, limit: int = 20, offset: int = 0, vendor_id: int = None):
+    product_ids, _ = score_products_popular(limit, offset, vendor_id)
+    return _products_in_order(db, product_ids)
 
-    recommended_products = db.query(ProductModel).filter(
-        ProductModel.id.in_(similar_product_ids)).all()
+def _vendor_recommendation_ids(user_id: int, limit: int, offset: int, new_only: bool):
+    """Vendor ids from the affinity index, popular vendors for users it knows nothing about; None until it is built."""
+    index = current_vendor_affinity_index()
+    if index is None:
+        return None
+    vendor_ids, _ = index.recommend(user_id, limit, offset, new_only)
+    if not len(vendor_ids) and index.user_row(user_id) is None:
+        return _popular_vendor_ids(limit, offset)
+    return [int(vendor_id) for vendor_id in vendor_ids]
 
-    return recommended_products
+def recommend_vendors(user_id: int, db: Session, limit: int = 20, offset: int = 0, new_only: bool = False):
+    """Vendors ranked by the user's aggregated affinity, similar users' vendors and rating."""
+    vendor_ids = _vendor_recommendation_ids(user_id, limit, offset, new_only)
+    if vendor_ids is None:
+        return db.execute(user_vendor_affinity_query(user_id, limit, offset, new_only)).all()
+    return _in_order(get_vendors_by_ids(db, vendor_ids), vendor_ids) if vendor_ids else []
 
-def recommend_products_content_based(user_id: int, db: Session):
-    # Fetch user interaction data
-    user_data = db.query(UserInteractionModel).filter(UserInteractionModel.user_id == user_id).all()
+async def recommend_products_async(user_id: int, db: AsyncSession, limit: int = 20, offset: int = 0):
+    return await _products_in_order_async(db, _history_or_popular(await _user_item_ids_async(user_id, db), limit, offset))
 
-    # Gather features of the interacted products
-    interacted_products = db.query(ProductModel).filter(
-        ProductModel.id.in_([interaction.product_id for interaction in user_data])).all()
+async def _candidates_within_budget(strategy: str, generate, n_candidates: int):
+    """Candidate stage: ``generate(n)`` in a worker thread, bounded by RERANK_CANDIDATE_BUDGET_MS.
 
-    # For demonstration, let's match products by the same category and price range
-    category = interacted_products[0].description
-    price = interacted_products[0].price
+    A strategy that overruns is reported as degraded and replaced by the
+    popularity ranking; like the hybrid strategies, it is not interrupted.
+    """
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(generate, n_candidates), settings.RERANK_CANDIDATE_BUDGET_MS / 1000
+        )
+    except asyncio.TimeoutError:
+        record_degraded([strategy])
+        logging.warning(f"Candidate generation for {strategy} exceeded its budget; using popular products.")
+        return score_products_popular(n_candidates)
 
-    recommended_products = db.query(ProductModel).filter(
-        ProductModel.description == category,
-        ProductModel.price.between(price * 0.8, price * 1.2)
-    ).all()
+async def _rerank(db: AsyncSession, rerank: RerankRequest, scored, limit: int, offset: int, seen=None):
+    """Re-ranking stage over the generated (product ids, scores); ``seen()`` gives the user's products to exclude."""
+    attributes = await get_product_attributes_async(db)
+    with timed_stage("reranking"):
+        candidates = Candidates.from_scored(*scored, attributes)
+        seen_product_ids = seen() if seen is not None and rerank.exclude_seen else None
+        return rerank.reranker(seen_product_ids).rerank(candidates, limit, offset)
 
-    return recommended_products
+async def _two_stage(strategy: str, db: AsyncSession, rerank, limit: int, offset: int, generate, seen=None):
+    """``generate(limit, offset)`` directly, or as the candidate stage of a re-ranked page when ``rerank`` has constraints.
 
-def recommend_products_hybrid(user_id: int, db: Session):
-    user_based_recommendations = recommend_products_user_based(user_id, db)
-    content_based_recommendations = recommend_products_content_based(user_id, db)
+    Either way the scoring runs in a worker thread, off the event loop.
+    """
+    if rerank is None or not rerank.active:
+        return await asyncio.to_thread(generate, limit, offset)
+    scored = await _candidates_within_budget(
+        strategy, lambda n_candidates: generate(n_candidates, 0), rerank.candidate_count(limit, offset)
+    )
+    return await _rerank(db, rerank, scored, limit, offset, seen)
 
-    # Combine both lists, ensuring no duplicates
-    combined_recommendations = {product.id: product for product in user_based_recommendations + content_based_recommendations}.values()
+async def recommend_products_user_based_async(user_id: int, db: AsyncSession, limit: int = 20, offset: int = 0,
+                                              rerank: RerankRequest = None):
+    matrix = _loaded(current_interaction_matrix(), "user_based")
+    product_ids, _ = await _two_stage(
+        "user_based", db, rerank, limit, offset,
+        lambda n, skip: _materialized_or("user_based", user_id, n, skip, lambda: score_products_user_based(user_id, matrix, n, skip)),
+        seen=lambda: matrix.user_item_ids(user_id),
+    )
+    return await _products_in_order_async(db, product_ids)
 
-    return list(combined_recommendations)
+async def recommend_products_item_based_async(user_id: int, db: AsyncSession, limit: int = 20, offset: int = 0,
+                                              rerank: RerankRequest = None):
+    matrix = _loaded(current_interaction_matrix(), "item_based")
+    product_ids, _ = await _two_stage(
+        "item_based", db, rerank, limit, offset,
+        lambda n, skip: _materialized_or("item_based", user_id, n, skip, lambda: score_products_item_based(user_id, matrix, n, skip)),
+        seen=lambda: matrix.user_item_ids(user_id),
+    )
+    return await _products_in_order_async(db, product_ids)
 
-def recommend_vendors(user_id: int, db: Session):
-    # Fetch user interaction data
-    user_data = db.query(UserInteractionModel).filter(UserInteractionModel.user_id == user_id).all()
+async def recommend_products_content_based_async(user_id: int, db: AsyncSession, limit: int = 20, offset: int = 0,
+                                                 rerank: RerankRequest = None):
+    matrix = _loaded(current_interaction_matrix(), "content")
+    index = _loaded(current_content_index(), "content")
+    product_ids, _ = await _two_stage(
+        "content", db, rerank, limit, offset,
+        lambda n, skip: _materialized_or("content", user_id, n, skip, lambda: score_products_content_based(user_id, matrix, index, n, skip)),
+        seen=lambda: matrix.user_item_ids(user_id),
+    )
+    return await _products_in_order_async(db, product_ids)
 
-    # Recommend vendors based on the user's product interactions
-    recommended_vendor_ids = db.query(ProductModel.vendor_id).filter(
-        ProductModel.id.in_([interaction.product_id for interaction in user_data])).distinct()
+async def recommend_products_hybrid_async(user_id: int, db: AsyncSession, limit: int = 20, offset: int = 0, method: str = None,
+                                          rerank: RerankRequest = None):
+    # Strategies still warming up contribute nothing; the matrix every one of them reads is required
+    context = HybridContext(
+        _loaded(current_interaction_matrix(), "hybrid"), current_content_index(), get_active_retriever()
+    )
+    if rerank is None or not rerank.active:
+        (product_ids, _), degraded = await get_hybrid_recommender().recommend_async(user_id, context, limit, offset, method)
+        return await _products_in_order_async(db, product_ids), degraded
+    # The hybrid recommender enforces its own per-strategy budgets, so it is the candidate stage as is
+    scored, degraded = await get_hybrid_recommender().recommend_async(
+        user_id, context, rerank.candidate_count(limit, offset), 0, method
+    )
+    product_ids, _ = await _rerank(db, rerank, scored, limit, offset, seen=lambda: context.matrix.user_item_ids(user_id))
+    return await _products_in_order_async(db, product_ids), degraded
 
-    recommended_vendors = db.query(VendorModel).filter(
-        VendorModel.id.in_(recommended_vendor_ids)).all()
+async def recommend_products_popular_async(db: AsyncSession, limit: int = 20, offset: int = 0, vendor_id: int = None,
+                                           rerank: RerankRequest = None):
+    product_ids, _ = await _two_stage(
+        "popular", db, rerank, limit, offset, lambda n, skip: score_products_popular(n, skip, vendor_id)
+    )
+    return await _products_in_order_async(db, product_ids)
 
-    return recommended_vendors
\ No newline at end of file
+async def recommend_vendors_async(user_id: int, db: AsyncSession, limit: int = 20, offset: int = 0, new_only: bool = False):
+    vendor_ids = _vendor_recommendation_ids(user_id, limit, offset, new_only)
+    if vendor_ids is None:
+        return (await db.execute(user_vendor_affinity_query(user_id, limit, offset, new_only))).all()
+    return _in_order(await get_vendors_by_ids_async(db, vendor_ids), vendor_ids) if vendor_ids else []
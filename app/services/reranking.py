@@ -0,0 +1,282 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.product import ProductModel
+from app.services.popularity import EMPTY, get_popularity_index
+from app.services.ranking import top_k_indices
+
+
+def _attribute_columns():
+    return select(ProductModel.id, ProductModel.price, ProductModel.vendor_id)
+
+
+class ProductAttributes:
+    """Price and vendor of every product as arrays aligned on the sorted product ids.
+
+    Immutable: ``upsert`` returns a new table, so a re-ranking pass always
+    reads one consistent snapshot without taking a lock.
+    """
+
+    def __init__(self, product_ids: np.ndarray, prices: np.ndarray, vendor_ids: np.ndarray):
+        order = np.argsort(product_ids, kind="stable")
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)[order]
+        self.prices = np.asarray(prices, dtype=np.float64)[order]
+        self.vendor_ids = np.asarray(vendor_ids, dtype=np.int64)[order]
+
+    @classmethod
+    def from_rows(cls, rows) -> "ProductAttributes":
+        """Build from (id, price, vendor_id) rows; missing prices are NaN and missing vendors -1."""
+        rows = list(rows)
+        return cls(
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((np.nan if row[1] is None else row[1] for row in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((-1 if row[2] is None else row[2] for row in rows), dtype=np.int64, count=len(rows)),
+        )
+
+    @classmethod
+    def from_db(cls, db: Session) -> "ProductAttributes":
+        return cls.from_rows(db.execute(_attribute_columns()).all())
+
+    @classmethod
+    async def from_db_async(cls, db) -> "ProductAttributes":
+        return cls.from_rows((await db.execute(_attribute_columns())).all())
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def upsert(self, rows) -> "ProductAttributes":
+        """A copy with (id, price, vendor_id) rows added or replaced."""
+        updates = ProductAttributes.from_rows(rows)
+        keep = ~np.isin(self.product_ids, updates.product_ids)
+        return ProductAttributes(
+            np.concatenate([self.product_ids[keep], updates.product_ids]),
+            np.concatenate([self.prices[keep], updates.prices]),
+            np.concatenate([self.vendor_ids[keep], updates.vendor_ids]),
+        )
+
+    def lookup(self, product_ids: np.ndarray):
+        """(prices, vendor ids) of ``product_ids``; NaN and -1 for products not in the table."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(self.product_ids):
+            return np.full(len(product_ids), np.nan), np.full(len(product_ids), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.product_ids, product_ids), len(self.product_ids) - 1)
+        known = self.product_ids[found] == product_ids
+        return np.where(known, self.prices[found], np.nan), np.where(known, self.vendor_ids[found], -1)
+
+
+class Candidates:
+    """The candidate set of one request: parallel arrays of product ids, relevance scores and attributes."""
+
+    def __init__(self, product_ids: np.ndarray, scores: np.ndarray, prices: np.ndarray, vendor_ids: np.ndarray):
+        self.product_ids = product_ids
+        self.scores = scores
+        self.prices = prices
+        self.vendor_ids = vendor_ids
+
+    @classmethod
+    def from_scored(cls, product_ids, scores, attributes: ProductAttributes) -> "Candidates":
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        return cls(product_ids, np.asarray(scores, dtype=np.float32), *attributes.lookup(product_ids))
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def subset(self, mask: np.ndarray) -> "Candidates":
+        return Candidates(self.product_ids[mask], self.scores[mask], self.prices[mask], self.vendor_ids[mask])
+
+
+# Filters map Candidates to a boolean keep-mask; scorers map them to a float score per candidate
+
+def price_filter(min_price: float = None, max_price: float = None):
+    def keep(candidates: Candidates) -> np.ndarray:
+        # Products without a known price never match a price constraint
+        mask = ~np.isnan(candidates.prices)
+        if min_price is not None:
+            mask &= candidates.prices >= min_price
+        if max_price is not None:
+            mask &= candidates.prices <= max_price
+        return mask
+    return keep
+
+
+def vendor_filter(vendor_ids):
+    allowed = np.asarray(list(vendor_ids), dtype=np.int64)
+    return lambda candidates: np.isin(candidates.vendor_ids, allowed)
+
+
+def exclude_filter(product_ids):
+    excluded = np.asarray(product_ids, dtype=np.int64)
+    return lambda candidates: ~np.isin(candidates.product_ids, excluded)
+
+
+def _relevance_scorer(candidates: Candidates) -> np.ndarray:
+    """The generating strategy's scores scaled to [0, 1]."""
+    top = candidates.scores.max() if len(candidates) else 0.0
+    return candidates.scores / top if top > 0 else np.zeros_like(candidates.scores)
+
+
+def _popularity_scorer(candidates: Candidates) -> np.ndarray:
+    """1 for the most popular product, falling linearly to 0 past the end of the popularity ranking."""
+    index = get_popularity_index()
+    ranked = index.rankings.product_ids if index is not None else EMPTY[0]
+    if not len(ranked):
+        return np.zeros(len(candidates), dtype=np.float32)
+    order = np.argsort(ranked, kind="stable")
+    found = np.minimum(np.searchsorted(ranked[order], candidates.product_ids), len(ranked) - 1)
+    known = ranked[order][found] == candidates.product_ids
+    return np.where(known, 1.0 - order[found] / len(ranked), 0.0).astype(np.float32)
+
+
+# name -> scorer(candidates) returning one score per candidate, combined as configured in RERANK_SCORERS
+SCORERS = {
+    "relevance": _relevance_scorer,
+    "popularity": _popularity_scorer,
+}
+
+
+def register_scorer(name: str, scorer) -> None:
+    SCORERS[name] = scorer
+
+
+def parse_scorer_weights(spec: str) -> dict:
+    """Parse ``"relevance:1,popularity:0.2"`` into {scorer: weight}; a bare name weighs 1."""
+    weights = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = part.partition(":")
+        if name not in SCORERS:
+            raise ValueError(f"Unknown re-ranking scorer {name!r}")
+        weights[name] = float(value) if value else 1.0
+    return weights
+
+
+class ReRanker:
+    """Second stage of the recommendation pipeline: filter, rescore and diversify a candidate set.
+
+    Filters are boolean masks over the candidates' attribute arrays, the
+    final score is the weighted sum of the scorers, and ``diversity`` > 0
+    picks the page by maximal marginal relevance with vendor identity as the
+    similarity: each pick costs later candidates of the same vendor
+    ``diversity`` (score scaled to [0, 1] first), so vendors alternate unless
+    one is clearly more relevant. Every step is vectorised over the
+    candidates; when the MMR loop exceeds ``budget`` seconds, the remaining
+    slots are filled in score order.
+    """
+
+    def __init__(self, filters=(), scorers: dict = None, diversity: float = 0.0, budget: float = None):
+        self.filters = list(filters)
+        self.scorers = scorers if scorers is not None else parse_scorer_weights(settings.RERANK_SCORERS)
+        self.diversity = diversity
+        self.budget = budget if budget is not None else settings.RERANK_BUDGET_MS / 1000
+
+    def score(self, candidates: Candidates) -> np.ndarray:
+        total = np.zeros(len(candidates), dtype=np.float32)
+        for name, weight in self.scorers.items():
+            total += weight * SCORERS[name](candidates)
+        return total
+
+    def rerank(self, candidates: Candidates, limit: int, offset: int = 0):
+        """Return the requested page as (product ids, scores)."""
+        mask = np.ones(len(candidates), dtype=bool)
+        for keep in self.filters:
+            mask &= keep(candidates)
+        candidates = candidates.subset(mask)
+        scores = self.score(candidates)
+        if self.diversity <= 0 or len(candidates) <= 1:
+            top = top_k_indices(scores, limit + offset)[offset:]
+            return candidates.product_ids[top], scores[top]
+        picks = self._mmr(candidates.vendor_ids, scores, min(limit + offset, len(candidates)))[offset:]
+        return candidates.product_ids[picks], scores[picks]
+
+    def _mmr(self, vendor_ids: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+        top = scores.max()
+        relevance = scores / top if top > 0 else scores
+        penalty = np.zeros(len(scores), dtype=np.float32)
+        available = np.ones(len(scores), dtype=bool)
+        picks = []
+        deadline = time.perf_counter() + self.budget
+        while len(picks) < k:
+            if time.perf_counter() > deadline:
+                logging.warning(f"Re-ranking exceeded its {self.budget * 1000:.0f}ms budget; filling by score.")
+                rest = np.flatnonzero(available)
+                picks.extend(rest[np.argsort(-scores[rest], kind="stable")][: k - len(picks)].tolist())
+                break
+            marginal = np.where(available, (1.0 - self.diversity) * relevance - self.diversity * penalty, -np.inf)
+            pick = int(np.argmax(marginal))
+            picks.append(pick)
+            available[pick] = False
+            if vendor_ids[pick] >= 0:
+                penalty[vendor_ids == vendor_ids[pick]] = 1.0
+        return np.asarray(picks, dtype=np.int64)
+
+
+class RerankRequest:
+    """Business constraints of one request, as passed on the recommendation routes' query string."""
+
+    def __init__(self, min_price: float = None, max_price: float = None, vendor_ids=None,
+                 exclude_seen: bool = False, diversity: float = 0.0):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.vendor_ids = sorted(set(vendor_ids)) if vendor_ids else None
+        self.exclude_seen = exclude_seen
+        self.diversity = diversity
+
+    @property
+    def active(self) -> bool:
+        return bool(
+            self.min_price is not None or self.max_price is not None or self.vendor_ids
+            or self.exclude_seen or self.diversity > 0
+        )
+
+    def cache_params(self) -> dict:
+        """Response cache key parameters; empty when the request has no constraints."""
+        if not self.active:
+            return {}
+        return {
+            "min_price": self.min_price, "max_price": self.max_price, "vendor_ids": self.vendor_ids,
+            "exclude_seen": self.exclude_seen, "diversity": self.diversity,
+        }
+
+    def candidate_count(self, limit: int, offset: int = 0) -> int:
+        """Candidates to generate so the page survives filtering."""
+        return max(settings.RERANK_CANDIDATES, (limit + offset) * settings.RERANK_OVERFETCH)
+
+    def reranker(self, seen_product_ids=None) -> ReRanker:
+        filters = []
+        if self.min_price is not None or self.max_price is not None:
+            filters.append(price_filter(self.min_price, self.max_price))
+        if self.vendor_ids:
+            filters.append(vendor_filter(self.vendor_ids))
+        if self.exclude_seen and seen_product_ids is not None and len(seen_product_ids):
+            filters.append(exclude_filter(seen_product_ids))
+        return ReRanker(filters, diversity=self.diversity)
+
+
+_product_attributes = None
+_product_attributes_lock = threading.Lock()
+
+
+async def get_product_attributes_async(db) -> ProductAttributes:
+    """Return the process-wide attribute table, building it on first use."""
+    global _product_attributes
+    if _product_attributes is None:
+        attributes = await ProductAttributes.from_db_async(db)
+        with _product_attributes_lock:
+            if _product_attributes is None:
+                _product_attributes = attributes
+    return _product_attributes
+
+
+def record_product_attributes(rows) -> None:
+    """Apply created or updated products to the attribute table, if it has been built."""
+    global _product_attributes
+    with _product_attributes_lock:
+        if _product_attributes is not None:
+            _product_attributes = _product_attributes.upsert(
+                [(row.id, row.price, row.vendor_id) for row in rows]
+            )
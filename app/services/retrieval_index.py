@@ -0,0 +1,157 @@
+import logging
+import time
+
+import numpy as np
+
+from app.services.ranking import top_k_indices
+
+
+class BruteForceIndex:
+    """Exact maximum inner product search over every item embedding."""
+
+    def __init__(self, item_embeddings: np.ndarray, item_ids: np.ndarray):
+        self.item_embeddings = np.ascontiguousarray(item_embeddings, dtype=np.float32)
+        self.item_ids = np.asarray(item_ids)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def search(self, query: np.ndarray, k: int):
+        """Return the ``k`` best (item ids, scores) for one query vector."""
+        scores = self.item_embeddings @ np.asarray(query, dtype=np.float32)
+        top = top_k_indices(scores, k)
+        return self.item_ids[top], scores[top]
+
+    def search_batch(self, queries: np.ndarray, k: int):
+        """Score many queries with one matrix multiply; returns (n, k) ids and scores."""
+        scores = np.asarray(queries, dtype=np.float32) @ self.item_embeddings.T
+        k = min(k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return self.item_ids[top], np.take_along_axis(top_scores, order, axis=1)
+
+
+class IVFIndex:
+    """Inverted-file index for approximate maximum inner product search.
+
+    Items are clustered with spherical k-means into ``n_lists`` lists. A query
+    scores the centroids, exactly rescores only the items in the ``n_probe``
+    best lists, and returns the top ``k``. Raising ``n_probe`` trades latency
+    for recall; ``n_probe == n_lists`` is exact search.
+    """
+
+    def __init__(
+        self,
+        item_embeddings: np.ndarray,
+        item_ids: np.ndarray,
+        n_lists: int = 0,
+        n_probe: int = 8,
+        n_iter: int = 10,
+        sample_size: int = 100000,
+        seed: int = 0,
+    ):
+        started = time.perf_counter()
+        self.item_embeddings = np.ascontiguousarray(item_embeddings, dtype=np.float32)
+        self.item_ids = np.asarray(item_ids)
+        n_items = len(self.item_embeddings)
+        self.n_lists = max(1, min(n_items, n_lists or int(np.sqrt(n_items))))
+        self.n_probe = n_probe
+
+        rng = np.random.default_rng(seed)
+        unit = self.item_embeddings / np.maximum(np.linalg.norm(self.item_embeddings, axis=1, keepdims=True), 1e-12)
+        sample = unit[rng.choice(n_items, size=min(n_items, sample_size), replace=False)] if n_items else unit
+        self.centroids = self._spherical_kmeans(sample, self.n_lists, n_iter, rng)
+
+        # Store items grouped by list so each list is one contiguous slice
+        assignments = self._assign(unit)
+        self.order = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(self.n_lists + 1))
+        self.list_embeddings = self.item_embeddings[self.order]
+        logging.info(
+            f"Built IVF index over {n_items} items with {self.n_lists} lists "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
+
+    @classmethod
+    def from_arrays(cls, item_ids, centroids, order, offsets, list_embeddings, n_probe: int = 8) -> "IVFIndex":
+        """Rebuild an index from the arrays returned by ``to_arrays`` (e.g. memory-mapped)."""
+        index = cls.__new__(cls)
+        index.item_ids = np.asarray(item_ids)
+        index.centroids = centroids
+        index.order = order
+        index.offsets = offsets
+        index.list_embeddings = list_embeddings
+        index.item_embeddings = None
+        index.n_lists = len(centroids)
+        index.n_probe = n_probe
+        return index
+
+    def to_arrays(self) -> dict:
+        return {
+            "centroids": self.centroids,
+            "order": self.order,
+            "offsets": self.offsets,
+            "list_embeddings": self.list_embeddings,
+        }
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def _assign(self, vectors: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ self.centroids.T, axis=1)
+        return assignments
+
+    @staticmethod
+    def _spherical_kmeans(sample: np.ndarray, n_lists: int, n_iter: int, rng) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        return centroids.astype(np.float32)
+
+    def _candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        lists = top_k_indices(self.centroids @ query, min(n_probe, self.n_lists))
+        return np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+
+    def search(self, query: np.ndarray, k: int, n_probe: int = None):
+        """Return approximately the ``k`` best (item ids, scores) for one query vector."""
+        query = np.asarray(query, dtype=np.float32)
+        positions = self._candidates(query, n_probe or self.n_probe)
+        scores = self.list_embeddings[positions] @ query
+        top = top_k_indices(scores, k)
+        return self.item_ids[self.order[positions[top]]], scores[top]
+
+    def search_batch(self, queries: np.ndarray, k: int, n_probe: int = None):
+        """Search each query independently; short results are padded with -1 / -inf."""
+        queries = np.asarray(queries, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for row, query in enumerate(queries):
+            found_ids, found_scores = self.search(query, k, n_probe)
+            ids[row, :len(found_ids)] = found_ids
+            scores[row, :len(found_scores)] = found_scores
+        return ids, scores
+
+
+INDEX_TYPES = {
+    "brute_force": BruteForceIndex,
+    "ivf": IVFIndex,
+}
+
+
+def build_retrieval_index(kind: str, item_embeddings: np.ndarray, item_ids: np.ndarray, **params):
+    """Build a retrieval index by name (see ``INDEX_TYPES``)."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown retrieval index type: {kind}")
+    return INDEX_TYPES[kind](item_embeddings, item_ids, **params)
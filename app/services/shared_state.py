@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.config import settings
+from app.services.content import ContentIndex, set_content_index
+from app.services.embeddings import get_active_retriever, set_active_retriever, sorted_lookup
+from app.services.interaction_matrix import InteractionMatrix, set_interaction_matrix
+from app.services.item_similarity import ItemNeighbourIndex, set_item_neighbour_index
+from app.services.model_store import LATEST_FILE, MANIFEST_FILE, _write_atomic, latest_version, list_versions, load_embedding_artifact
+from app.services.popularity import PopularityIndex, PopularityRankings, set_popularity_index
+
+# Layout of one snapshot published by app.jobs.publish_state:
+#   <root>/<version>/manifest.json
+#   <root>/<version>/matrix_*.npy       (CSR and CSC arrays, row/column ids and lookups, user norms)
+#   <root>/<version>/neighbours_*.npy   (item neighbour columns and similarities)
+#   <root>/<version>/content_*.npy      (CSR feature matrix, product ids and lookup)
+#   <root>/<version>/popularity_*.npy   (global and vendor rankings; per-vendor lists flattened with offsets)
+#   <root>/LATEST
+# Every array is written once by the coordinator and memory-mapped read-only by
+# the workers, so the page cache holds a single copy however many workers run.
+
+
+class SharedState:
+    """One published snapshot of the serving structures, attached zero-copy."""
+
+    def __init__(self, matrix: InteractionMatrix, item_index: ItemNeighbourIndex, content_index: ContentIndex,
+                 popularity_index: PopularityIndex, manifest: dict):
+        self.matrix = matrix
+        self.item_index = item_index
+        self.content_index = content_index
+        self.popularity_index = popularity_index
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.generation = manifest["generation"]
+        self.tfrs_version = manifest.get("tfrs_version")
+
+
+def _sparse_arrays(prefix: str, matrix) -> dict:
+    return {f"{prefix}_data": matrix.data, f"{prefix}_indices": matrix.indices, f"{prefix}_indptr": matrix.indptr}
+
+
+def _lookup_arrays(prefix: str, ids) -> dict:
+    keys, positions = sorted_lookup(np.asarray(ids, dtype=np.int64))
+    return {f"{prefix}_keys": keys, f"{prefix}_positions": positions}
+
+
+def state_arrays(matrix: InteractionMatrix, item_index: ItemNeighbourIndex, content_index: ContentIndex,
+                 popularity_index: PopularityIndex) -> dict:
+    """Flatten the serving structures into named arrays."""
+    csr = matrix.csr
+    arrays = {
+        **_sparse_arrays("matrix", csr),
+        **_sparse_arrays("matrix_csc", matrix.csc),
+        "matrix_user_ids": matrix.user_ids,
+        "matrix_item_ids": matrix.item_ids,
+        **_lookup_arrays("matrix_user_lookup", matrix.user_ids),
+        **_lookup_arrays("matrix_item_lookup", matrix.item_ids),
+        "matrix_user_norms": matrix.user_norms,
+        "neighbours_item_ids": item_index.item_ids,
+        "neighbours_neighbours": item_index.neighbours,
+        "neighbours_scores": item_index.scores,
+    }
+
+    features, product_ids = content_index.snapshot()
+    arrays.update(_sparse_arrays("content", features))
+    arrays["content_product_ids"] = product_ids
+    arrays.update(_lookup_arrays("content_lookup", product_ids))
+
+    rankings = popularity_index.rankings
+    vendors = sorted(rankings.vendor_products)
+    lengths = [len(rankings.vendor_products[vendor_id][0]) for vendor_id in vendors]
+    arrays.update({
+        "popularity_product_ids": rankings.product_ids,
+        "popularity_scores": rankings.scores,
+        "popularity_vendor_ids": rankings.vendor_ids,
+        "popularity_vendor_scores": rankings.vendor_scores,
+        "popularity_vendor_keys": np.asarray(vendors, dtype=np.int64),
+        "popularity_vendor_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        "popularity_vendor_product_ids": np.concatenate(
+            [rankings.vendor_products[vendor_id][0] for vendor_id in vendors] or [np.empty(0, dtype=np.int64)]
+        ),
+        "popularity_vendor_product_scores": np.concatenate(
+            [rankings.vendor_products[vendor_id][1] for vendor_id in vendors] or [np.empty(0, dtype=np.float32)]
+        ),
+    })
+    return {name: np.asarray(array) for name, array in arrays.items()}
+
+
+def save_shared_state(root: str, matrix: InteractionMatrix, item_index: ItemNeighbourIndex, content_index: ContentIndex,
+                      popularity_index: PopularityIndex, metadata: dict = None) -> str:
+    """Write a new snapshot version and point LATEST at it; returns the version name."""
+    os.makedirs(root, exist_ok=True)
+    previous = latest_version(root)
+    generation = 1
+    if previous is not None:
+        with open(os.path.join(root, previous, MANIFEST_FILE)) as manifest_file:
+            generation = json.load(manifest_file)["generation"] + 1
+
+    version = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    suffix = 0
+    while os.path.exists(os.path.join(root, version if not suffix else f"{version}-{suffix}")):
+        suffix += 1
+    version = version if not suffix else f"{version}-{suffix}"
+
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+    try:
+        arrays = state_arrays(matrix, item_index, content_index, popularity_index)
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+        manifest = {
+            "version": version,
+            "generation": generation,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "matrix_shape": list(matrix.shape),
+            "content_shape": list(content_index.snapshot()[0].shape),
+            "popularity_computed_at": popularity_index.rankings.computed_at,
+            "bytes": int(sum(array.nbytes for array in arrays.values())),
+            "files": sorted(f"{name}.npy" for name in arrays),
+            **(metadata or {}),
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.rename(staging, os.path.join(root, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_atomic(os.path.join(root, LATEST_FILE), version)
+    logging.info(f"Published shared state {version} (generation {generation}, {manifest['bytes'] / 2 ** 20:.1f} MiB).")
+    return version
+
+
+def load_shared_state(root: str, version: str = None) -> SharedState:
+    """Memory-map a snapshot version (default: LATEST) and wrap it in the serving classes."""
+    version = version or latest_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No shared state published in {root}")
+    path = os.path.join(root, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    arrays = {
+        file_name[:-len(".npy")]: np.load(os.path.join(path, file_name), mmap_mode="r")
+        for file_name in manifest["files"]
+    }
+    generation = manifest["generation"]
+
+    def sparse(prefix, kind, shape):
+        matrix = kind((arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"], arrays[f"{prefix}_indptr"]),
+                      shape=shape, copy=False)
+        # Published canonical, so scipy never needs to sort (and write to) the read-only arrays
+        matrix.has_canonical_format = True
+        return matrix
+
+    matrix_shape = tuple(manifest["matrix_shape"])
+    csr = sparse("matrix", sp.csr_matrix, matrix_shape)
+    matrix = InteractionMatrix.from_shared(
+        csr,
+        sparse("matrix_csc", sp.csc_matrix, matrix_shape),
+        arrays["matrix_user_ids"],
+        arrays["matrix_item_ids"],
+        (arrays["matrix_user_lookup_keys"], arrays["matrix_user_lookup_positions"]),
+        (arrays["matrix_item_lookup_keys"], arrays["matrix_item_lookup_positions"]),
+        arrays["matrix_user_norms"],
+        version=generation,
+    )
+    item_index = ItemNeighbourIndex(
+        arrays["neighbours_item_ids"], arrays["neighbours_neighbours"], arrays["neighbours_scores"],
+        matrix_version=generation,
+    )
+    matrix.neighbour_index = item_index
+
+    content_index = ContentIndex.from_shared(
+        sparse("content", sp.csr_matrix, tuple(manifest["content_shape"])),
+        arrays["content_product_ids"],
+        (arrays["content_lookup_keys"], arrays["content_lookup_positions"]),
+        version=generation,
+    )
+
+    offsets = arrays["popularity_vendor_offsets"]
+    vendor_products = {
+        vendor_id: (arrays["popularity_vendor_product_ids"][start:end], arrays["popularity_vendor_product_scores"][start:end])
+        for vendor_id, start, end in zip(arrays["popularity_vendor_keys"].tolist(), offsets[:-1].tolist(), offsets[1:].tolist())
+    }
+    rankings = PopularityRankings(
+        arrays["popularity_product_ids"], arrays["popularity_scores"], vendor_products,
+        arrays["popularity_vendor_ids"], arrays["popularity_vendor_scores"],
+        computed_at=manifest["popularity_computed_at"],
+    )
+    popularity_index = PopularityIndex.from_rankings(rankings, version=generation)
+    return SharedState(matrix, item_index, content_index, popularity_index, manifest)
+
+
+def prune_shared_states(root: str, keep: int = 3) -> None:
+    """Delete all but the newest ``keep`` snapshots; mapped files stay readable until unmapped."""
+    for version in list_versions(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state():
+    """The snapshot this worker is serving from, or None outside the shared serving mode."""
+    return _state
+
+
+def activate_shared_state(state: SharedState) -> None:
+    """Point every process-wide getter at ``state``.
+
+    Each structure is swapped with a single reference assignment. The item
+    index travels with its matrix, so a request never pairs a matrix with an
+    index built from a different snapshot; popularity and content are keyed
+    by product id and stay valid across snapshots on their own.
+    """
+    global _state
+    with _state_lock:
+        set_interaction_matrix(state.matrix)
+        set_item_neighbour_index(state.item_index)
+        set_content_index(state.content_index)
+        set_popularity_index(state.popularity_index)
+        retriever = get_active_retriever()
+        # Pin every worker to the embedding model the coordinator published with
+        if state.tfrs_version and getattr(retriever, "version", None) != state.tfrs_version:
+            try:
+                set_active_retriever(load_embedding_artifact(settings.MODEL_ARTIFACT_DIR, version=state.tfrs_version))
+            except FileNotFoundError:
+                logging.warning(f"Embedding artifact {state.tfrs_version} of shared state {state.version} is missing.")
+        previous = _state
+        _state = state
+    logging.info(f"Serving shared state {getattr(previous, 'version', None)} -> {state.version}.")
+
+
+def refresh_shared_state(root: str = None):
+    """Attach to LATEST if it changed since the last call; returns the active snapshot or None."""
+    root = root or settings.SHARED_STATE_DIR
+    version = latest_version(root)
+    current = _state
+    if version is None or (current is not None and current.version == version):
+        return current
+    activate_shared_state(load_shared_state(root, version))
+    return _state
+
+
+def start_shared_state_refresher(root: str = None, interval: float = None) -> threading.Thread:
+    """Follow the snapshots published by the coordinator in a daemon thread."""
+    interval = interval if interval is not None else settings.SHARED_STATE_REFRESH_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_shared_state(root)
+            except Exception:
+                logging.exception("Failed to attach to the latest shared state.")
+
+    thread = threading.Thread(target=run, name="shared-state-refresher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+
+from app.config import settings
+
+# Warm-up states reported by /health/ready
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+# Loaded fine but has nothing to serve yet, e.g. no trained artifact; does not hold back readiness
+UNAVAILABLE = "unavailable"
+FAILED = "failed"
+
+
+class StrategyNotReady(Exception):
+    """A request needs a strategy whose in-memory structures warm-up has not built (yet)."""
+
+
+class StrategyBackend:
+    """How to warm up one recommendation strategy.
+
+    ``load(db)`` builds the strategy's in-memory structures and returns False
+    when there is nothing to serve yet; ``start_refresher(session_factory)``
+    optionally keeps them current. Both import their backend on first call,
+    so the dependencies of a disabled strategy are never imported. ``shared``
+    backends are published in the shared snapshot, whose coordinator keeps
+    them current instead.
+    """
+
+    def __init__(self, load, start_refresher=None, shared=False):
+        self.load = load
+        self.start_refresher = start_refresher
+        self.shared = shared
+
+
+def _load_popularity(db):
+    from app.services.popularity import build_popularity_index
+    build_popularity_index(db)
+
+
+def _load_user_based(db):
+    from app.services.interaction_matrix import get_interaction_matrix
+    get_interaction_matrix(db)
+
+
+def _load_item_based(db):
+    from app.services.interaction_matrix import get_interaction_matrix
+    from app.services.item_similarity import get_item_neighbour_index
+    get_item_neighbour_index(get_interaction_matrix(db))
+
+
+def _load_content(db):
+    from app.services.content import get_content_index
+    from app.services.interaction_matrix import get_interaction_matrix
+    # Content scoring reads the user's history from the matrix
+    get_interaction_matrix(db)
+    get_content_index(db)
+
+
+def _load_tfrs(db):
+    from app.services.embeddings import get_active_retriever, set_active_retriever
+    from app.services.model_store import load_embedding_artifact
+
+    if get_active_retriever() is not None:
+        # Already pinned by the shared state, or reloaded through the admin route
+        return True
+    # Memory-map the latest trained artifact; training happens offline in app.jobs.train_tfrs
+    try:
+        set_active_retriever(load_embedding_artifact(settings.MODEL_ARTIFACT_DIR))
+    except FileNotFoundError:
+        logging.warning(f"No TFRS artifact found in {settings.MODEL_ARTIFACT_DIR}; embedding routes are disabled.")
+        return False
+    return True
+
+
+def _load_vendors(db):
+    from app.services.vendor_affinity import refresh_vendor_affinity_index
+    refresh_vendor_affinity_index(db)
+
+
+def _refresh_popularity(session_factory):
+    from app.services.popularity import start_popularity_refresher
+    start_popularity_refresher(session_factory)
+
+
+def _refresh_item_based(session_factory):
+    from app.services.item_similarity import start_item_similarity_refresher
+    start_item_similarity_refresher(session_factory)
+
+
+def _refresh_content(session_factory):
+    from app.services.content import start_content_refresher
+    start_content_refresher(session_factory)
+
+
+def _refresh_vendors(session_factory):
+    from app.services.vendor_affinity import start_vendor_affinity_refresher
+    start_vendor_affinity_refresher(session_factory)
+
+
+# Warmed up in this order; popularity first since it is every strategy's cold-start fallback
+STRATEGY_BACKENDS = {
+    "popularity": StrategyBackend(_load_popularity, _refresh_popularity, shared=True),
+    "user_based": StrategyBackend(_load_user_based, shared=True),
+    "item_based": StrategyBackend(_load_item_based, _refresh_item_based, shared=True),
+    "content": StrategyBackend(_load_content, _refresh_content, shared=True),
+    "tfrs": StrategyBackend(_load_tfrs, shared=True),
+    "vendors": StrategyBackend(_load_vendors, _refresh_vendors),
+}
+
+
+def register_strategy_backend(name: str, backend: StrategyBackend) -> None:
+    """Add an optional backend; it is only imported and loaded when listed in ENABLED_STRATEGIES."""
+    STRATEGY_BACKENDS[name] = backend
+
+
+def enabled_strategies(spec: str = None) -> list:
+    """Registered strategies listed in ``ENABLED_STRATEGIES``, in warm-up order."""
+    names = {name.strip() for name in (settings.ENABLED_STRATEGIES if spec is None else spec).split(",") if name.strip()}
+    unknown = names - set(STRATEGY_BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown strategies in ENABLED_STRATEGIES: {', '.join(sorted(unknown))}")
+    return [name for name in STRATEGY_BACKENDS if name in names]
+
+
+def is_enabled(name: str) -> bool:
+    return name in enabled_strategies()
+
+
+_status = {}
+_load_seconds = {}
+_status_lock = threading.Lock()
+
+
+def _set_status(name: str, status: str, seconds: float = None) -> None:
+    with _status_lock:
+        _status[name] = status
+        if seconds is not None:
+            _load_seconds[name] = round(seconds, 3)
+
+
+def strategy_status() -> dict:
+    """{strategy: {"status", "load_seconds"}} for every enabled strategy."""
+    with _status_lock:
+        return {
+            name: {"status": _status.get(name, PENDING), "load_seconds": _load_seconds.get(name)}
+            for name in enabled_strategies()
+        }
+
+
+def is_strategy_ready(name: str) -> bool:
+    """True once ``name`` finished loading; request paths serve it only then."""
+    with _status_lock:
+        return _status.get(name) in (READY, UNAVAILABLE)
+
+
+def is_ready() -> bool:
+    """True once every enabled strategy finished loading, with or without something to serve."""
+    return all(state["status"] in (READY, UNAVAILABLE) for state in strategy_status().values())
+
+
+def warm_up(session_factory) -> None:
+    """Load every enabled strategy in turn, then start the refreshers that keep them current."""
+    shared = False
+    if settings.SHARED_STATE_DIR:
+        from app.services.shared_state import refresh_shared_state, start_shared_state_refresher
+
+        # Attach to the structures published by app.jobs.publish_state instead of building a copy per worker
+        shared = refresh_shared_state() is not None
+        start_shared_state_refresher()
+        if not shared:
+            logging.warning(f"No shared state published in {settings.SHARED_STATE_DIR} yet; building a local copy until there is.")
+
+    started = time.perf_counter()
+    for name in enabled_strategies():
+        _set_status(name, LOADING)
+        loading_started = time.perf_counter()
+        db = session_factory()
+        try:
+            loaded = STRATEGY_BACKENDS[name].load(db)
+        except Exception:
+            logging.exception(f"Failed to load the {name} strategy.")
+            _set_status(name, FAILED, time.perf_counter() - loading_started)
+            continue
+        finally:
+            db.close()
+        _set_status(name, UNAVAILABLE if loaded is False else READY, time.perf_counter() - loading_started)
+
+    from app.services.interaction_matrix import start_interaction_matrix_merger
+
+    # Skips read-only shared snapshots, so it only merges into a locally built matrix
+    start_interaction_matrix_merger()
+    for name in enabled_strategies():
+        backend = STRATEGY_BACKENDS[name]
+        # Shared snapshots are refreshed by their coordinator
+        if backend.shared and settings.SHARED_STATE_DIR:
+            continue
+        if backend.start_refresher is not None and _status.get(name) == READY:
+            backend.start_refresher(session_factory)
+    logging.info(f"Warmed up strategies {', '.join(enabled_strategies())} in {time.perf_counter() - started:.2f}s.")
+
+
+def start_warm_up(session_factory) -> threading.Thread:
+    """Warm the enabled strategies up in a daemon thread, so the server starts accepting requests at once."""
+    thread = threading.Thread(target=warm_up, args=(session_factory,), name="strategy-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -1,65 +1,233 @@
+import glob
+import logging
+import os
+import time
+import uuid
+
+import numpy as np
 import tensorflow as tf
 import tensorflow_recommenders as tfrs
+from app.config import settings
+from app.services.embeddings import OOV_TOKEN, EmbeddingRetriever
+from app.services.model_store import save_embedding_artifact
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Logs wall time and examples/sec for every training epoch."""
+
+    def __init__(self, batch_size):
+        super().__init__()
+        self.batch_size = batch_size
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+        self._steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._started
+        # The last batch may be partial, so this is an upper bound
+        examples = self._steps * self.batch_size
+        logging.info(
+            f"Epoch {epoch + 1}: {elapsed:.1f}s, ~{examples / max(elapsed, 1e-9):,.0f} examples/sec, "
+            f"loss={(logs or {}).get('total_loss', float('nan')):.4f}"
+        )
+
+
+def _cache_files(cache_path: str) -> list:
+    """The files tf.data's ``cache(cache_path)`` writes."""
+    prefix = glob.escape(cache_path)
+    return glob.glob(f"{prefix}.index") + glob.glob(f"{prefix}.data-*") + glob.glob(f"{prefix}*.lockfile")
+
+
+def _remove_cache(cache_path: str) -> None:
+    for path in _cache_files(cache_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
 
 class TFRecommender(tfrs.Model):  # Inherit directly from tfrs.Model
-    def __init__(self, user_ids, item_ids):
+    def __init__(self, user_ids, item_ids, embedding_dimension=None):
         super().__init__()
-        
-        # Convert user_ids and item_ids to strings
-        user_ids = [str(user_id) for user_id in user_ids]
-        item_ids = [str(item_id) for item_id in item_ids]
+        embedding_dimension = embedding_dimension or settings.TFRS_EMBEDDING_DIMENSION
 
-        # Define the embedding dimensions
-        embedding_dimension = 32
+        # Ids are mapped to embedding rows once, up front; row 0 is the OOV bucket
+        self.user_keys, self.user_rows = self._lookup_table(user_ids)
+        self.item_keys, self.item_rows = self._lookup_table(item_ids)
+        self.user_vocabulary = np.array([OOV_TOKEN] + [str(user_id) for user_id in user_ids])
+        self.item_vocabulary = np.array([OOV_TOKEN] + [str(item_id) for item_id in item_ids])
 
         # Define the user model
         self.user_model = tf.keras.Sequential([
-            tf.keras.layers.StringLookup(vocabulary=user_ids, mask_token=None),
-            tf.keras.layers.Embedding(len(user_ids) + 1, embedding_dimension)
+            tf.keras.layers.Embedding(len(self.user_vocabulary), embedding_dimension)
         ])
 
         # Define the item model
         self.item_model = tf.keras.Sequential([
-            tf.keras.layers.StringLookup(vocabulary=item_ids, mask_token=None),
-            tf.keras.layers.Embedding(len(item_ids) + 1, embedding_dimension)
+            tf.keras.layers.Embedding(len(self.item_vocabulary), embedding_dimension)
         ])
 
         # Define the retrieval task
         self.task = tfrs.tasks.Retrieval()
 
+        # Serving state, filled in by build_index() after training
+        self.retriever = None
+        self._compiled_for_training = False
+
+    @staticmethod
+    def _lookup_table(ids):
+        keys = np.asarray(list(ids), dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        return keys[order], order.astype(np.int64) + 1
+
+    @staticmethod
+    def _encode(keys, rows, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(keys):
+            return np.zeros(len(ids), dtype=np.int64)
+        found = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+        return np.where(keys[found] == ids, rows[found], 0)
+
+    def encode_users(self, user_ids) -> np.ndarray:
+        return self._encode(self.user_keys, self.user_rows, user_ids)
+
+    def encode_items(self, item_ids) -> np.ndarray:
+        return self._encode(self.item_keys, self.item_rows, item_ids)
+
     def compute_loss(self, features, training=False):
         # We pick out the user features and pass them into the user model.
         user_embeddings = self.user_model(features["user_id"])
         # And pick out the item features and pass them into the item model,
         item_embeddings = self.item_model(features["item_id"])
 
-        # The task computes the loss and metrics.
-        return self.task(user_embeddings, item_embeddings)
+        # The task computes the loss and metrics, weighting each example by its interaction strength.
+        return self.task(user_embeddings, item_embeddings, sample_weight=features["weight"])
 
-    def train(self, interactions, epochs=5):
-        # Convert interactions to strings and prepare tensors
-        user_ids = [str(interaction[0]) for interaction in interactions]
-        item_ids = [str(interaction[1]) for interaction in interactions]
+    def make_dataset(self, chunks, batch_size=None, shuffle_buffer=None, cache_path=None) -> tf.data.Dataset:
+        """Build the training pipeline from a callable returning (user_ids, item_ids, weights) array chunks.
 
-        # Create the dataset with a tuple of tensors
-        train = tf.data.Dataset.from_tensor_slices({
-            "user_id": tf.constant(user_ids),
-            "item_id": tf.constant(item_ids),
-        }).batch(1)
-        
-        # Compile and train the model
-        self.compile(optimizer=tf.keras.optimizers.Adagrad(learning_rate=0.1))
-        self.fit(train, epochs=epochs)
+        Chunks are encoded to embedding rows as they stream in, cached after
+        the first epoch (in memory, or on disk with ``cache_path``), shuffled,
+        batched and prefetched. A complete cache left at ``cache_path`` would be
+        read instead of ``chunks``, so it is deleted first.
+        """
+        batch_size = batch_size or settings.TFRS_BATCH_SIZE
+        shuffle_buffer = shuffle_buffer or settings.TFRS_SHUFFLE_BUFFER
+        if cache_path is None:
+            cache_path = settings.TFRS_CACHE_PATH
+        if cache_path:
+            _remove_cache(cache_path)
 
-    def recommend(self, user_id, top_k=5):
-        # Ensure user_id is a string
-        user_id = str(user_id)
+        def encoded_chunks():
+            for user_ids, item_ids, weights in chunks():
+                yield {
+                    "user_id": self.encode_users(user_ids),
+                    "item_id": self.encode_items(item_ids),
+                    "weight": np.asarray(weights, dtype=np.float32),
+                }
 
-        # Get recommendations for a user
-        user_embedding = self.user_model(tf.constant([user_id]))
+        signature = {
+            "user_id": tf.TensorSpec(shape=(None,), dtype=tf.int64),
+            "item_id": tf.TensorSpec(shape=(None,), dtype=tf.int64),
+            "weight": tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        }
+        return (
+            tf.data.Dataset.from_generator(encoded_chunks, output_signature=signature)
+            .unbatch()
+            .cache(cache_path)
+            .shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+            .batch(batch_size)
+            .prefetch(tf.data.AUTOTUNE)
+        )
 
-        # Retrieve the top recommended items for the user
-        scores = self.item_model.weights[0].numpy()
-        top_scores_indices = (-scores @ user_embedding.numpy().T).flatten().argsort()[:top_k]
+    def train(self, interactions=None, epochs=5, chunks=None, batch_size=None, shuffle_buffer=None, cache_path=None):
+        """Fit the model on ``interactions`` tuples or a streaming ``chunks`` callable.
+
+        ``interactions`` are (user_id, item_id) or (user_id, item_id, weight)
+        tuples; ``chunks`` is a callable yielding (user_ids, item_ids, weights)
+        arrays, e.g. streamed from the database. Repeated calls continue from
+        the current weights (see ``warm_start``). An on-disk cache is written
+        per run next to ``cache_path`` (default TFRS_CACHE_PATH) and removed
+        afterwards, so runs never share one.
+        """
+        batch_size = batch_size or settings.TFRS_BATCH_SIZE
+        if chunks is None:
+            rows = list(interactions)
+            user_ids = np.array([row[0] for row in rows], dtype=np.int64)
+            item_ids = np.array([row[1] for row in rows], dtype=np.int64)
+            weights = np.array([row[2] if len(row) > 2 else 1.0 for row in rows], dtype=np.float32)
+            chunks = lambda: [(user_ids, item_ids, weights)]
+
+        if cache_path is None:
+            cache_path = settings.TFRS_CACHE_PATH
+        if cache_path:
+            cache_path = f"{cache_path}.{uuid.uuid4().hex}"
+        train = self.make_dataset(chunks, batch_size, shuffle_buffer, cache_path)
+
+        # Compile once; later calls keep the optimizer state
+        if not self._compiled_for_training:
+            self.compile(optimizer=tf.keras.optimizers.Adagrad(learning_rate=settings.TFRS_LEARNING_RATE))
+            self._compiled_for_training = True
 
-        return [self.item_model.layers[0].get_vocabulary()[i] for i in top_scores_indices]
+        started = time.perf_counter()
+        try:
+            self.fit(train, epochs=epochs, verbose=0, callbacks=[ThroughputLogger(batch_size)])
+        finally:
+            if cache_path:
+                _remove_cache(cache_path)
+        logging.info(f"Trained TFRS model for {epochs} epochs in {time.perf_counter() - started:.1f}s.")
+        self.build_index()
+
+    def warm_start(self, retriever: EmbeddingRetriever):
+        """Initialise embeddings from a previous model for every id both vocabularies share."""
+        for model, vocabulary, previous_vocabulary, previous_embeddings in (
+            (self.user_model, self.user_vocabulary, retriever.user_vocabulary, retriever.user_embeddings),
+            (self.item_model, self.item_vocabulary, retriever.item_vocabulary, retriever.item_embeddings),
+        ):
+            weights = model.weights[0].numpy()
+            if previous_embeddings.shape[1] != weights.shape[1]:
+                logging.warning("Embedding dimension changed; skipping warm start.")
+                return
+            previous_keys, previous_rows = np.asarray(previous_vocabulary), np.arange(len(previous_vocabulary))
+            order = np.argsort(previous_keys, kind="stable")
+            found = np.minimum(np.searchsorted(previous_keys[order], vocabulary), len(order) - 1)
+            shared = previous_keys[order][found] == vocabulary
+            weights[shared] = previous_embeddings[previous_rows[order][found[shared]]]
+            model.weights[0].assign(weights)
+            logging.info(f"Warm-started {int(shared.sum())}/{len(vocabulary)} embedding rows.")
+
+    def build_index(self, kind=None, **params):
+        """Snapshot the trained embeddings and vocabularies into a retrieval index."""
+        self.retriever = EmbeddingRetriever(
+            user_vocabulary=self.user_vocabulary,
+            user_embeddings=self.user_model.weights[0].numpy(),
+            item_vocabulary=self.item_vocabulary,
+            item_embeddings=self.item_model.weights[0].numpy(),
+            index_kind=kind,
+            **params,
+        )
+
+    def save_artifact(self, root, metadata=None):
+        """Export the trained embeddings as a new versioned artifact under ``root``."""
+        if self.retriever is None:
+            self.build_index()
+        return save_embedding_artifact(
+            root,
+            user_vocabulary=self.retriever.user_vocabulary,
+            user_embeddings=self.retriever.user_embeddings,
+            item_vocabulary=self.retriever.item_vocabulary,
+            item_embeddings=self.retriever.item_embeddings,
+            index=self.retriever.index,
+            metadata=metadata,
+        )
+
+    def recommend(self, user_id, top_k=5):
+        if self.retriever is None:
+            self.build_index()
+
+        # Retrieve the top recommended items for the user
+        return self.retriever.recommend(user_id, top_k)
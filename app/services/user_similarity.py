@@ -0,0 +1,42 @@
+import numpy as np
+
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.ranking import top_k_indices
+
+
+def score_user_neighbours(matrix: InteractionMatrix, user_id: int, n_neighbours: int, limit: int, offset: int = 0):
+    """User-kNN scoring as ranked (product ids, scores).
+
+    The user's row is compared against every other user with one sparse
+    product restricted to the columns the user touched, the ``n_neighbours``
+    most similar users by cosine are kept, and each unseen item is scored by
+    the similarity-weighted sum of the neighbours' interactions with it.
+    """
+    empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    row = matrix.user_index.get(user_id)
+    items, weights = matrix.user_items(user_id)
+    if row is None or not len(items):
+        return empty
+
+    csr, csc = matrix.csr, matrix.csc
+    norms = matrix.user_norms
+    overlap = csc[:, items] @ weights
+    similarities = np.divide(
+        overlap, norms * norms[row], out=np.zeros_like(overlap, dtype=np.float32), where=norms > 0
+    ).astype(np.float32)
+    similarities[row] = 0.0
+
+    neighbours = top_k_indices(similarities, n_neighbours)
+    neighbours = neighbours[similarities[neighbours] > 0]
+    if not len(neighbours):
+        return empty
+
+    neighbour_rows = csr[neighbours]
+    contributions = neighbour_rows.data * np.repeat(similarities[neighbours], np.diff(neighbour_rows.indptr))
+    candidates, inverse = np.unique(neighbour_rows.indices, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+
+    unseen = ~np.isin(candidates, items)
+    candidates, scores = candidates[unseen], scores[unseen]
+    top = top_k_indices(scores, limit + offset)[offset:]
+    return matrix.item_ids[candidates[top]], scores[top]
@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud.product import get_product_vendor_pairs
+from app.crud.vendor import get_vendor_ratings, vendor_columns
+from app.models.product import ProductModel
+from app.models.recommendation import UserInteractionModel
+from app.models.vendor import VendorModel
+from app.services.interaction_matrix import (
+    DEFAULT_INTERACTION_WEIGHT,
+    INTERACTION_WEIGHTS,
+    InteractionMatrix,
+    current_interaction_matrix,
+    get_interaction_matrix,
+)
+from app.services.popularity import EMPTY
+from app.services.ranking import top_k_indices
+
+MAX_RATING = 5.0
+
+
+def _normalise_rows(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sp.diags(inverse.astype(np.float32)) @ matrix).tocsr()
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    top = values.max() if len(values) else 0.0
+    return values / top if top > 0 else values
+
+
+class VendorAffinityIndex:
+    """User x vendor affinities aggregated from the interaction matrix through product vendor ids.
+
+    ``user_vendors[u, v]`` sums user ``u``'s interaction weights on vendor
+    ``v``'s products. A vendor's score for a user blends, each scaled to
+    [0, 1]: the user's own affinity, the similarity-weighted affinity of the
+    ``n_neighbours`` users with the most similar vendor profiles (cosine),
+    and the vendor's rating. Neighbours are found through the precomputed
+    vendor x user matrix restricted to the user's vendors, so a request is a
+    handful of sparse products over arrays of n_vendors.
+    """
+
+    def __init__(self, matrix: InteractionMatrix, vendor_ids: np.ndarray, user_vendors: sp.csr_matrix,
+                 ratings: np.ndarray, n_neighbours: int = None, weights=None):
+        self.matrix = matrix
+        self.matrix_version = matrix.version
+        self.vendor_ids = vendor_ids
+        self.user_vendors = user_vendors
+        self.normalised = _normalise_rows(user_vendors)
+        self.vendor_users = self.normalised.tocsc()
+        self.ratings = ratings
+        self.n_neighbours = n_neighbours or settings.VENDOR_AFFINITY_NEIGHBOURS
+        self.own_weight, self.neighbour_weight, self.rating_weight = weights or (
+            settings.VENDOR_AFFINITY_OWN_WEIGHT,
+            settings.VENDOR_AFFINITY_NEIGHBOUR_WEIGHT,
+            settings.VENDOR_AFFINITY_RATING_WEIGHT,
+        )
+
+    def __len__(self):
+        return len(self.vendor_ids)
+
+    def user_row(self, user_id):
+        row = self.matrix.user_index.get(user_id)
+        return row if row is not None and row < self.user_vendors.shape[0] else None
+
+    def recommend(self, user_id: int, limit: int, offset: int = 0, new_only: bool = False):
+        """Ranked (vendor ids, scores) for a user; empty for users without history.
+
+        Candidates are the vendors the user or their neighbours interacted
+        with; ``new_only`` drops the ones the user already interacted with.
+        """
+        row = self.user_row(user_id)
+        if row is None:
+            return EMPTY
+        start, end = self.user_vendors.indptr[row], self.user_vendors.indptr[row + 1]
+        vendors = self.user_vendors.indices[start:end]
+        if not len(vendors):
+            return EMPTY
+
+        own = np.zeros(len(self.vendor_ids), dtype=np.float32)
+        own[vendors] = _scaled(self.user_vendors.data[start:end])
+
+        similarities = np.asarray(self.vendor_users[:, vendors] @ self.normalised.data[start:end]).ravel()
+        similarities[row] = 0.0
+        neighbours = top_k_indices(similarities, self.n_neighbours)
+        neighbours = neighbours[similarities[neighbours] > 0]
+        neighbour = np.zeros(len(self.vendor_ids), dtype=np.float32)
+        if len(neighbours):
+            neighbour = _scaled(np.asarray(self.normalised[neighbours].T @ similarities[neighbours]).ravel()).astype(np.float32)
+
+        candidates = np.flatnonzero((own > 0) | (neighbour > 0))
+        if new_only:
+            candidates = candidates[own[candidates] == 0]
+        scores = (
+            self.own_weight * own[candidates]
+            + self.neighbour_weight * neighbour[candidates]
+            + self.rating_weight * self.ratings[candidates]
+        )
+        top = top_k_indices(scores, limit + offset)[offset:]
+        return self.vendor_ids[candidates[top]], scores[top]
+
+
+def build_vendor_affinity_index(matrix: InteractionMatrix, product_vendors, vendor_ratings) -> VendorAffinityIndex:
+    """Aggregate the matrix into users x vendors; ``product_vendors`` and ``vendor_ratings`` are (id, value) rows."""
+    started = time.perf_counter()
+    csr = matrix.csr
+    item_ids = matrix.item_ids[: csr.shape[1]]
+    vendor_ids = np.asarray(sorted({vendor_id for vendor_id, _ in vendor_ratings}), dtype=np.int64)
+
+    vendor_columns = {vendor_id: column for column, vendor_id in enumerate(vendor_ids.tolist())}
+    product_vendors = dict(product_vendors)
+    # Matrix column -> vendor column, or -1 for products without a known vendor
+    item_vendors = np.fromiter(
+        (vendor_columns.get(product_vendors.get(product_id), -1) for product_id in item_ids.tolist()),
+        dtype=np.int64, count=len(item_ids),
+    )
+
+    assigned = np.flatnonzero(item_vendors >= 0)
+    item_to_vendor = sp.csr_matrix(
+        (np.ones(len(assigned), dtype=np.float32), (assigned, item_vendors[assigned])),
+        shape=(len(item_ids), len(vendor_ids)),
+    )
+    user_vendors = (csr @ item_to_vendor).tocsr()
+    user_vendors.eliminate_zeros()
+
+    ratings = dict(vendor_ratings)
+    rated = [rating for rating in ratings.values() if rating is not None]
+    # Unrated vendors get the mean rating rather than being punished or favoured
+    default_rating = float(np.mean(rated)) if rated else 0.0
+    rating_array = np.asarray(
+        [ratings[vendor_id] if ratings[vendor_id] is not None else default_rating for vendor_id in vendor_ids.tolist()],
+        dtype=np.float32,
+    )
+    index = VendorAffinityIndex(matrix, vendor_ids, user_vendors, np.clip(rating_array / MAX_RATING, 0.0, 1.0))
+    logging.info(
+        f"Built vendor affinity index: {user_vendors.shape[0]} users x {len(vendor_ids)} vendors, "
+        f"{user_vendors.nnz} non-zeros in {time.perf_counter() - started:.2f}s."
+    )
+    return index
+
+
+def user_vendor_affinity_query(user_id: int, limit: int, offset: int = 0, new_only: bool = False):
+    """Vendor columns ranked by the user's summed interaction weights, in one aggregate query.
+
+    Serves vendor recommendations until the in-memory index is built; with
+    ``new_only`` it ranks the vendors the user never interacted with by rating.
+    """
+    if new_only:
+        seen = (
+            select(ProductModel.vendor_id)
+            .join(UserInteractionModel, UserInteractionModel.product_id == ProductModel.id)
+            .where(UserInteractionModel.user_id == user_id, ProductModel.vendor_id.is_not(None))
+        )
+        return (
+            vendor_columns()
+            .where(VendorModel.id.not_in(seen))
+            .order_by(VendorModel.rating.desc(), VendorModel.id)
+            .limit(limit)
+            .offset(offset)
+        )
+    weight = case(INTERACTION_WEIGHTS, value=UserInteractionModel.interaction_type, else_=DEFAULT_INTERACTION_WEIGHT)
+    affinity = func.sum(weight * UserInteractionModel.interaction_value)
+    return (
+        vendor_columns()
+        .join(ProductModel, ProductModel.vendor_id == VendorModel.id)
+        .join(UserInteractionModel, UserInteractionModel.product_id == ProductModel.id)
+        .where(UserInteractionModel.user_id == user_id)
+        .group_by(VendorModel.id, VendorModel.name, VendorModel.description, VendorModel.rating)
+        # The id tie-break keeps pages from overlapping
+        .order_by(affinity.desc(), VendorModel.id)
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+_vendor_index = None
+_vendor_index_lock = threading.Lock()
+
+
+def current_vendor_affinity_index():
+    """The process-wide vendor affinity index, or None until it has been built."""
+    return _vendor_index
+
+
+def set_vendor_affinity_index(index: VendorAffinityIndex) -> None:
+    global _vendor_index
+    with _vendor_index_lock:
+        _vendor_index = index
+
+
+def refresh_vendor_affinity_index(db: Session) -> VendorAffinityIndex:
+    """(Re)build the index if the interaction matrix changed since the last build."""
+    matrix = get_interaction_matrix(db)
+    current = _vendor_index
+    if current is not None and current.matrix is matrix and current.matrix_version == matrix.version:
+        return current
+    index = build_vendor_affinity_index(matrix, get_product_vendor_pairs(db), get_vendor_ratings(db))
+    set_vendor_affinity_index(index)
+    return index
+
+
+def start_vendor_affinity_refresher(session_factory, interval: float = None) -> threading.Thread:
+    """Rebuild the index whenever the interaction matrix changed, in a daemon thread."""
+    interval = interval if interval is not None else settings.VENDOR_AFFINITY_REFRESH_SECONDS
+
+    def run():
+        while True:
+            time.sleep(interval)
+            if current_interaction_matrix() is None:
+                continue
+            db = session_factory()
+            try:
+                refresh_vendor_affinity_index(db)
+            except Exception:
+                logging.exception("Failed to refresh vendor affinity index.")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run, name="vendor-affinity-refresher", daemon=True)
+    thread.start()
+    return thread
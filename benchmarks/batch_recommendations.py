@@ -0,0 +1,53 @@
+"""Throughput of batched vs per-user embedding recommendations.
+
+Usage:
+    python benchmarks/batch_recommendations.py --users 100000 --items 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.embeddings import EmbeddingRetriever
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    retriever = EmbeddingRetriever(
+        user_vocabulary=["[UNK]"] + [str(i) for i in range(args.users)],
+        user_embeddings=rng.normal(size=(args.users + 1, args.dim)).astype(np.float32),
+        item_vocabulary=["[UNK]"] + [str(i) for i in range(args.items)],
+        item_embeddings=rng.normal(size=(args.items + 1, args.dim)).astype(np.float32),
+        index_kind="brute_force",
+    )
+
+    for batch_size in args.batch_sizes:
+        user_ids = rng.integers(0, args.users, size=batch_size).tolist()
+        loop_users = user_ids[: min(batch_size, 200)]
+
+        started = time.perf_counter()
+        for user_id in loop_users:
+            retriever.recommend(user_id, args.k)
+        per_user = len(loop_users) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        retriever.recommend_batch(user_ids, args.k)
+        batched = batch_size / (time.perf_counter() - started)
+
+        print(f"batch={batch_size:<6} per-user loop {per_user:10.0f} users/s   batched {batched:10.0f} users/s")
+
+
+if __name__ == "__main__":
+    main()
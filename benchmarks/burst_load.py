@@ -0,0 +1,162 @@
+"""Latency of the hybrid route under burst traffic, with and without per-strategy concurrency limits.
+
+Loads a synthetic dataset (see benchmarks/synthetic.py) into a throwaway
+SQLite database and starts ``uvicorn app.main:app`` once per configuration:
+
+* ``unlimited``: STRATEGY_MAX_CONCURRENCY=0, every uncached request computes
+* ``limited``:   the configured limit, queue and queue timeout; overflow is
+  shed to popular products (``X-Fallback: popular``)
+
+Each burst sends ``--burst`` concurrent requests for users not requested
+before, so nothing is served from the response cache, with ``--hot-share``
+of them going to a few users as identical requests (a popular page loading
+for many sessions at once); identical requests are coalesced in both
+configurations. Reported per configuration: latency percentiles over all
+bursts, p99 of the responses that were computed rather than shed, the
+share of shed responses and the cache's coalesced count:
+
+    python benchmarks/burst_load.py --users 20000 --items 10000 --interactions 500000 --bursts 10 --burst 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.startup import free_port, wait_for
+from benchmarks.synthetic import generate_catalogue, generate_interactions
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection on bare asyncio streams.
+
+    httpx spends more CPU per request than the routes measured here, which on
+    a small machine shows up as client-side latency; this does just enough to
+    send a GET and read the status, headers and body.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def get(self, path: str):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        headers = dict(line.lower().split(": ", 1) for line in head[1:] if line)
+        body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return int(head[0].split()[1]), headers, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_bursts(host: str, port: int, user_batches, hot_users: int, hot_share: float, burst: int, pause: float):
+    latencies, shed = [], []
+    connections = [Connection(host, port) for _ in range(burst)]
+
+    async def request(connection, user_id):
+        started = time.perf_counter()
+        status, headers, _ = await connection.get(f"/api/v1/recommendations/hybrid/{user_id}")
+        if status != 200:
+            raise RuntimeError(f"Hybrid recommendations for user {user_id} returned {status}")
+        return time.perf_counter() - started, headers
+
+    try:
+        for users in user_batches:
+            n_hot = int(burst * hot_share)
+            # The hot share repeats the burst's first few users; the rest are one request per user
+            targets = [int(users[i % hot_users]) for i in range(n_hot)] + [int(user) for user in users[hot_users:hot_users + burst - n_hot]]
+            for elapsed, headers in await asyncio.gather(*map(request, connections, targets)):
+                latencies.append(elapsed)
+                shed.append("x-fallback" in headers)
+            await asyncio.sleep(pause)
+        _, _, body = await connections[0].get("/api/v1/admin/cache/stats")
+    finally:
+        for connection in connections:
+            connection.close()
+    return np.array(latencies) * 1000, np.array(shed, dtype=bool), json.loads(body)
+
+
+def measure(env: dict, user_batches, args) -> tuple:
+    host, port = "127.0.0.1", free_port()
+    server = subprocess.Popen(
+        # Connections idle through a slow burst must still be open for the next one
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning",
+         "--timeout-keep-alive", "300"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=args.timeout) as client:
+            wait_for(client, f"http://{host}:{port}/health/ready", time.perf_counter() + args.timeout)
+        return asyncio.run(run_bursts(host, port, user_batches, args.hot_users, args.hot_share, args.burst, args.pause))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--interactions", type=int, default=500000)
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=200, help="concurrent requests per burst")
+    parser.add_argument("--hot-users", type=int, default=5)
+    parser.add_argument("--hot-share", type=float, default=0.5, help="share of a burst going to the hot users")
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds between bursts")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="defaults to STRATEGY_MAX_CONCURRENCY")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix="burst-bench-"), "burst.db")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "PYTHONPATH": ROOT,
+        # Keep the run independent of artifacts or stores lying around in the working tree
+        "MODEL_ARTIFACT_DIR": os.path.join(os.path.dirname(database), "tfrs"),
+        "MATERIALIZED_DIR": os.path.join(os.path.dirname(database), "materialized"),
+    }
+    os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+    from app.config import settings
+    from app.database import engine
+    from benchmarks.evaluate import load_database
+
+    catalogue = generate_catalogue(args.items, seed=args.seed)
+    interactions = generate_interactions(catalogue, args.users, args.interactions, seed=args.seed)
+    load_database(engine, catalogue, interactions)
+    engine.dispose()
+
+    users = np.random.default_rng(args.seed).permutation(np.unique(interactions["user_ids"]))
+    per_burst = args.hot_users + args.burst
+    if len(users) < per_burst * args.bursts:
+        sys.exit(f"Need {per_burst * args.bursts} users for uncached bursts; lower --bursts or --burst.")
+    user_batches = [users[i * per_burst:(i + 1) * per_burst] for i in range(args.bursts)]
+    limit = args.max_concurrency if args.max_concurrency is not None else settings.STRATEGY_MAX_CONCURRENCY
+
+    print(f"{args.bursts} bursts of {args.burst} hybrid requests ({args.hot_share:.0%} on {args.hot_users} hot users), "
+          f"{args.interactions} interactions")
+    print(f"{'config':<10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'served p99':>11} {'shed':>6} {'coalesced':>10}")
+    for name, max_concurrency in (("unlimited", 0), ("limited", limit)):
+        latencies, shed, stats = measure({**env, "STRATEGY_MAX_CONCURRENCY": str(max_concurrency)}, user_batches, args)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        served = np.percentile(latencies[~shed], 99) if (~shed).any() else float("nan")
+        print(f"{name:<10} {p50:8.1f} {p90:8.1f} {p99:8.1f} {latencies.max():8.1f} {served:11.1f} "
+              f"{shed.mean():6.1%} {stats['coalesced']:10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare sync (threadpool) and async (event loop) database throughput at high concurrency.
+
+Runs the same recommendation service call through both paths against the
+configured DATABASE_URL, so point it at a Postgres instance that has data:
+
+    DATABASE_URL=postgresql+psycopg2://... python benchmarks/db_load_test.py --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.crud.interactions import get_user_ids
+from app.database import AsyncSessionLocal, SessionLocal
+from app.services.interaction_matrix import get_interaction_matrix
+from app.services.recommendation import recommend_products, recommend_products_async
+
+
+def report(label, latencies, elapsed):
+    latencies = np.array(latencies) * 1000
+    print(f"{label:<6} {len(latencies) / elapsed:8.0f} req/s   p50={np.percentile(latencies, 50):7.2f}ms   "
+          f"p99={np.percentile(latencies, 99):7.2f}ms")
+
+
+def run_sync(user_ids, concurrency):
+    # Mirrors sync route handlers: one threadpool slot and one pooled connection per request
+    def request(user_id):
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            recommend_products(user_id, db)
+        finally:
+            db.close()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(request, user_ids))
+    report("sync", latencies, time.perf_counter() - started)
+
+
+async def run_async(user_ids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(user_id):
+        async with semaphore:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await recommend_products_async(user_id, db)
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(request(user_id) for user_id in user_ids))
+    report("async", latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        users = get_user_ids(db)
+        # Build the shared matrix up front so both paths measure only request work
+        get_interaction_matrix(db)
+    finally:
+        db.close()
+    if not users:
+        sys.exit("No interactions in the database; load some data first.")
+
+    user_ids = [random.choice(users) for _ in range(args.requests)]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"pool_size={settings.DB_POOL_SIZE} max_overflow={settings.DB_MAX_OVERFLOW}")
+    run_sync(user_ids, args.concurrency)
+    asyncio.run(run_async(user_ids, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
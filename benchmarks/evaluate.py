@@ -0,0 +1,295 @@
+"""Offline quality and speed evaluation of every recommendation strategy.
+
+Generates a synthetic power-law dataset (see benchmarks/synthetic.py), loads
+the training part into a database, splits train/test by time and reports, per
+strategy: precision/recall/NDCG@K, catalogue coverage, p50/p95/p99 latency,
+throughput, build time and peak traced memory. Results are written as JSON so
+runs can be compared across commits:
+
+    python benchmarks/evaluate.py --users 50000 --items 20000 --interactions 2000000 \\
+        --output benchmarks/results/$(git rev-parse --short HEAD).json
+
+The database defaults to a throwaway SQLite file; pass --database-url to use
+Postgres. The target database is wiped and reloaded.
+
+The learned models are compared on training time (``build_seconds``) and
+quality with ``--strategies tfrs als``. Their retrievers do not filter the
+user's history, so they are asked for K plus the history length and the
+seen items are dropped afterwards, as the other strategies do themselves.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_catalogue, generate_interactions, temporal_split
+
+STRATEGIES = ["popularity", "user_based", "item_based", "content", "tfrs", "als", "hybrid"]
+INSERT_CHUNK_SIZE = 50000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--interactions", type=int, default=500000)
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--eval-users", type=int, default=1000, help="users sampled for the quality and latency pass")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--tfrs-epochs", type=int, default=3)
+    parser.add_argument("--als-iterations", type=int, default=15)
+    parser.add_argument("--als-threads", type=int, default=0, help="0 uses every core")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'recommendation-eval.db')}")
+    parser.add_argument("--output", default=None, help="JSON file to write (default: print only)")
+    return parser.parse_args()
+
+
+def measure(function):
+    """Run ``function`` and return (result, seconds, peak traced MiB)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = function()
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def load_database(engine, catalogue, train):
+    from app.database import BaseModel
+    from app.models import ProductModel, UserInteractionModel, VendorModel
+
+    BaseModel.metadata.drop_all(engine)
+    BaseModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            VendorModel.__table__.insert(),
+            [{"id": vendor_id, "name": f"vendor {vendor_id}", "description": "", "rating": 4.0}
+             for vendor_id in range(1, catalogue["n_vendors"] + 1)],
+        )
+        products = [
+            {"id": int(product_id), "name": name, "description": description, "price": float(price), "vendor_id": int(vendor_id)}
+            for product_id, name, description, price, vendor_id in zip(
+                catalogue["product_ids"], catalogue["names"], catalogue["descriptions"],
+                catalogue["prices"], catalogue["vendor_ids"],
+            )
+        ]
+        for start in range(0, len(products), INSERT_CHUNK_SIZE):
+            connection.execute(ProductModel.__table__.insert(), products[start:start + INSERT_CHUNK_SIZE])
+        for start in range(0, len(train["user_ids"]), INSERT_CHUNK_SIZE):
+            end = start + INSERT_CHUNK_SIZE
+            connection.execute(UserInteractionModel.__table__.insert(), [
+                {
+                    "user_id": int(user_id),
+                    "product_id": int(product_id),
+                    "interaction_type": str(interaction_type),
+                    "interaction_value": float(interaction_value),
+                    "created_at": datetime.fromtimestamp(timestamp, timezone.utc),
+                }
+                for user_id, product_id, interaction_type, interaction_value, timestamp in zip(
+                    train["user_ids"][start:end], train["product_ids"][start:end], train["interaction_types"][start:end],
+                    train["interaction_values"][start:end], train["timestamps"][start:end],
+                )
+            ])
+
+
+def ranking_metrics(recommended, relevant: set, k: int):
+    hits = np.array([product_id in relevant for product_id in recommended[:k]], dtype=np.float64)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[: min(k, len(relevant))].sum()
+    return hits.sum() / k, hits.sum() / len(relevant), float((hits * discounts[: len(hits)]).sum() / ideal)
+
+
+def evaluate_strategy(recommend, eval_users, relevant, history, k: int, n_items: int) -> dict:
+    """Time ``recommend(user_id) -> product ids`` for every user and score the results."""
+    recommend(eval_users[0])  # warm up lazily built structures
+    latencies, precisions, recalls, ndcgs, recommended_items = [], [], [], [], set()
+    started = time.perf_counter()
+    for user_id in eval_users:
+        call_started = time.perf_counter()
+        recommended = [int(product_id) for product_id in recommend(user_id)]
+        latencies.append(time.perf_counter() - call_started)
+        recommended = [product_id for product_id in recommended if product_id not in history[user_id]][:k]
+        precision, recall, ndcg = ranking_metrics(recommended, relevant[user_id], k)
+        precisions.append(precision)
+        recalls.append(recall)
+        ndcgs.append(ndcg)
+        recommended_items.update(recommended)
+    elapsed = time.perf_counter() - started
+
+    # Peak memory of the query path alone, on a short pass with tracing on
+    _, _, query_peak = measure(lambda: [recommend(user_id) for user_id in eval_users[:50]])
+    latencies = np.array(latencies) * 1000
+    return {
+        f"precision@{k}": float(np.mean(precisions)),
+        f"recall@{k}": float(np.mean(recalls)),
+        f"ndcg@{k}": float(np.mean(ndcgs)),
+        "coverage": len(recommended_items) / n_items,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "mean": float(latencies.mean()),
+        },
+        "throughput_per_second": len(eval_users) / elapsed,
+        "query_peak_memory_mib": query_peak,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main():
+    args = parse_args()
+    # Settings are read at import time, so point the app at the benchmark database first
+    os.environ["DATABASE_URL"] = args.database_url
+    from app.database import SessionLocal, engine
+    from app.services.content import get_content_index
+    from app.services.embeddings import set_active_retriever
+    from app.services.interaction_matrix import get_interaction_matrix
+    from app.services.item_similarity import get_item_neighbour_index
+    from app.services.popularity import build_popularity_index, get_popularity_index
+    from app.services import recommendation
+
+    started = time.perf_counter()
+    catalogue = generate_catalogue(args.items, args.vendors, seed=args.seed)
+    interactions = generate_interactions(catalogue, args.users, args.interactions, seed=args.seed)
+    train, test, cutoff = temporal_split(interactions, args.test_fraction)
+    print(f"Generated {args.interactions:,} interactions in {time.perf_counter() - started:.1f}s "
+          f"({len(train['user_ids']):,} train / {len(test['user_ids']):,} test)")
+
+    _, load_seconds, _ = measure(lambda: load_database(engine, catalogue, train))
+    print(f"Loaded {engine.url.get_backend_name()} in {load_seconds:.1f}s")
+
+    history = {}
+    for user_id, product_id in zip(train["user_ids"].tolist(), train["product_ids"].tolist()):
+        history.setdefault(user_id, set()).add(product_id)
+    relevant = {}
+    for user_id, product_id in zip(test["user_ids"].tolist(), test["product_ids"].tolist()):
+        if user_id in history and product_id not in history[user_id]:
+            relevant.setdefault(user_id, set()).add(product_id)
+    rng = np.random.default_rng(args.seed)
+    candidates = np.array(sorted(relevant))
+    eval_users = rng.choice(candidates, size=min(args.eval_users, len(candidates)), replace=False).tolist()
+
+    db = SessionLocal()
+    results = {}
+    matrix, matrix_seconds, matrix_peak = measure(lambda: get_interaction_matrix(db))
+    builds = {
+        "popularity": lambda: build_popularity_index(db),
+        "user_based": lambda: matrix.user_norms,
+        "item_based": lambda: get_item_neighbour_index(matrix),
+        "content": lambda: get_content_index(db),
+    }
+    recommenders = {
+        "popularity": lambda user_id: get_popularity_index().top_products(args.k, exclude=list(history[user_id]))[0],
+        "user_based": lambda user_id: [product.id for product in recommendation.recommend_products_user_based(user_id, db, limit=args.k)],
+        "item_based": lambda user_id: [product.id for product in recommendation.recommend_products_item_based(user_id, db, limit=args.k)],
+        "content": lambda user_id: [product.id for product in recommendation.recommend_products_content_based(user_id, db, limit=args.k)],
+        "hybrid": lambda user_id: [product.id for product in recommendation.recommend_products_hybrid(user_id, db, limit=args.k)[0]],
+    }
+
+    # The hybrid engine fuses whatever is built, so build the structures it reads even when
+    # those strategies are not evaluated themselves (TFRS only when asked for)
+    required = set(args.strategies)
+    if "hybrid" in required:
+        required |= {"popularity", "user_based", "item_based", "content"}
+
+    for name in [name for name in STRATEGIES if name in required]:
+        try:
+            if name == "tfrs":
+                retriever, build_seconds, build_peak = measure(lambda: train_tfrs(train, args.tfrs_epochs))
+                set_active_retriever(retriever)
+                recommenders["tfrs"] = lambda user_id: retriever.recommend(str(user_id), args.k + len(history[user_id]))
+            elif name == "als":
+                # Trained on the same matrix the neighbourhood strategies use; served like TFRS
+                als, build_seconds, build_peak = measure(lambda: train_als(matrix, args.als_iterations, args.als_threads))
+                recommenders["als"] = lambda user_id: als.recommend(str(user_id), args.k + len(history[user_id]))
+            elif name == "hybrid":
+                build_seconds, build_peak = 0.0, 0.0
+            else:
+                _, build_seconds, build_peak = measure(builds[name])
+        except Exception as error:
+            results[name] = {"error": f"{type(error).__name__}: {error}"}
+            print(f"{name:<12} skipped: {results[name]['error']}")
+            continue
+        if name not in args.strategies:
+            continue
+        metrics = evaluate_strategy(recommenders[name], eval_users, relevant, history, args.k, args.items)
+        metrics.update({"build_seconds": build_seconds, "build_peak_memory_mib": build_peak})
+        results[name] = metrics
+        print(f"{name:<12} P@{args.k}={metrics[f'precision@{args.k}']:.4f} R@{args.k}={metrics[f'recall@{args.k}']:.4f} "
+              f"NDCG={metrics[f'ndcg@{args.k}']:.4f} cov={metrics['coverage']:.3f} "
+              f"p50={metrics['latency_ms']['p50']:.2f}ms p99={metrics['latency_ms']['p99']:.2f}ms "
+              f"{metrics['throughput_per_second']:.0f}/s build={build_seconds:.1f}s")
+    db.close()
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {**vars(args), "database_url": engine.url.render_as_string(hide_password=True)},
+        "dataset": {
+            "users": args.users,
+            "items": args.items,
+            "interactions": args.interactions,
+            "train_interactions": int(len(train["user_ids"])),
+            "test_interactions": int(len(test["user_ids"])),
+            "split_timestamp": cutoff,
+            "eval_users": len(eval_users),
+            "load_seconds": load_seconds,
+            "matrix_build_seconds": matrix_seconds,
+            "matrix_build_peak_memory_mib": matrix_peak,
+        },
+        "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "strategies": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Wrote {args.output}")
+
+
+def train_als(matrix, iterations: int, threads: int):
+    from app.services.matrix_factorization import ALSRecommender
+
+    return ALSRecommender(threads=threads).train(matrix, iterations=iterations)
+
+
+def train_tfrs(train, epochs: int):
+    # TensorFlow is only imported when the TFRS strategy is evaluated
+    from app.services.interaction_matrix import interaction_weight
+    from app.services.tf_recommender import TFRecommender
+
+    weights = np.array([
+        interaction_weight(interaction_type, value)
+        for interaction_type, value in zip(train["interaction_types"], train["interaction_values"])
+    ], dtype=np.float32)
+    model = TFRecommender(np.unique(train["user_ids"]).tolist(), np.unique(train["product_ids"]).tolist())
+    model.train(chunks=lambda: [(train["user_ids"], train["product_ids"], weights)], epochs=epochs)
+    return model.retriever
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Check that the hot interaction queries are planned against the composite indexes.
+
+Runs EXPLAIN (Postgres) or EXPLAIN QUERY PLAN (SQLite) for each query and exits
+non-zero if a plan falls back to a sequential scan. Point it at a database that
+has been migrated and seeded, e.g.:
+
+    alembic upgrade head
+    DATABASE_URL=sqlite:///./plans.db python benchmarks/query_plans.py --seed 200000
+
+Postgres needs enough rows (and a fresh ANALYZE) before it prefers the indexes.
+"""
+import argparse
+import os
+import random
+import sys
+
+from sqlalchemy import select, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.crud.interactions import get_user_ids
+from app.crud.product import product_columns
+from app.crud.recommendation import _user_interaction_columns
+from app.database import SessionLocal, engine
+from app.models import ProductModel, UserInteractionModel, VendorModel
+
+CHECKS = [
+    ("user history", lambda: _user_interaction_columns(42), "ix_user_interactions_user_product_value"),
+    ("distinct users", lambda: select(UserInteractionModel.user_id).distinct(), "ix_user_interactions_user_product_value"),
+    (
+        "product interactions",
+        lambda: select(UserInteractionModel.user_id).where(UserInteractionModel.product_id == 7),
+        "ix_user_interactions_product_user",
+    ),
+    ("vendor products", lambda: product_columns().where(ProductModel.vendor_id == 3), "ix_products_vendor_id"),
+]
+
+
+def seed(db, n_interactions: int):
+    vendor_ids = [vendor_id for (vendor_id,) in db.execute(select(VendorModel.id))]
+    if not vendor_ids:
+        db.execute(VendorModel.__table__.insert(), [{"name": f"vendor {i}"} for i in range(100)])
+        vendor_ids = [vendor_id for (vendor_id,) in db.execute(select(VendorModel.id))]
+    db.execute(
+        ProductModel.__table__.insert(),
+        [
+            {"name": f"product {i}", "description": "", "price": 1.0, "vendor_id": random.choice(vendor_ids)}
+            for i in range(1000)
+        ],
+    )
+    product_ids = [product_id for (product_id,) in db.execute(select(ProductModel.id))]
+    db.execute(
+        UserInteractionModel.__table__.insert(),
+        [
+            {
+                "user_id": random.randint(1, n_interactions // 20 + 1),
+                "product_id": random.choice(product_ids),
+                "interaction_type": "view",
+                "interaction_value": 1.0,
+            }
+            for _ in range(n_interactions)
+        ],
+    )
+    db.commit()
+    db.execute(text("ANALYZE"))
+
+
+def explain(db, statement):
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    return "\n".join(" ".join(str(column) for column in row) for row in db.execute(text(f"{prefix} {compiled}")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="insert this many synthetic interactions first")
+    args = parser.parse_args()
+
+    failures = 0
+    with SessionLocal() as db:
+        if args.seed:
+            seed(db, args.seed)
+        print(f"{len(get_user_ids(db))} users on {engine.dialect.name}")
+        for label, statement, index_name in CHECKS:
+            plan = explain(db, statement())
+            ok = index_name in plan
+            failures += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] {label}: expected {index_name}\n  " + plan.replace("\n", "\n  "))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
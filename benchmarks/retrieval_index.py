@@ -0,0 +1,66 @@
+"""Recall@k and latency of the ANN retrieval index against exact search.
+
+Usage:
+    python benchmarks/retrieval_index.py --items 1000000 --dim 32 --k 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.retrieval_index import BruteForceIndex, IVFIndex
+
+
+def synthetic_embeddings(n_items, dim, n_clusters, rng):
+    # Clustered embeddings resemble trained item towers better than pure noise
+    centres = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n_items)
+    return centres[labels] + 0.5 * rng.normal(size=(n_items, dim)).astype(np.float32)
+
+
+def time_queries(index, queries, k, **params):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        ids, _ = index.search(query, k, **params)
+        latencies.append(time.perf_counter() - started)
+        results.append(ids)
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--dim", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (0 = sqrt(items))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = synthetic_embeddings(args.items, args.dim, max(1, args.items // 1000), rng)
+    item_ids = np.arange(args.items)
+    queries = synthetic_embeddings(args.queries, args.dim, 50, rng)
+
+    exact = BruteForceIndex(embeddings, item_ids)
+    truth, latencies = time_queries(exact, queries, args.k)
+    print(f"brute_force          recall@{args.k}=1.000  p50={np.percentile(latencies, 50):.3f}ms  "
+          f"p99={np.percentile(latencies, 99):.3f}ms")
+
+    started = time.perf_counter()
+    ivf = IVFIndex(embeddings, item_ids, n_lists=args.lists)
+    print(f"ivf build: {time.perf_counter() - started:.1f}s, {ivf.n_lists} lists")
+    for n_probe in args.probes:
+        found, latencies = time_queries(ivf, queries, args.k, n_probe=n_probe)
+        recall = np.mean([len(np.intersect1d(a, b)) / args.k for a, b in zip(found, truth)])
+        print(f"ivf n_probe={n_probe:<4}     recall@{args.k}={recall:.3f}  p50={np.percentile(latencies, 50):.3f}ms  "
+              f"p99={np.percentile(latencies, 99):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compare the ORM + response_model serialization path with the column-row + orjson fast path.
+
+Serves the same N products through two throwaway FastAPI routes backed by an
+in-memory SQLite database:
+
+* ``orm``:  ORM entities -> ``ProductSchema.from_orm`` -> ``model_dump`` ->
+  ``response_model`` validation and encoding (how the routes used to work)
+* ``fast``: column rows -> ``rows_to_dicts`` -> ``FastJSONResponse`` (orjson)
+
+and also streams the fast path as NDJSON. For every size it reports median
+and p95 latency and the peak memory traced while handling one request:
+
+    python benchmarks/serialization.py --sizes 100 1000 5000 --requests 50
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.crud.product import product_columns
+from app.database import BaseModel
+from app.models import ProductModel, VendorModel
+from app.routes.responses import paginated_response, rows_to_dicts, schema_fields
+from app.schemas.product import ProductSchema
+
+
+def build_database(n_products: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    BaseModel.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add(VendorModel(id=1, name="vendor", description="benchmark vendor", rating=4.0))
+        db.add_all([
+            ProductModel(id=i, name=f"product {i}", description=f"description of product {i} " * 4,
+                         price=10.0 + i % 1000, vendor_id=1)
+            for i in range(1, n_products + 1)
+        ])
+        db.commit()
+    return session_factory
+
+
+def build_app(session_factory) -> FastAPI:
+    app = FastAPI()
+    fields = schema_fields(ProductSchema)
+
+    @app.get("/orm", response_model=List[ProductSchema])
+    def orm_path(limit: int):
+        with session_factory() as db:
+            products = db.execute(select(ProductModel).limit(limit)).scalars().all()
+            return [ProductSchema.from_orm(product).model_dump() for product in products]
+
+    @app.get("/fast", response_model=List[ProductSchema])
+    def fast_path(request: Request, limit: int):
+        with session_factory() as db:
+            rows = db.execute(product_columns().limit(limit)).all()
+            return paginated_response(request, rows_to_dicts(rows, fields), limit, 0)
+
+    return app
+
+
+def measure(client: TestClient, path: str, limit: int, n_requests: int, headers: dict = None):
+    client.get(path, params={"limit": limit}, headers=headers)  # warm up
+    latencies = []
+    for _ in range(n_requests):
+        started = time.perf_counter()
+        response = client.get(path, params={"limit": limit}, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+
+    tracemalloc.start()
+    client.get(path, params={"limit": limit}, headers=headers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies = np.array(latencies) * 1000
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--requests", type=int, default=30)
+    args = parser.parse_args()
+
+    client = TestClient(build_app(build_database(max(args.sizes))))
+    variants = [
+        ("orm", "/orm", None),
+        ("fast", "/fast", None),
+        ("ndjson", "/fast", {"Accept": "application/x-ndjson"}),
+    ]
+    print(f"{'items':>6} {'path':<7} {'p50 ms':>8} {'p95 ms':>8} {'peak MiB':>9}")
+    for size in args.sizes:
+        for label, path, headers in variants:
+            p50, p95, peak = measure(client, path, size, args.requests, headers)
+            print(f"{size:>6} {label:<7} {p50:8.2f} {p95:8.2f} {peak:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
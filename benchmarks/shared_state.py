@@ -0,0 +1,168 @@
+"""Per-worker memory of the serving structures: built in every worker vs attached from a shared snapshot.
+
+Generates a synthetic dataset (see benchmarks/synthetic.py), then starts N
+spawned worker processes, like uvicorn workers, in each mode:
+
+* ``baseline``: imports the services and holds no data
+* ``local``:    every worker builds its own interaction matrix, item
+  neighbour index, content index and popularity rankings (what a plain
+  multi-worker deployment does)
+* ``shared``:   the parent publishes one snapshot with ``save_shared_state``
+  and every worker memory-maps it with ``load_shared_state``
+
+Each worker scores a sample of users with every strategy to fault the data
+in, then all of them report their memory at the same moment. RSS counts the
+mapped snapshot pages in every worker; PSS splits shared pages between the
+processes mapping them and private is what only that worker holds. Linux only
+(reads /proc/self/smaps_rollup):
+
+    python benchmarks/shared_state.py --users 50000 --items 20000 --interactions 2000000 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from benchmarks.synthetic import generate_catalogue, generate_interactions
+
+MODES = ["baseline", "local", "shared"]
+SCORED_USERS = 500
+
+
+def build_structures(dataset: dict):
+    from app.config import settings
+    from app.services.content import ContentIndex
+    from app.services.interaction_matrix import INTERACTION_WEIGHTS, InteractionMatrix
+    from app.services.item_similarity import build_item_neighbour_index
+    from app.services.popularity import PopularityIndex
+
+    weights = np.array([INTERACTION_WEIGHTS[kind] for kind in dataset["interaction_types"].tolist()], dtype=np.float32)
+    matrix = InteractionMatrix.from_arrays(dataset["user_ids"], dataset["product_ids"], weights)
+    item_index = build_item_neighbour_index(matrix, k=settings.ITEM_SIMILARITY_TOP_K)
+    content_index = ContentIndex.from_rows([
+        SimpleNamespace(id=int(product_id), name=name, description=description, price=float(price), vendor_id=int(vendor_id))
+        for product_id, name, description, price, vendor_id in zip(
+            dataset["catalogue_product_ids"], dataset["names"], dataset["descriptions"], dataset["prices"], dataset["vendor_ids"]
+        )
+    ])
+    content_index.snapshot()
+    popularity = PopularityIndex()
+    popularity.add_events(dataset["product_ids"], weights, dataset["timestamps"])
+    popularity.set_vendors(zip(dataset["catalogue_product_ids"].tolist(), dataset["vendor_ids"].tolist()))
+    popularity.compute_rankings()
+    return matrix, item_index, content_index, popularity
+
+
+def score_sample(matrix, item_index, content_index, popularity):
+    from app.config import settings
+    from app.services.user_similarity import score_user_neighbours
+
+    for user_id in matrix.user_ids[:SCORED_USERS].tolist():
+        items, weights = matrix.user_items(user_id)
+        score_user_neighbours(matrix, user_id, settings.USER_KNN_NEIGHBOURS, 20)
+        item_index.recommend(items, weights, 20)
+        content_index.recommend(matrix.item_ids[items], weights, 20)
+        popularity.top_products(20, exclude=matrix.item_ids[items])
+
+
+def memory_stats() -> dict:
+    stats = {}
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                stats[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": stats["Rss"],
+        "pss": stats["Pss"],
+        "private": stats["Private_Clean"] + stats["Private_Dirty"],
+    }
+
+
+def worker(mode: str, source: str, barrier, results):
+    from app.services import interaction_matrix  # noqa: F401  imports the service stack in every mode
+    from app.services.shared_state import load_shared_state
+
+    started = time.perf_counter()
+    if mode == "local":
+        with np.load(source, allow_pickle=True) as arrays:
+            structures = build_structures({name: arrays[name] for name in arrays.files})
+    elif mode == "shared":
+        state = load_shared_state(source)
+        structures = (state.matrix, state.item_index, state.content_index, state.popularity_index)
+    else:
+        structures = None
+    ready = time.perf_counter() - started
+    if structures is not None:
+        score_sample(*structures)
+    # Measure while every worker is alive, so shared pages are split between all of them
+    barrier.wait()
+    results.put({**memory_stats(), "ready": ready})
+    barrier.wait()
+
+
+def run_mode(mode: str, source: str, n_workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(n_workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, source, barrier, results)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {name: float(np.mean([sample[name] for sample in samples])) for name in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--interactions", type=int, default=500000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.services.shared_state import save_shared_state
+
+    catalogue = generate_catalogue(args.items, seed=args.seed)
+    interactions = generate_interactions(catalogue, args.users, args.interactions, seed=args.seed)
+    dataset = {
+        **interactions,
+        "catalogue_product_ids": catalogue["product_ids"],
+        "names": np.asarray(catalogue["names"], dtype=object),
+        "descriptions": np.asarray(catalogue["descriptions"], dtype=object),
+        "prices": catalogue["prices"],
+        "vendor_ids": catalogue["vendor_ids"],
+    }
+
+    workdir = tempfile.mkdtemp(prefix="shared-state-bench-")
+    try:
+        raw_path = os.path.join(workdir, "dataset.npz")
+        np.savez(raw_path, **dataset)
+        shared_root = os.path.join(workdir, "shared")
+        save_shared_state(shared_root, *build_structures(dataset))
+
+        sources = {"baseline": None, "local": raw_path, "shared": shared_root}
+        print(f"{'mode':<9} {'workers':>7} {'RSS MiB':>9} {'PSS MiB':>9} {'private MiB':>12} {'ready s':>8}")
+        for mode in args.modes:
+            for n_workers in args.workers:
+                stats = run_mode(mode, sources[mode], n_workers)
+                print(f"{mode:<9} {n_workers:>7} {stats['rss']:9.1f} {stats['pss']:9.1f} "
+                      f"{stats['private']:12.1f} {stats['ready']:8.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Cold-start timing of the service: process start to first served request and to readiness.
+
+Loads a synthetic dataset (see benchmarks/synthetic.py) into a throwaway
+SQLite database, then starts ``uvicorn app.main:app`` several times and
+reports, from process start:
+
+* ``import``: seconds to import ``app.main`` alone, in a separate process
+* ``live``:   the server answers ``/health/live``
+* ``first``:  the first SQL-backed request (purchase history) succeeds
+* ``ready``:  ``/health/ready`` returns 200, i.e. every enabled strategy loaded
+
+Strategies load in the background, so ``first`` should not depend on the
+dataset size while ``ready`` grows with it:
+
+    python benchmarks/startup.py --users 20000 --items 10000 --interactions 500000 --runs 5
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.synthetic import generate_catalogue, generate_interactions
+
+POLL_SECONDS = 0.01
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client: httpx.Client, url: str, deadline: float) -> float:
+    """Poll ``url`` until it answers 200; returns the perf_counter time it did."""
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_SECONDS)
+    raise TimeoutError(f"{url} did not answer in time")
+
+
+def measure_import(env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=ROOT, env=env, check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def measure_startup(env: dict, user_id: int, timeout: float) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        with httpx.Client(timeout=timeout) as client:
+            live = wait_for(client, f"{base}/health/live", deadline)
+            first = wait_for(client, f"{base}/api/v1/recommendations/{user_id}", deadline)
+            ready = wait_for(client, f"{base}/health/ready", deadline)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"live": live - started, "first": first - started, "ready": ready - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--interactions", type=int, default=500000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix="startup-bench-"), "startup.db")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "PYTHONPATH": ROOT,
+        # Keep the run independent of artifacts or stores lying around in the working tree
+        "MODEL_ARTIFACT_DIR": os.path.join(os.path.dirname(database), "tfrs"),
+        "MATERIALIZED_DIR": os.path.join(os.path.dirname(database), "materialized"),
+    }
+    os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+    from app.database import engine
+    from benchmarks.evaluate import load_database
+
+    catalogue = generate_catalogue(args.items, seed=args.seed)
+    interactions = generate_interactions(catalogue, args.users, args.interactions, seed=args.seed)
+    load_database(engine, catalogue, interactions)
+    engine.dispose()
+    user_id = int(interactions["user_ids"][0])
+
+    results = {"import": [measure_import(env) for _ in range(args.runs)]}
+    for _ in range(args.runs):
+        for name, seconds in measure_startup(env, user_id, args.timeout).items():
+            results.setdefault(name, []).append(seconds)
+
+    print(f"{args.interactions} interactions, {args.users} users, {args.items} items, {args.runs} runs")
+    print(f"{'stage':<8} {'median s':>9} {'max s':>8}")
+    for name, samples in results.items():
+        print(f"{name:<8} {np.median(samples):9.3f} {max(samples):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Synthetic catalogue and interaction generator shared by the benchmarks.
+
+Item popularity follows a Zipf law, user activity is heavy-tailed, and every
+user leans towards a favourite topic whose items share vocabulary, so both the
+collaborative and the content strategies have signal to find.
+"""
+import time
+
+import numpy as np
+
+INTERACTION_TYPES = np.array(["view", "click", "like", "add_to_cart", "purchase"])
+INTERACTION_TYPE_PROBABILITIES = np.array([0.6, 0.2, 0.08, 0.07, 0.05])
+SHARED_WORDS = [f"common{i}" for i in range(50)]
+
+
+def _zipf_probabilities(n: int, alpha: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** alpha
+    return weights / weights.sum()
+
+
+def generate_catalogue(n_items: int, n_vendors: int = 500, n_topics: int = 50, seed: int = 0) -> dict:
+    """Products 1..n_items with a topic, vendor, log-normal price and topic-flavoured text."""
+    rng = np.random.default_rng(seed)
+    topics = rng.integers(0, n_topics, size=n_items)
+    topic_words = [[f"topic{topic}word{i}" for i in range(30)] for topic in range(n_topics)]
+    names, descriptions = [], []
+    for topic in topics.tolist():
+        words = topic_words[topic]
+        names.append(" ".join(words[i] for i in rng.integers(0, len(words), size=2)))
+        descriptions.append(
+            " ".join([words[i] for i in rng.integers(0, len(words), size=8)]
+                     + [SHARED_WORDS[i] for i in rng.integers(0, len(SHARED_WORDS), size=4)])
+        )
+    # Vendors specialise in a few topics, so vendor is informative too
+    vendor_ids = (topics * 7 + rng.integers(0, 7, size=n_items)) % n_vendors + 1
+    return {
+        "product_ids": np.arange(1, n_items + 1, dtype=np.int64),
+        "topics": topics,
+        "vendor_ids": vendor_ids.astype(np.int64),
+        "prices": np.round(rng.lognormal(mean=4.0, sigma=1.0, size=n_items), 2),
+        "names": names,
+        "descriptions": descriptions,
+        "n_vendors": n_vendors,
+    }
+
+
+def generate_interactions(
+    catalogue: dict,
+    n_users: int,
+    n_interactions: int,
+    item_alpha: float = 1.05,
+    user_alpha: float = 0.8,
+    topic_affinity: float = 0.7,
+    days: float = 90,
+    seed: int = 0,
+) -> dict:
+    """Sample interactions as parallel arrays sorted by timestamp (epoch seconds).
+
+    Each user has a favourite topic; with probability ``topic_affinity`` an
+    interaction picks a Zipf-ranked item from that topic, otherwise from the
+    whole catalogue.
+    """
+    rng = np.random.default_rng(seed + 1)
+    product_ids, topics = catalogue["product_ids"], catalogue["topics"]
+    n_items = len(product_ids)
+    n_topics = int(topics.max()) + 1
+
+    # A random permutation decides which items are globally popular
+    popularity_rank = rng.permutation(n_items)
+    item_probabilities = _zipf_probabilities(n_items, item_alpha)[popularity_rank]
+    users = rng.choice(n_users, size=n_interactions, p=_zipf_probabilities(n_users, user_alpha)[rng.permutation(n_users)]) + 1
+    favourite_topics = rng.integers(0, n_topics, size=n_users + 1)
+
+    items = rng.choice(n_items, size=n_interactions, p=item_probabilities)
+    on_topic = np.flatnonzero(rng.random(n_interactions) < topic_affinity)
+    wanted_topics = favourite_topics[users[on_topic]]
+    for topic in range(n_topics):
+        members = np.flatnonzero(topics == topic)
+        rows = on_topic[wanted_topics == topic]
+        if not len(members) or not len(rows):
+            continue
+        probabilities = item_probabilities[members] / item_probabilities[members].sum()
+        items[rows] = rng.choice(members, size=len(rows), p=probabilities)
+
+    now = time.time()
+    timestamps = np.sort(rng.uniform(now - days * 86400, now, size=n_interactions))
+    return {
+        "user_ids": users.astype(np.int64),
+        "product_ids": product_ids[items],
+        "interaction_types": rng.choice(INTERACTION_TYPES, size=n_interactions, p=INTERACTION_TYPE_PROBABILITIES),
+        "interaction_values": np.ones(n_interactions, dtype=np.float32),
+        "timestamps": timestamps,
+    }
+
+
+def temporal_split(interactions: dict, test_fraction: float = 0.2):
+    """Split at the timestamp quantile: everything before goes to train, the rest to test."""
+    cutoff = np.quantile(interactions["timestamps"], 1 - test_fraction)
+    train = interactions["timestamps"] < cutoff
+    return (
+        {name: values[train] for name, values in interactions.items()},
+        {name: values[~train] for name, values in interactions.items()},
+        float(cutoff),
+    )